@@ -0,0 +1,91 @@
+"""
+This maintenance script sets the unique_id custom field of tickets filed before it was populated
+
+The hash is taken from the ticket description ("Hash: <md5>" line added by Jira.report),
+tickets can then be looked up using an exact match on the field.
+
+Run it via "make backfill_unique_id" from the base directory of this repository
+(set DRY_RUN=1 to only list the tickets that would be updated)
+"""
+import logging
+import os
+import re
+
+from reporter.reporters import Jira
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(name)-35s %(levelname)-8s %(message)s',
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+# tickets with the hash in the description and without the field set
+JQL = "description ~ 'Hash' AND {field} is EMPTY ORDER BY created ASC"
+
+HASH_RE = re.compile(r'^Hash: ([a-f0-9]{32})\b', re.MULTILINE)
+
+BATCH_SIZE = 100
+
+logger = logging.getLogger(__name__)
+
+
+def get_hash_from_description(description):
+    """
+    :type description str
+    :rtype: str|None
+    """
+    matches = HASH_RE.search(description or '')
+    return matches.group(1) if matches else None
+
+
+def backfill_unique_id(dry_run=False):
+    """
+    Set the unique_id field of legacy tickets, returns the number of updated tickets
+
+    :type dry_run bool
+    :rtype: int
+    """
+    jira = Jira()
+    jira_api = jira.get_api_client()
+
+    field = jira.get_unique_id_field()
+    assert field is not None, 'unique_id custom field is not configured'
+
+    jql = JQL.format(field=jira.get_field_jql_name(field))
+    logger.info('Looking for tickets using "{}" query'.format(jql))
+
+    # updated tickets do not match the query anymore, hence collect all of them first
+    tickets = []
+
+    while True:
+        batch = jira_api.search_issues(jql, startAt=len(tickets), maxResults=BATCH_SIZE, fields='description')
+        tickets += batch
+
+        if len(batch) < BATCH_SIZE:
+            break
+
+    logger.info('Got {} tickets'.format(len(tickets)))
+
+    updated = 0
+    skipped = 0
+
+    for ticket in tickets:
+        unique_id = get_hash_from_description(ticket.fields.description)
+
+        if unique_id is None:
+            skipped += 1
+            continue
+
+        logger.info('{} -> {}'.format(ticket.key, unique_id))
+
+        if dry_run or jira.set_unique_id(ticket, unique_id):
+            updated += 1
+        else:
+            skipped += 1
+
+    logger.info('{} tickets updated, {} skipped'.format(updated, skipped))
+    return updated
+
+
+if __name__ == '__main__':
+    backfill_unique_id(dry_run=os.environ.get('DRY_RUN') == '1')
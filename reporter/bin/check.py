@@ -4,17 +4,17 @@ This script checks PHP log for fatals, warnings, DB queries errors
 and reports issues to JIRA when given thresholds are reached
 """
 import logging
+import os
 
-from time import sleep
-
+from reporter.checks import CHECKS
+from reporter.concurrency import IOExecutor
+from reporter.metrics import get_metrics
+from reporter.profiling import setup_memory_profiler
 from reporter.reporters import Jira
-from reporter.sources import PHPErrorsSource, PHPExceptionsSource, DBQueryErrorsSource,\
-    DBQueryNoLimitSource, NotCachedWikiaApiResponsesSource, KilledDatabaseQueriesSource, \
-    PHPAssertionsSource, PandoraErrorsSource, PHPSecuritySource, \
-    MercurySource, HeliosSource, VignetteThumbVerificationSource, AnemometerSource, \
-    ChatLogsSource, PHPExecutionTimeoutSource, BackendSource, PHPTriggeredSource, \
-    IndexDigestSource, ReportsPipeSource, DBReadQueryOnMaster, PHPTypeErrorsSource, \
-    CeleryLogsSource, KubernetesBackoffSource
+from reporter.rollups import setup_rollup_store
+from reporter.runner import Runner
+from reporter.scheduler import Scheduler
+from reporter.spool import setup_spool
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,86 +22,37 @@ logging.basicConfig(
     datefmt="%Y-%m-%d %H:%M:%S"
 )
 
-# get reports from various sources
-reports = []
-
-# PHP warnings and errors
-source = PHPErrorsSource()
-
-reports += source.query("PHP Fatal Error", threshold=5)
-reports += source.query("PHP Catchable Fatal", threshold=5)
-reports += source.query("PHP Warning", threshold=50)
-reports += source.query("PHP Strict Standards", threshold=200)
-reports += source.query("PHP Notice", threshold=1500)
-
-# @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/Severity%20error
-reports += PHPExceptionsSource().query(query='error', threshold=50)
-reports += PHPExceptionsSource().query(query='critical', threshold=0)  # PLATFORM-2271
-
-# @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/DBQuery%20errors
-reports += DBQueryErrorsSource().query(threshold=20)
-
-# @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/PLATFORM-836
-reports += DBQueryNoLimitSource().query(threshold=50)
-
-# @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/wikia.php%20caching%20disabled
-reports += NotCachedWikiaApiResponsesSource().query(threshold=500)  # we serve 75k not cached responses an hour
-
-# @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/drozdo.pt-kill
-reports += KilledDatabaseQueriesSource().query(threshold=5)
-
-# @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/AssertionException
-reports += PHPAssertionsSource().query(threshold=5)
-
-# @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/PLATFORM-1420
-reports += PandoraErrorsSource().query(threshold=50)
-
-# @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/PLATFORM-1540
-reports += PHPSecuritySource().query(threshold=0)  # security problems is always important
-
-# @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/PLATFORM-2055
-reports += MercurySource().query('emergency', threshold=0)
-reports += MercurySource().query('error', threshold=50)
-
-# @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/Helios%20errors
-reports += HeliosSource().query(threshold=5)
-
-# @see https://kibana.wikia-inc.com/index.html#/dashboard/elasticsearch/Vigniette%20Thumb%20Verifier
-reports += VignetteThumbVerificationSource().query(threshold=5)
-
-# @see https://wikia-inc.atlassian.net/browse/PLATFORM-2180
-reports += AnemometerSource().query(threshold=0)
-
-# @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/Chat%20Server%20errors
-reports += ChatLogsSource().query('uncaughtException', threshold=1)
-reports += ChatLogsSource().query('SyntaxError', threshold=1)
-
-reports += PHPExecutionTimeoutSource(period=21600).query(threshold=5)
-
-reports += BackendSource().query(threshold=2)
-
-reports += PHPTriggeredSource().query(threshold=1)
-
-reports += IndexDigestSource().query(threshold=1)
+profiler = setup_memory_profiler()  # opt-in, see reporter/profiling.py
+rollups = setup_rollup_store()  # opt-in, see reporter/rollups.py
+spool = setup_spool()  # opt-in, see reporter/spool.py
 
-reports += ReportsPipeSource().query(threshold=1)
+# see reporter/checks.py for the list of sources queried
+# this script is run every hour, each check is run when its interval starts
+scheduler = Scheduler(CHECKS, state_path=os.environ.get('REPORTER_SCHEDULER_STATE'), slot_length=3600)
 
-reports += DBReadQueryOnMaster().query(threshold=1)
+# query sources concurrently when REPORTER_IO_CONCURRENCY is set
+# (memory profiling readings are process-wide, hence sources are queried one by one then)
+concurrency = int(os.environ.get('REPORTER_IO_CONCURRENCY', 0))
+executor = IOExecutor(max_workers=concurrency) if concurrency > 1 and profiler is None else None
 
-reports += PHPTypeErrorsSource().query(threshold=5)
+runner = Runner(reporter_factory=Jira, scheduler=scheduler, executor=executor, spool=spool)
 
-reports += CeleryLogsSource().query(threshold=5)
+# processes used to normalize big windows (see Source.NORMALIZE_PROCESSES) are not forked while
+# the filing thread is running, hence file reports once all checks are run (the same for memory profiling)
+if int(os.environ.get('REPORTER_NORMALIZE_PROCESSES', 0)) > 1 or profiler is not None:
+    runner.PIPELINE = False
 
-reports += KubernetesBackoffSource().query(threshold=1)
+# get reports from various sources and send them to Jira
+runner.run()
 
-logging.info('Reporting {} issues...'.format(len(reports)))
-reporter = Jira()
+if executor:
+    executor.close()
 
-reported = 0
-for report in reports:
-    sleep(1)  # avoid hitting Jira with too many searches for ticket hash (we perform 150+ of them)
+if profiler:
+    profiler.write_summary()
 
-    if reporter.report(report):
-        reported += 1
+if rollups:
+    rollups.close()
 
-logging.info('Reported {} tickets'.format(reported))
+# export per-run metrics (see reporter/metrics.py for configuration)
+get_metrics().export()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+This script keeps running and performs the same checks as check.py on an internal schedule
+
+Sources, Elasticsearch and Jira clients and the classifier are created once and reused by all cycles.
+Every cycle runs checks that are due (see reporter/checks.py for per-check intervals).
+
+Environment variables:
+- REPORTER_DAEMON_INTERVAL: seconds between cycles (defaults to 60)
+- REPORTER_DAEMON_PORT: port to serve /health and /metrics on (defaults to 8080)
+- REPORTER_SCHEDULER_STATE: path to JSON file with checks last run times (optional)
+- REPORTER_IO_CONCURRENCY: how many sources can be queried at the same time (optional)
+- REPORTER_ROLLUPS_PATH: directory to keep hourly per-key counts in (optional)
+"""
+import logging
+import os
+
+from reporter.checks import CHECKS
+from reporter.concurrency import IOExecutor
+from reporter.daemon import Daemon
+from reporter.reporters import Jira
+from reporter.rollups import setup_rollup_store
+from reporter.runner import Runner
+from reporter.scheduler import Scheduler
+from reporter.spool import setup_spool
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(name)-35s %(levelname)-8s %(message)s',
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+setup_rollup_store()
+spool = setup_spool()
+
+scheduler = Scheduler(CHECKS, state_path=os.environ.get('REPORTER_SCHEDULER_STATE'))
+
+concurrency = int(os.environ.get('REPORTER_IO_CONCURRENCY', 0))
+executor = IOExecutor(max_workers=concurrency) if concurrency > 1 else None
+
+daemon = Daemon(
+    runner_factory=lambda stop_event: Runner(reporter_factory=Jira, scheduler=scheduler, stop_event=stop_event,
+                                             executor=executor, spool=spool),
+    interval=int(os.environ.get('REPORTER_DAEMON_INTERVAL', 60)),
+    health_port=int(os.environ.get('REPORTER_DAEMON_PORT', 8080))
+)
+
+daemon.run()
@@ -12,6 +12,7 @@ from reporter.sources import KilledDatabaseQueriesSource, PHPErrorsSource, \
     DBReadQueryOnMaster, PHPTypeErrorsSource, CeleryLogsSource, KubernetesBackoffSource
 
 from reporter.classifier import Classifier
+from reporter.profiling import setup_memory_profiler
 
 logging.basicConfig(
     level=logging.INFO,
@@ -21,6 +22,7 @@ logging.basicConfig(
 
 reports = list()
 classifier = Classifier()
+profiler = setup_memory_profiler()  # opt-in, see reporter/profiling.py
 
 #source = PHPErrorsSource()
 #reports += source.query("PHP Fatal Error", threshold=5)
@@ -73,6 +75,9 @@ classifier = Classifier()
 
 reports += KubernetesBackoffSource().query(threshold=2)
 
+if profiler:
+    profiler.write_summary()
+
 for report in reports:
     print(report)
     print(classifier.classify(report))
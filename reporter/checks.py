@@ -0,0 +1,134 @@
+"""
+The set of source queries run by check.py and daemon.py
+"""
+from reporter.sources import PHPErrorsSource, PHPExceptionsSource, DBQueryErrorsSource,\
+    DBQueryNoLimitSource, NotCachedWikiaApiResponsesSource, KilledDatabaseQueriesSource, \
+    PHPAssertionsSource, PandoraErrorsSource, PHPSecuritySource, \
+    MercurySource, HeliosSource, VignetteThumbVerificationSource, AnemometerSource, \
+    ChatLogsSource, PHPExecutionTimeoutSource, BackendSource, PHPTriggeredSource, \
+    IndexDigestSource, ReportsPipeSource, DBReadQueryOnMaster, PHPTypeErrorsSource, \
+    CeleryLogsSource, KubernetesBackoffSource
+
+
+class Check(object):
+    """
+    A single source query together with its threshold and schedule
+    """
+    HOUR = 3600
+    DAY = 86400
+
+    def __init__(self, source_class, query='', threshold=50, interval=HOUR, window=None, **source_options):
+        """
+        :type source_class type
+        :type query str
+        :type threshold int
+        :type interval int
+        :type window int
+        :arg interval: how often (in seconds) the check should be run
+        :arg window: how many seconds of logs should be queried (defaults to interval)
+        :arg source_options: passed to the source constructor
+        """
+        self.source_class = source_class
+        self.query = query
+        self.threshold = threshold
+        self.interval = interval
+        self.window = window or interval
+        self.source_options = source_options
+
+    def get_name(self):
+        """
+        Used to identify the check in the scheduler state
+
+        :rtype: str
+        """
+        return '{}({})'.format(self.source_class.__name__, self.query)
+
+    def get_source_key(self):
+        """
+        Checks with the same source key can share the source instance
+
+        :rtype: tuple
+        """
+        return self.source_class, tuple(sorted(self.source_options.items()))
+
+    def get_source(self):
+        """
+        :rtype: reporter.sources.Source
+        """
+        return self.source_class(**self.source_options)
+
+    def __repr__(self):
+        return '<Check {} threshold={} interval={} window={}>'.format(
+            self.get_name(), self.threshold, self.interval, self.window)
+
+
+CHECKS = [
+    # PHP warnings and errors
+    # fatals are cheap to fetch and critical, check them often
+    Check(PHPErrorsSource, "PHP Fatal Error", threshold=5, interval=300, window=900),
+    Check(PHPErrorsSource, "PHP Catchable Fatal", threshold=5, interval=300, window=900),
+    Check(PHPErrorsSource, "PHP Warning", threshold=50),
+    Check(PHPErrorsSource, "PHP Strict Standards", threshold=200),
+    Check(PHPErrorsSource, "PHP Notice", threshold=1500),
+
+    # @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/Severity%20error
+    Check(PHPExceptionsSource, 'error', threshold=50),
+    Check(PHPExceptionsSource, 'critical', threshold=0),  # PLATFORM-2271
+
+    # @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/DBQuery%20errors
+    Check(DBQueryErrorsSource, threshold=20),
+
+    # @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/PLATFORM-836
+    Check(DBQueryNoLimitSource, threshold=50),
+
+    # @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/wikia.php%20caching%20disabled
+    Check(NotCachedWikiaApiResponsesSource, threshold=500),
+
+    # @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/drozdo.pt-kill
+    Check(KilledDatabaseQueriesSource, threshold=5),
+
+    # @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/AssertionException
+    Check(PHPAssertionsSource, threshold=5),
+
+    # @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/PLATFORM-1420
+    Check(PandoraErrorsSource, threshold=50),
+
+    # @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/PLATFORM-1540
+    Check(PHPSecuritySource, threshold=0),  # security problems is always important
+
+    # @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/PLATFORM-2055
+    Check(MercurySource, 'emergency', threshold=0),
+    Check(MercurySource, 'error', threshold=50),
+
+    # @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/Helios%20errors
+    Check(HeliosSource, threshold=5),
+
+    # @see https://kibana.wikia-inc.com/index.html#/dashboard/elasticsearch/Vigniette%20Thumb%20Verifier
+    Check(VignetteThumbVerificationSource, threshold=5),
+
+    # @see https://wikia-inc.atlassian.net/browse/PLATFORM-2180
+    # Anemometer provides daily stats
+    Check(AnemometerSource, threshold=0, interval=Check.DAY),
+
+    # @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/Chat%20Server%20errors
+    Check(ChatLogsSource, 'uncaughtException', threshold=1),
+    Check(ChatLogsSource, 'SyntaxError', threshold=1),
+
+    Check(PHPExecutionTimeoutSource, threshold=5, interval=6 * Check.HOUR),
+
+    Check(BackendSource, threshold=2),
+
+    Check(PHPTriggeredSource, threshold=1),
+
+    Check(IndexDigestSource, threshold=1),
+
+    Check(ReportsPipeSource, threshold=1),
+
+    Check(DBReadQueryOnMaster, threshold=1),
+
+    Check(PHPTypeErrorsSource, threshold=5),
+
+    Check(CeleryLogsSource, threshold=5),
+
+    Check(KubernetesBackoffSource, threshold=1),
+]
@@ -0,0 +1,115 @@
+"""
+Process-wide registry of HTTP clients
+
+Clients are shared by all sources, so that a single keep-alive connection pool
+is used for each Elasticsearch cluster and HTTP service (e.g. Anemometer).
+
+Pool sizes and timeouts can be tuned via environment variables:
+
+- REPORTER_HTTP_POOL_SIZE - connections kept per host (defaults to 10)
+- REPORTER_HTTP_TIMEOUT - read timeout in seconds (defaults to 30)
+"""
+import logging
+import os
+import threading
+
+from urlparse import urlparse
+
+import requests
+
+from elasticsearch import Elasticsearch
+from requests.adapters import HTTPAdapter
+
+
+class ClientsRegistry(object):
+    """
+    Creates clients on the first use and keeps them for the entire process lifetime
+    """
+    POOL_SIZE = 10
+    TIMEOUT = 30
+
+    def __init__(self, pool_size=None, timeout=None):
+        """
+        :type pool_size int
+        :type timeout int
+        :arg pool_size: keep-alive connections kept per host (should not be lower than I/O concurrency)
+        :arg timeout: read timeout (in seconds)
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+
+        self._pool_size = pool_size or self.POOL_SIZE
+        self._timeout = timeout or self.TIMEOUT
+
+        self._elasticsearch = dict()  # hosts -> Elasticsearch
+        self._sessions = dict()  # scheme and host -> requests.Session
+
+    def get_timeout(self):
+        """
+        :rtype: int
+        """
+        return self._timeout
+
+    def get_elasticsearch(self, hosts):
+        """
+        Return Elasticsearch client for a given cluster
+
+        :type hosts str|list[str]
+        :rtype: elasticsearch.Elasticsearch
+        """
+        key = hosts if isinstance(hosts, basestring) else tuple(hosts)
+
+        with self._lock:
+            if key not in self._elasticsearch:
+                self._logger.info('Connecting to Elasticsearch at {} (pool size: {}, timeout: {} sec)'.format(
+                    hosts, self._pool_size, self._timeout))
+
+                self._elasticsearch[key] = Elasticsearch(
+                    hosts=hosts,
+                    timeout=self._timeout,
+                    maxsize=self._pool_size,  # keep-alive connections per node
+                    http_compress=True,  # gzip requests and responses
+                )
+
+            return self._elasticsearch[key]
+
+    def get_http_session(self, url):
+        """
+        Return requests session for a host of a given URL
+
+        :type url str
+        :rtype: requests.Session
+        """
+        parsed = urlparse(url)
+        key = '{}://{}'.format(parsed.scheme, parsed.netloc)
+
+        with self._lock:
+            if key not in self._sessions:
+                self._logger.info('Creating HTTP session for {} (pool size: {})'.format(key, self._pool_size))
+
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size)
+
+                session = requests.Session()
+                session.mount(key, adapter)
+
+                self._sessions[key] = session
+
+            return self._sessions[key]
+
+
+_clients = None
+
+
+def get_clients():
+    """
+    :rtype: ClientsRegistry
+    """
+    global _clients
+
+    if _clients is None:
+        _clients = ClientsRegistry(
+            pool_size=int(os.environ.get('REPORTER_HTTP_POOL_SIZE', 0)),
+            timeout=int(os.environ.get('REPORTER_HTTP_TIMEOUT', 0)),
+        )
+
+    return _clients
@@ -0,0 +1,156 @@
+"""
+Overlaps blocking network calls (Elasticsearch, Anemometer, Jira) using a bounded pool of threads
+
+asyncio is not available on Python 2.7, hence I/O-bound calls are submitted to a thread pool
+and CPU-bound stages are run in the caller's thread once the I/O result is there.
+"""
+import logging
+
+from multiprocessing.pool import ThreadPool
+
+
+class ChainedResult(object):
+    """
+    Result of the I/O call with a continuation that is run (once) in the thread calling get()
+    """
+    def __init__(self, result, callback):
+        """
+        :type result multiprocessing.pool.AsyncResult
+        :type callback callable
+        """
+        self._result = result
+        self._callback = callback
+
+        self._done = False
+        self._value = None
+
+    def ready(self):
+        """
+        :rtype: bool
+        """
+        return self._result.ready()
+
+    def get(self, timeout=None):
+        """
+        Wait for the I/O call to complete and return the value returned by the callback
+
+        :type timeout int
+        """
+        if not self._done:
+            self._value = self._callback(self._result.get(timeout))
+            self._done = True
+
+        return self._value
+
+
+class DeferredResult(object):
+    """
+    Call that is run (once) in the thread calling get(), e.g. when it needs to be run as a whole
+    """
+    def __init__(self, func, *args, **kwargs):
+        """
+        :type func callable
+        """
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+
+        self._done = False
+        self._value = None
+
+    @staticmethod
+    def ready():
+        """
+        :rtype: bool
+        """
+        return True
+
+    def get(self, timeout=None):
+        """
+        Run the call and return its value
+
+        :type timeout int
+        """
+        if not self._done:
+            self._value = self._func(*self._args, **self._kwargs)
+            self._done = True
+
+        return self._value
+
+
+class IOExecutor(object):
+    """
+    Runs blocking calls in a pool of max_workers threads (i.e. with at most max_workers requests in flight)
+
+    with IOExecutor(max_workers=8) as executor:
+        results = [source.query_async(executor, query) for (source, query) in ...]
+        reports = [result.get() for result in results]
+    """
+    def __init__(self, max_workers=8):
+        """
+        :type max_workers int
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._max_workers = max_workers
+        self._pool = ThreadPool(processes=max_workers)
+
+        self._logger.info('Using {} I/O threads'.format(max_workers))
+
+    def get_max_workers(self):
+        """
+        :rtype: int
+        """
+        return self._max_workers
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Schedule a blocking call
+
+        :type func callable
+        :rtype: multiprocessing.pool.AsyncResult
+        """
+        return self._pool.apply_async(func, args, kwargs)
+
+    @staticmethod
+    def chain(result, callback):
+        """
+        Run a callback with the value of the I/O call when get() is called on the returned result
+
+        :type result multiprocessing.pool.AsyncResult
+        :type callback callable
+        :rtype: ChainedResult
+        """
+        return ChainedResult(result, callback)
+
+    @staticmethod
+    def defer(func, *args, **kwargs):
+        """
+        Run the call when get() is called on the returned result (no I/O thread is used)
+
+        :type func callable
+        :rtype: DeferredResult
+        """
+        return DeferredResult(func, *args, **kwargs)
+
+    def map(self, func, items):
+        """
+        Call func for each item concurrently, return results in the order of items
+
+        :type func callable
+        :type items list
+        :rtype: list
+        """
+        return [result.get() for result in [self.submit(func, item) for item in items]]
+
+    def close(self):
+        """
+        Wait for the pending calls and stop threads
+        """
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -0,0 +1,160 @@
+"""
+Long-running mode: run checks on an internal schedule instead of the hourly CronJob
+"""
+import json
+import logging
+import signal
+import threading
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from time import time
+
+from reporter.metrics import get_metrics
+
+
+class HealthRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves /health (JSON) and /metrics (Prometheus text format)
+    """
+    def do_GET(self):
+        daemon = self.server.reporter_daemon
+
+        if self.path == '/health':
+            status = daemon.get_status()
+            self._send(200 if status['healthy'] else 503, json.dumps(status), 'application/json')
+        elif self.path == '/metrics':
+            self._send(200, get_metrics().to_prometheus(), 'text/plain; version=0.0.4')
+        else:
+            self._send(404, 'Not found', 'text/plain')
+
+    def _send(self, code, body, content_type):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        """ Do not log every health check """
+        pass
+
+
+class Daemon(object):
+    """
+    Runs a given Runner every interval seconds until stopped (SIGTERM / SIGINT)
+    """
+    def __init__(self, runner_factory, interval=3600, health_port=None):
+        """
+        :type runner_factory callable
+        :arg runner_factory: called with a stop event, returns reporter.runner.Runner instance
+        :type interval int
+        :type health_port int
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+        self._stop_event = threading.Event()
+        self._runner = runner_factory(self._stop_event)
+        self._interval = interval
+
+        self._health_port = health_port
+        self._health_server = None
+
+        self._started = time()
+        self._cycles = 0
+        self._last_cycle_started = None
+        self._last_cycle_finished = None
+        self._last_cycle_error = None
+
+    def stop(self, *_):
+        """
+        Request a graceful shutdown (can be used as a signal handler)
+        """
+        self._logger.info('Stopping...')
+        self._stop_event.set()
+
+    def is_stopped(self):
+        """
+        :rtype: bool
+        """
+        return self._stop_event.is_set()
+
+    def get_status(self):
+        """
+        The daemon is healthy when the last cycle has finished without an error
+        and it was not too long ago
+
+        :rtype: dict
+        """
+        now = time()
+        last_activity = self._last_cycle_finished or self._started
+
+        return {
+            'healthy': self._last_cycle_error is None and now - last_activity < 2 * self._interval + 3600,
+            'cycles': self._cycles,
+            'interval': self._interval,
+            'last_cycle_started': self._last_cycle_started,
+            'last_cycle_finished': self._last_cycle_finished,
+            'last_cycle_error': self._last_cycle_error,
+        }
+
+    def _start_health_server(self):
+        """
+        Serve health and metrics endpoint in a background thread
+        """
+        self._health_server = HTTPServer(('', self._health_port), HealthRequestHandler)
+        self._health_server.reporter_daemon = self
+
+        thread = threading.Thread(target=self._health_server.serve_forever, name='health-server')
+        thread.daemon = True
+        thread.start()
+
+        self._logger.info('Serving /health and /metrics on port {}'.format(self._health_port))
+
+    def run_cycle(self):
+        """
+        Run checks once and file reports
+        """
+        self._cycles += 1
+        self._last_cycle_started = time()
+
+        self._logger.info('Starting cycle #{}'.format(self._cycles))
+
+        try:
+            reported = self._runner.run()
+            self._last_cycle_error = None
+        except Exception as ex:
+            self._logger.error('Cycle #{} failed'.format(self._cycles), exc_info=True)
+            self._last_cycle_error = repr(ex)
+            reported = 0
+
+        self._last_cycle_finished = time()
+
+        self._logger.info('Cycle #{} finished in {:.2f} sec, {} tickets reported'.format(
+            self._cycles, self._last_cycle_finished - self._last_cycle_started, reported))
+
+    def run(self, install_signal_handlers=True):
+        """
+        Run cycles every interval seconds until stop() is called
+        """
+        self._started = time()
+
+        if install_signal_handlers:
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        if self._health_port:
+            self._start_health_server()
+
+        self._logger.info('Running checks every {} seconds'.format(self._interval))
+
+        while not self.is_stopped():
+            self.run_cycle()
+
+            # wait for the next cycle (or the stop request)
+            next_cycle = self._last_cycle_started + self._interval
+            self._stop_event.wait(max(0, next_cycle - time()))
+
+        if self._health_server:
+            self._health_server.shutdown()
+
+        self._logger.info('Stopped after {} cycles'.format(self._cycles))
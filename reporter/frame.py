@@ -0,0 +1,133 @@
+"""
+Columnar view of fetched log entries used by the batch processing path
+
+Log entries of a single window share a small number of distinct values (hosts, environments,
+normalized messages), hence filters and normalization rules are run once per distinct value
+and the results are broadcast back to all rows.
+"""
+from reporter.predicates import get_field
+
+
+class Frame(object):
+    """
+    A list of entries with lazily extracted (and cached) columns
+    """
+    def __init__(self, entries):
+        """
+        :type entries list[dict]
+        """
+        self._entries = entries
+        self._columns = dict()  # field -> list of values
+
+    def get_entries(self):
+        """
+        :rtype: list[dict]
+        """
+        return self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_column(self, field):
+        """
+        Return values of a given (dotted) field for all entries (None when not set)
+
+        :type field str
+        :rtype: list
+        """
+        if field not in self._columns:
+            self._columns[field] = [get_field(entry, field) for entry in self._entries]
+
+        return self._columns[field]
+
+    def set_column(self, field, values):
+        """
+        Set the column values (entries are not modified)
+
+        :type field str
+        :type values list
+        """
+        assert len(values) == len(self._entries), 'column length does not match the number of entries'
+        self._columns[field] = values
+
+    def map_distinct(self, field, func):
+        """
+        Return func(value) for all values of a given field, func is called once per distinct value
+
+        :type field str
+        :type func callable
+        :rtype: list
+        """
+        results = dict()  # value -> func(value)
+        mapped = []
+
+        for value in self.get_column(field):
+            try:
+                if value not in results:
+                    results[value] = func(value)
+
+                mapped.append(results[value])
+            except TypeError:
+                # unhashable value (e.g. a list)
+                mapped.append(func(value))
+
+        return mapped
+
+    def map_distinct_rows(self, fields, func):
+        """
+        Return func(entry) for all entries, func is called once per distinct combination of given fields values
+        (and needs to depend only on these fields)
+
+        :type fields list[str]
+        :type func callable
+        :rtype: list
+        """
+        results = dict()  # values -> func(entry)
+        mapped = []
+
+        for (entry, values) in zip(self._entries, zip(*[self.get_column(field) for field in fields])):
+            try:
+                if values not in results:
+                    results[values] = func(entry)
+
+                mapped.append(results[values])
+            except TypeError:
+                mapped.append(func(entry))
+
+        return mapped
+
+    def replace(self, field, rules):
+        """
+        Apply regular expression replacements to all values of a given field, in the given order
+
+        Values that are not strings are left untouched.
+
+        :type field str
+        :type rules list[tuple]
+        :arg rules: list of (compiled regex, replacement) tuples
+        :rtype: list
+        """
+        def _replace(value):
+            if not isinstance(value, basestring):
+                return value
+
+            for (regex, replacement) in rules:
+                value = regex.sub(replacement, value)
+
+            return value
+
+        return self.map_distinct(field, _replace)
+
+    def select(self, mask):
+        """
+        Return a frame with entries for which the mask is True
+
+        :type mask list[bool]
+        :rtype: Frame
+        """
+        frame = Frame([entry for (entry, selected) in zip(self._entries, mask) if selected])
+
+        for (field, values) in self._columns.items():
+            frame.set_column(field, [value for (value, selected) in zip(values, mask) if selected])
+
+        return frame
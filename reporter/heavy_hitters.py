@@ -0,0 +1,153 @@
+"""
+Approximate grouping of log entries with a fixed memory budget
+
+@see https://www.cs.ucsb.edu/sites/default/files/documents/2005-23.pdf (Space-Saving algorithm)
+"""
+
+
+class SpaceSaving(object):
+    """
+    Keeps at most capacity keys with their counts (Space-Saving algorithm)
+
+    When the table is full, a new key replaces the one with the lowest count and inherits it
+    (the inherited value is kept as the "error" of the new key). Hence:
+
+    - counts are never underestimated, they're overestimated by at most the key's error,
+    - the error is not greater than N / capacity (where N is the number of entries counted),
+    - every key that occurs more than N / capacity times is kept in the table.
+
+    Items are dicts (with "cnt" and "error" keys), keys are indexed in a min-heap ordered by "cnt".
+    """
+    def __init__(self, capacity):
+        """
+        :type capacity int
+        """
+        assert capacity > 0, 'capacity needs to be positive'
+
+        self._capacity = capacity
+        self._items = dict()  # key -> item
+
+        self._heap = []  # keys ordered by their count
+        self._positions = dict()  # key -> position in the heap
+
+        self._total = 0
+
+    def get_capacity(self):
+        """
+        :rtype: int
+        """
+        return self._capacity
+
+    def get_total(self):
+        """
+        The number of entries counted so far
+
+        :rtype: int
+        """
+        return self._total
+
+    def get_max_error(self):
+        """
+        The upper bound of counts overestimation
+
+        :rtype: int
+        """
+        return self._total // self._capacity
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __getitem__(self, key):
+        return self._items[key]
+
+    def __setitem__(self, key, item):
+        """
+        Add a new key with a given item (the item's "cnt" is counted), the key with the lowest count
+        is evicted when the table is full
+        """
+        assert key not in self._items, 'use incr() to update the existing key'
+
+        count = item.get('cnt', 1)
+        item['cnt'] = count
+        item['error'] = 0
+
+        self._total += count
+
+        if len(self._items) >= self._capacity:
+            evicted = self._heap[0]
+            evicted_count = self._items[evicted]['cnt']
+
+            # the new key takes over the slot of the evicted one
+            del self._items[evicted]
+            del self._positions[evicted]
+
+            item['cnt'] += evicted_count
+            item['error'] = evicted_count
+
+            self._heap[0] = key
+            self._positions[key] = 0
+            self._items[key] = item
+
+            self._sift_down(0)
+        else:
+            self._heap.append(key)
+            self._positions[key] = len(self._heap) - 1
+            self._items[key] = item
+
+            self._sift_up(len(self._heap) - 1)
+
+    def incr(self, key, value=1):
+        """
+        Increase the count of the existing key
+
+        :type value int
+        """
+        self._items[key]['cnt'] += value
+        self._total += value
+
+        self._sift_down(self._positions[key])
+
+    def to_dict(self):
+        """
+        :rtype: dict
+        """
+        return dict(self._items)
+
+    def _get_count(self, position):
+        return self._items[self._heap[position]]['cnt']
+
+    def _swap(self, i, j):
+        heap = self._heap
+
+        heap[i], heap[j] = heap[j], heap[i]
+        self._positions[heap[i]] = i
+        self._positions[heap[j]] = j
+
+    def _sift_up(self, position):
+        while position > 0:
+            parent = (position - 1) // 2
+
+            if self._get_count(parent) <= self._get_count(position):
+                break
+
+            self._swap(parent, position)
+            position = parent
+
+    def _sift_down(self, position):
+        size = len(self._heap)
+
+        while True:
+            smallest = position
+
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < size and self._get_count(child) < self._get_count(smallest):
+                    smallest = child
+
+            if smallest == position:
+                break
+
+            self._swap(position, smallest)
+            position = smallest
@@ -3,6 +3,11 @@ Set of helper functions
 """
 import re
 
+from reporter.hosts import get_host_index
+from reporter.predicates import In, Test
+
+PRODUCTION_ENVIRONMENTS = ['prod', 'preview', 'verify']
+
 
 def is_from_production_host(entry):
     """
@@ -13,15 +18,20 @@ def is_from_production_host(entry):
     :type entry str|dict
     :rtype: bool
     """
-    if isinstance(entry, str):
-        return re.search(r'^(ap|task|cron|job|liftium|staging|deploy|auth|staging-(ap|task))-[sr]', entry) is not None
+    if isinstance(entry, basestring):
+        return get_host_index().is_production(entry)
 
     # MediaWiki: @fields.environment   prod
     # Kubernetes: kubernetes.namespace_name	       	prod
-    return entry.get('@fields', {}).get('environment') in ['prod', 'preview', 'verify'] or \
+    return entry.get('@fields', {}).get('environment') in PRODUCTION_ENVIRONMENTS or \
         entry.get('kubernetes', {}).get('namespace_name') == 'prod'
 
 
+# predicates equivalent to is_from_production_host (see reporter/predicates.py)
+FROM_PRODUCTION_HOST = In('@fields.environment', PRODUCTION_ENVIRONMENTS) | In('kubernetes.namespace_name', ['prod'])
+FROM_PRODUCTION_HOST_NAME = Test('@source_host', lambda host: isinstance(host, basestring) and is_from_production_host(host))
+
+
 def generalize_sql(sql):
     """
     Removes most variables from an SQL query and replaces them with X or N for numbers.
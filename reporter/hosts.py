@@ -0,0 +1,135 @@
+"""
+Memoized classification of hosts (e.g. @source_host values of log entries)
+
+Only a few hundred distinct hosts are reported in logs, hence instead of running regular expressions
+for every log entry, each host is classified once and then looked up in a dict.
+
+The index can be preloaded from a file with one host name per line (REPORTER_HOSTS_LIST).
+"""
+import logging
+import os
+import re
+
+from collections import namedtuple
+
+
+# e.g. ap-s32, task-r1, staging-ap-s1
+PRODUCTION_HOST_PATTERN = r'^(ap|task|cron|job|liftium|staging|deploy|auth|staging-(ap|task))-[sr]'
+
+# e.g. ap-r20
+BACKUP_DC_HOST_PATTERN = r'\-r\d+$'
+
+Host = namedtuple('Host', ['name', 'is_production', 'datacenter'])
+
+
+class HostIndex(object):
+    """
+    host name -> Host(name, is_production, datacenter)
+    """
+    DC_MAIN = 'main'
+    DC_BACKUP = 'backup'
+    DC_PREVIEW = 'preview'
+
+    PREVIEW_HOST = 'staging-s1'
+
+    # the index is cleared when it grows above this size (protects us from bogus host names)
+    MAX_SIZE = 10000
+
+    PRODUCTION_HOST_RE = re.compile(PRODUCTION_HOST_PATTERN)
+    BACKUP_DC_HOST_RE = re.compile(BACKUP_DC_HOST_PATTERN)
+
+    def __init__(self, hosts=None):
+        """
+        :type hosts list[str]
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._hosts = dict()
+
+        if hosts:
+            self.preload(hosts)
+
+    def __len__(self):
+        return len(self._hosts)
+
+    def preload(self, hosts):
+        """
+        :type hosts list[str]
+        """
+        for host in hosts:
+            self.get(host)
+
+        self._logger.info('Preloaded {} hosts'.format(len(self._hosts)))
+
+    def preload_from_file(self, path):
+        """
+        :type path str
+        """
+        with open(path) as fp:
+            self.preload([line.strip() for line in fp if line.strip()])
+
+    def _classify(self, name):
+        """
+        :type name str
+        :rtype: Host
+        """
+        if name == self.PREVIEW_HOST:
+            datacenter = self.DC_PREVIEW
+        elif self.BACKUP_DC_HOST_RE.search(name) is not None:
+            datacenter = self.DC_BACKUP
+        else:
+            datacenter = self.DC_MAIN
+
+        return Host(
+            name=name,
+            is_production=self.PRODUCTION_HOST_RE.search(name) is not None,
+            datacenter=datacenter
+        )
+
+    def get(self, name):
+        """
+        :type name str
+        :rtype: Host
+        """
+        try:
+            return self._hosts[name]
+        except KeyError:
+            if len(self._hosts) >= self.MAX_SIZE:
+                self._logger.warning('Too many hosts indexed, clearing the index')
+                self._hosts = dict()
+
+            host = self._classify(name)
+            self._hosts[name] = host
+
+            return host
+
+    def is_production(self, name):
+        """
+        :type name str
+        :rtype: bool
+        """
+        return self.get(name).is_production
+
+    def get_datacenter(self, name):
+        """
+        :type name str
+        :rtype: str
+        """
+        return self.get(name).datacenter
+
+
+_index = None
+
+
+def get_host_index():
+    """
+    :rtype: HostIndex
+    """
+    global _index
+
+    if _index is None:
+        _index = HostIndex()
+
+        if os.environ.get('REPORTER_HOSTS_LIST'):
+            _index.preload_from_file(os.environ.get('REPORTER_HOSTS_LIST'))
+
+    return _index
@@ -0,0 +1,253 @@
+"""
+Timings and counters describing the reporter's own performance
+
+Collected values can be exported as a Prometheus textfile (node_exporter textfile collector)
+or sent as statsd (DogStatsD-tagged) lines.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class Metrics(object):
+    """
+    In-memory registry of counters and timers tagged with labels (can be updated from multiple threads)
+    """
+    PREFIX = 'jira_reporter'
+
+    def __init__(self):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+
+        self._counters = OrderedDict()  # (name, labels) -> value
+        self._timers = OrderedDict()  # (name, labels) -> [sum of seconds, count]
+
+    @staticmethod
+    def _get_key(name, labels):
+        """
+        :type name str
+        :type labels dict
+        :rtype: tuple
+        """
+        return name, tuple(sorted(labels.items()))
+
+    def incr(self, name, value=1, **labels):
+        """
+        Increase the counter by a given value
+
+        :type name str
+        :type value int
+        """
+        key = self._get_key(name, labels)
+
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def timing(self, name, seconds, **labels):
+        """
+        Record the duration (in seconds) of a given operation
+
+        :type name str
+        :type seconds float
+        """
+        key = self._get_key(name, labels)
+
+        with self._lock:
+            entry = self._timers.setdefault(key, [0.0, 0])
+
+            entry[0] += seconds
+            entry[1] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Measure the time spent in the with block
+
+        with metrics.timer('stage_seconds', stage='fetch'):
+            ...
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.timing(name, time.time() - start, **labels)
+
+    def get_counter(self, name, **labels):
+        """
+        :type name str
+        :rtype: int
+        """
+        return self._counters.get(self._get_key(name, labels), 0)
+
+    def get_timing(self, name, **labels):
+        """
+        Return the sum of recorded durations and the number of measurements
+
+        :type name str
+        :rtype: tuple
+        """
+        return tuple(self._timers.get(self._get_key(name, labels), (0.0, 0)))
+
+    def reset(self):
+        """ Forget all collected values """
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+    def _get_values(self):
+        """
+        Return copies of counters and timers, they can be updated by other threads while being formatted
+
+        :rtype: tuple
+        """
+        with self._lock:
+            counters = list(self._counters.items())
+            timers = [(key, tuple(entry)) for (key, entry) in self._timers.items()]
+
+        return counters, timers
+
+    @staticmethod
+    def _escape_label_value(value):
+        """
+        :type value str
+        :rtype: str
+        """
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def _format_prometheus_labels(self, labels):
+        """
+        :type labels tuple
+        :rtype: str
+        """
+        if not labels:
+            return ''
+
+        return '{' + ','.join(
+            '{}="{}"'.format(name, self._escape_label_value(value)) for (name, value) in labels
+        ) + '}'
+
+    def to_prometheus(self):
+        """
+        Format collected values using Prometheus text exposition format
+
+        @see https://prometheus.io/docs/instrumenting/exposition_formats/
+
+        :rtype: str
+        """
+        lines = []
+        described = set()
+        (counters, timers) = self._get_values()
+
+        for (name, labels), value in counters:
+            metric = '{}_{}'.format(self.PREFIX, name)
+
+            if metric not in described:
+                lines.append('# TYPE {} counter'.format(metric))
+                described.add(metric)
+
+            lines.append('{}{} {}'.format(metric, self._format_prometheus_labels(labels), value))
+
+        for (name, labels), (seconds, count) in timers:
+            metric = '{}_{}'.format(self.PREFIX, name)
+
+            if metric not in described:
+                lines.append('# TYPE {} summary'.format(metric))
+                described.add(metric)
+
+            lines.append('{}_sum{} {:.6f}'.format(metric, self._format_prometheus_labels(labels), seconds))
+            lines.append('{}_count{} {}'.format(metric, self._format_prometheus_labels(labels), count))
+
+        return '\n'.join(lines) + '\n'
+
+    def to_statsd(self):
+        """
+        Format collected values as statsd lines with DogStatsD-style tags
+
+        jira_reporter.hits_fetched_total:123|c|#source:PHPErrorsSource,query:PHP Notice
+
+        :rtype: list[str]
+        """
+        lines = []
+        (counters, timers) = self._get_values()
+
+        def _format_tags(labels):
+            if not labels:
+                return ''
+
+            return '|#' + ','.join('{}:{}'.format(name, str(value).replace(',', ' ').replace('|', ' '))
+                                   for (name, value) in labels)
+
+        for (name, labels), value in counters:
+            lines.append('{}.{}:{}|c{}'.format(self.PREFIX, name, value, _format_tags(labels)))
+
+        for (name, labels), (seconds, count) in timers:
+            lines.append('{}.{}:{:.3f}|ms{}'.format(self.PREFIX, name, seconds * 1000, _format_tags(labels)))
+
+        return lines
+
+    def write_textfile(self, path):
+        """
+        Atomically write metrics to a file read by node_exporter textfile collector
+
+        :type path str
+        """
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+
+        with open(tmp_path, 'w') as fp:
+            fp.write(self.to_prometheus())
+
+        os.rename(tmp_path, path)
+        self._logger.info('Metrics written to {}'.format(path))
+
+    def send_statsd(self, host, port=8125):
+        """
+        Send metrics to statsd over UDP
+
+        :type host str
+        :type port int
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        try:
+            lines = self.to_statsd()
+
+            for line in lines:
+                sock.sendto(line, (host, port))
+
+            self._logger.info('Sent {} metrics to statsd at {}:{}'.format(len(lines), host, port))
+        except socket.error:
+            self._logger.error('Sending metrics to statsd failed', exc_info=True)
+        finally:
+            sock.close()
+
+    def export(self):
+        """
+        Export metrics as configured via environment variables:
+
+        - REPORTER_METRICS_TEXTFILE - path to Prometheus textfile
+        - REPORTER_STATSD_HOST (and optional REPORTER_STATSD_PORT) - statsd address
+        """
+        textfile = os.environ.get('REPORTER_METRICS_TEXTFILE')
+        statsd_host = os.environ.get('REPORTER_STATSD_HOST')
+
+        if textfile:
+            self.write_textfile(textfile)
+
+        if statsd_host:
+            self.send_statsd(statsd_host, int(os.environ.get('REPORTER_STATSD_PORT', 8125)))
+
+
+# process-wide registry used by sources and reporters
+_metrics = Metrics()
+
+
+def get_metrics():
+    """
+    :rtype: Metrics
+    """
+    return _metrics
@@ -0,0 +1,197 @@
+"""
+Decides which reports are filed (and with which Jira fields) before any Jira request is made
+
+Classification, the MAIN project skip rule, summary truncation, fields defaults and dedupe of reports
+with the same unique_id are local decisions. They're made for the whole batch of reports first,
+so that only actionable reports are looked up in Jira.
+"""
+import logging
+
+from reporter.metrics import get_metrics
+
+
+class Filing(object):
+    """
+    A report that is going to be filed together with fields of the ticket to create
+    """
+    def __init__(self, report, fields):
+        """
+        :type report reporter.reports.Report
+        :type fields dict
+        """
+        self.report = report
+        self.fields = fields
+
+    def get_unique_id(self):
+        """
+        :rtype: str
+        """
+        return self.report.get_unique_id()
+
+    def __repr__(self):
+        return '<Filing {} ({})>'.format(self.report.get_unique_id(), self.fields['project']['key'])
+
+
+class FilingPlanner(object):
+    """
+    Turn reports into filings, skipped reports are logged and counted
+    """
+    SUMMARY_MAX_LENGTH = 250
+
+    # why reports were skipped (used by metrics)
+    REASON_MAIN = 'main'
+    REASON_DUPLICATE = 'duplicate'
+
+    def __init__(self, classifier, project, fields):
+        """
+        :type classifier reporter.classifier.Classifier
+        :type project str
+        :type fields dict
+        :arg project: the default Jira project
+        :arg fields: fields config, see JIRA_CONFIG['fields'] in docker/config.py
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._metrics = get_metrics()
+
+        self._classifier = classifier
+        self._project = project
+        self._fields = fields
+
+    def plan(self, reports, filed=None):
+        """
+        Return filings for reports that need to be looked up in Jira, in the order of reports
+
+        When there are many reports with the same unique_id, the one with the most occurrences is kept.
+
+        :type reports list[reporter.reports.Report]
+        :type filed set
+        :arg filed: unique IDs of reports filed earlier in this run (e.g. from the previous chunk), they're skipped
+        :rtype: list[Filing]
+        """
+        filings = []
+        indices = dict()  # unique_id -> index in filings
+
+        for report in reports:
+            fields = self.get_fields(report)
+
+            if fields is None:
+                self._skip(report, self.REASON_MAIN)
+                continue
+
+            unique_id = report.get_unique_id()
+
+            if filed is not None and unique_id in filed:
+                self._skip(report, self.REASON_DUPLICATE)
+                continue
+
+            if unique_id in indices:
+                index = indices[unique_id]
+
+                if report.get_counter() > filings[index].report.get_counter():
+                    self._skip(filings[index].report, self.REASON_DUPLICATE)
+                    filings[index] = Filing(report, fields)
+                else:
+                    self._skip(report, self.REASON_DUPLICATE)
+
+                continue
+
+            indices[unique_id] = len(filings)
+            filings.append(Filing(report, fields))
+
+        self._logger.info('{} of {} reports will be filed'.format(len(filings), len(reports)))
+        return filings
+
+    def _skip(self, report, reason):
+        """
+        :type report reporter.reports.Report
+        :type reason str
+        """
+        self._logger.info('Skipping "{}" ({})'.format(report.get_summary(), reason))
+        self._metrics.incr('filings_skipped_total', reason=reason)
+
+    def get_fields(self, report):
+        """
+        Return fields of the ticket to create for a given report, None when it should not be filed
+
+        "ER Date" is not set here, it's set when the ticket is created.
+
+        :type report reporter.reports.Report
+        :rtype: dict|None
+        """
+        # PLATFORM-2405: classify the report: set a proper project and component
+        (project, component_id) = self._classifier.classify(report) or (None, None)
+
+        # we do not want to file tickets in MAIN project anymore
+        if project == self._classifier.PROJECT_MAIN:
+            return None
+
+        fields = {
+            "project": {'key': project or self._project},
+            "summary": report.get_summary()[:self.SUMMARY_MAX_LENGTH],
+            "description": self.format_description(report),
+            "labels": report.get_labels()
+        }
+
+        # set default fields as defined in the config.py
+        fields.update(self._fields['default'])
+
+        if project:
+            # overwrite default fields with project specific ones
+            fields.update(self._fields.get(project, {}))
+
+        if component_id:
+            fields['components'] = [{'id': str(component_id)}]  # "expected 'id' property to be a string"
+
+        # the hash is looked up using this field (see Jira.ticket_exists)
+        unique_id_field = self._fields['custom'].get('unique_id')
+
+        if unique_id_field:
+            fields[unique_id_field] = report.get_unique_id()
+
+        return fields
+
+    @classmethod
+    def format_description(cls, report):
+        """
+        Return the report description with the hash and counter added
+
+        :type report reporter.reports.Report
+        :rtype: str
+        """
+        description = report.get_description().strip()
+
+        description += '\n\n========================\nHash: {hash}\nOccurrences: {occurrences} in the last {period}'.\
+            format(hash=report.get_unique_id(), occurrences=cls.format_occurrences(report),
+                   period=cls.format_period(report.get_period()))
+
+        return description
+
+    @staticmethod
+    def format_period(period):
+        """
+        Format the time window length for the ticket description, e.g. "hour", "6 hours", "15 minutes"
+
+        :type period int
+        :rtype: str
+        """
+        period = period or 3600
+
+        if period % 3600 == 0:
+            hours = period / 3600
+            return 'hour' if hours == 1 else '{} hours'.format(hours)
+
+        return '{} minutes'.format(period / 60)
+
+    @staticmethod
+    def format_occurrences(report):
+        """
+        Format the counter for the ticket description, e.g. "123" or "~1230 (+/- 66, estimated from 10% sample)"
+
+        :type report reporter.reports.Report
+        :rtype: str
+        """
+        if not report.get_sampling():
+            return str(report.get_counter())
+
+        return '~{counter} (+/- {margin}, estimated from {sampling}% sample)'.format(
+            counter=report.get_counter(), margin=report.get_counter_margin(), sampling=report.get_sampling())
@@ -0,0 +1,304 @@
+"""
+Declarative predicates on log entries fields
+
+A predicate can be checked for a single entry (matches) or evaluated for all entries of a Frame at once
+(evaluate). In the latter case the test is run once for every distinct value of the field.
+
+FROM_PRODUCTION = In('@fields.environment', ['prod', 'preview']) | In('kubernetes.namespace_name', ['prod'])
+FILTER = FROM_PRODUCTION & Matches('@message', r'on line \\d+') & ~Contains('@message', 'Allowed memory size of')
+
+Predicates can also be compiled into Elasticsearch filter clauses (to_elasticsearch), so that entries
+that would be filtered out are not fetched. A clause needs to match at least all entries the predicate
+matches (it can match more, the predicate is still checked for fetched entries). Only clauses matching
+exactly the same entries can be negated.
+
+Text fields are analyzed, hence phrases are matched case-insensitively, as whole words and anywhere
+in the text. Pass phrase=True to Contains and StartsWith when the substring consists of whole words,
+the phrase is then used to pre-filter entries. Such clauses match more entries than the predicate does,
+hence ~Contains and ~StartsWith are never pushed down.
+"""
+import re
+
+
+def get_field(entry, field):
+    """
+    Return the value of a given (dotted) field, e.g. "@fields.environment", None when not set
+
+    :type entry dict
+    :type field str
+    :rtype: object
+    """
+    value = entry
+
+    for part in field.split('.'):
+        if not isinstance(value, dict):
+            return None
+
+        value = value.get(part)
+
+    return value
+
+
+class Predicate(object):
+    """ Base class for predicates, they can be combined using &, | and ~ operators """
+
+    def matches(self, entry):
+        """
+        :type entry dict
+        :rtype: bool
+        """
+        raise NotImplementedError("matches() method needs to be overwritten in your class!")
+
+    def evaluate(self, frame):
+        """
+        Return the mask for all entries of a given frame
+
+        :type frame reporter.frame.Frame
+        :rtype: list[bool]
+        """
+        return [self.matches(entry) for entry in frame.get_entries()]
+
+    def to_elasticsearch(self):
+        """
+        Return Elasticsearch query clause matching (at least) all entries this predicate matches,
+        None when the predicate can not be expressed as a query
+
+        :rtype: dict|None
+        """
+        return None
+
+    def is_exact(self):
+        """
+        Does to_elasticsearch() match exactly the same entries as the predicate?
+
+        :rtype: bool
+        """
+        return False
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+
+class FieldPredicate(Predicate):
+    """ Base class for predicates testing the value of a single field """
+
+    def __init__(self, field):
+        """
+        :type field str
+        """
+        self.field = field
+
+    def test(self, value):
+        """
+        :type value object
+        :rtype: bool
+        """
+        raise NotImplementedError("test() method needs to be overwritten in your class!")
+
+    def matches(self, entry):
+        return self.test(get_field(entry, self.field))
+
+    def evaluate(self, frame):
+        return frame.map_distinct(self.field, self.test)
+
+    def __repr__(self):
+        return '<{} {}>'.format(self.__class__.__name__, self.field)
+
+
+class Exists(FieldPredicate):
+    """ The field is set """
+
+    def test(self, value):
+        return value is not None
+
+    def to_elasticsearch(self):
+        return {'exists': {'field': self.field}}
+
+    def is_exact(self):
+        return True
+
+
+class In(FieldPredicate):
+    """ The field is equal to one of given values """
+
+    def __init__(self, field, values):
+        """
+        :type field str
+        :type values list
+        """
+        super(In, self).__init__(field)
+        self.values = values
+
+    def test(self, value):
+        return value in self.values
+
+    def _is_numeric(self):
+        return all(isinstance(value, (int, long)) and not isinstance(value, bool) for value in self.values)
+
+    def to_elasticsearch(self):
+        if None in self.values:
+            return None
+
+        # numbers are compared exactly
+        if self._is_numeric():
+            return {'terms': {self.field: list(self.values)}}
+
+        # match_phrase works for both text and keyword fields
+        return {
+            'bool': {
+                'should': [{'match_phrase': {self.field: value}} for value in self.values],
+                'minimum_should_match': 1,
+            }
+        }
+
+    def is_exact(self):
+        return None not in self.values and self._is_numeric()
+
+
+class Contains(FieldPredicate):
+    """ The field is a string containing a given substring """
+
+    def __init__(self, field, substring, phrase=False):
+        """
+        :type field str
+        :type substring str
+        :type phrase bool
+        :arg phrase: the substring is a phrase of whole words (used as a pre-filter, see the module doc)
+        """
+        super(Contains, self).__init__(field)
+        self.substring = substring
+        self.phrase = phrase
+
+    def test(self, value):
+        return isinstance(value, basestring) and self.substring in value
+
+    def to_elasticsearch(self):
+        return {'match_phrase': {self.field: self.substring.strip()}} if self.phrase else None
+
+
+class StartsWith(Contains):
+    """ The field is a string starting with a given prefix """
+
+    def test(self, value):
+        return isinstance(value, basestring) and value.startswith(self.substring)
+
+
+class Matches(FieldPredicate):
+    """ The field is a string matching a given regular expression (re.search is used) """
+
+    def __init__(self, field, pattern, flags=0, phrase=None):
+        """
+        :type field str
+        :type pattern str
+        :type flags int
+        :type phrase str
+        :arg phrase: a phrase that every matching value contains (used to compile the predicate)
+        """
+        super(Matches, self).__init__(field)
+
+        self.pattern = pattern
+        self.regex = re.compile(pattern, flags)
+        self.phrase = phrase
+
+    def test(self, value):
+        return isinstance(value, basestring) and self.regex.search(value) is not None
+
+    def to_elasticsearch(self):
+        return {'match_phrase': {self.field: self.phrase}} if self.phrase else None
+
+
+class Test(FieldPredicate):
+    """ A given function returns True for the field's value """
+
+    def __init__(self, field, func):
+        """
+        :type field str
+        :type func callable
+        """
+        super(Test, self).__init__(field)
+        self.func = func
+
+    def test(self, value):
+        return self.func(value) is True
+
+
+class And(Predicate):
+    """ All predicates match """
+
+    def __init__(self, *predicates):
+        # flatten (a & b) & c
+        self.predicates = sum([p.predicates if isinstance(p, And) else (p,) for p in predicates], ())
+
+    def matches(self, entry):
+        return all(predicate.matches(entry) for predicate in self.predicates)
+
+    def evaluate(self, frame):
+        masks = [predicate.evaluate(frame) for predicate in self.predicates]
+        return [all(values) for values in zip(*masks)]
+
+    def to_elasticsearch(self):
+        # predicates that can not be compiled are skipped (the clause matches more entries)
+        clauses = [predicate.to_elasticsearch() for predicate in self.predicates]
+        clauses = [clause for clause in clauses if clause is not None]
+
+        if len(clauses) < 2:
+            return clauses[0] if clauses else None
+
+        return {'bool': {'filter': clauses}}
+
+    def is_exact(self):
+        return all(predicate.is_exact() for predicate in self.predicates)
+
+
+class Or(Predicate):
+    """ Any of predicates matches """
+
+    def __init__(self, *predicates):
+        # flatten (a | b) | c
+        self.predicates = sum([p.predicates if isinstance(p, Or) else (p,) for p in predicates], ())
+
+    def matches(self, entry):
+        return any(predicate.matches(entry) for predicate in self.predicates)
+
+    def evaluate(self, frame):
+        masks = [predicate.evaluate(frame) for predicate in self.predicates]
+        return [any(values) for values in zip(*masks)]
+
+    def to_elasticsearch(self):
+        clauses = [predicate.to_elasticsearch() for predicate in self.predicates]
+
+        if None in clauses:
+            return None
+
+        return {'bool': {'should': clauses, 'minimum_should_match': 1}}
+
+    def is_exact(self):
+        return all(predicate.is_exact() for predicate in self.predicates)
+
+
+class Not(Predicate):
+    """ The predicate does not match """
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    def matches(self, entry):
+        return not self.predicate.matches(entry)
+
+    def evaluate(self, frame):
+        return [not value for value in self.predicate.evaluate(frame)]
+
+    def to_elasticsearch(self):
+        if not self.predicate.is_exact():
+            return None
+
+        return {'bool': {'must_not': [self.predicate.to_elasticsearch()]}}
+
+    def is_exact(self):
+        return self.predicate.is_exact()
@@ -0,0 +1,261 @@
+"""
+Opt-in memory profiling of sources
+
+Takes RSS readings (and tracemalloc snapshots when available) around each source.query() call,
+logs peak usage, retained memory and the top allocation sites and writes a JSON summary.
+
+Enable it by setting REPORTER_MEMORY_PROFILE environment variable to the summary file path.
+
+Readings are process-wide, i.e. they include allocations made by other threads. Sources are queried
+one by one when profiling is enabled (see Source.query_async and bin/check.py), "threads" entry
+of the summary tells whether other threads were running anyway.
+"""
+import json
+import logging
+import os
+import resource
+import threading
+
+from contextlib import contextmanager
+
+try:
+    import tracemalloc  # Python 3.4+ or pytracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+class MemoryProfiler(object):
+    """
+    Collects per-source memory usage stats
+    """
+    TOP_ALLOCATORS = 10
+
+    PROC_STATUS = '/proc/self/status'
+    PROC_CLEAR_REFS = '/proc/self/clear_refs'
+
+    def __init__(self, summary_path=None, top_allocators=TOP_ALLOCATORS):
+        """
+        :type summary_path str
+        :type top_allocators int
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._summary_path = summary_path
+        self._top_allocators = top_allocators
+
+        self._entries = []
+
+        if tracemalloc is not None:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+        else:
+            self._logger.info('tracemalloc is not available, only RSS will be reported')
+
+    def _read_proc_status(self, field):
+        """
+        Return the value of a given field from /proc/self/status (in bytes)
+
+        :type field str
+        :rtype: int|None
+        """
+        try:
+            with open(self.PROC_STATUS) as fp:
+                for line in fp:
+                    if line.startswith(field + ':'):
+                        return int(line.split()[1]) * 1024  # values are in kB
+        except (IOError, OSError, ValueError):
+            pass
+
+        return None
+
+    def get_rss(self):
+        """
+        :rtype: int|None
+        """
+        return self._read_proc_status('VmRSS')
+
+    def get_peak_rss(self):
+        """
+        Return the peak RSS since the last reset_peak_rss() call (or process start)
+
+        :rtype: int
+        """
+        peak = self._read_proc_status('VmHWM')
+
+        if peak is None:
+            # ru_maxrss is given in kB on Linux
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+        return peak
+
+    def reset_peak_rss(self):
+        """
+        Reset VmHWM so that we get a peak RSS of a single source (Linux 4.0+)
+        """
+        try:
+            with open(self.PROC_CLEAR_REFS, 'w') as fp:
+                fp.write('5')
+        except (IOError, OSError):
+            pass
+
+    @contextmanager
+    def profile(self, source, query=''):
+        """
+        Profile memory usage of the code run inside the with block
+
+        :type source str
+        :type query str
+        """
+        self.reset_peak_rss()
+        rss_before = self.get_rss()
+
+        snapshot_before = None
+        if tracemalloc is not None:
+            snapshot_before = tracemalloc.take_snapshot()
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+
+        try:
+            yield
+        finally:
+            entry = {
+                'source': source,
+                'query': query,
+                'rss_before': rss_before,
+                'rss_after': self.get_rss(),
+                'rss_peak': self.get_peak_rss(),
+                'threads': threading.active_count(),
+                'traced_peak': None,
+                'top_allocators': [],
+            }
+
+            entry['retained'] = entry['rss_after'] - rss_before \
+                if entry['rss_after'] is not None and rss_before is not None else None
+
+            if snapshot_before is not None:
+                entry['traced_peak'] = tracemalloc.get_traced_memory()[1]
+
+                # do not report allocations made by tracemalloc itself
+                ignored = [tracemalloc.Filter(False, tracemalloc.__file__)]
+
+                stats = tracemalloc.take_snapshot().filter_traces(ignored).compare_to(
+                    snapshot_before.filter_traces(ignored), 'lineno')
+
+                entry['top_allocators'] = [
+                    {
+                        'location': str(stat.traceback),
+                        'size': stat.size_diff,
+                        'count': stat.count_diff,
+                    }
+                    for stat in stats[:self._top_allocators]
+                ]
+
+            self._log_entry(entry)
+            self._entries.append(entry)
+
+    @staticmethod
+    def _format_bytes(value):
+        """
+        :type value int|None
+        :rtype: str
+        """
+        if value is None:
+            return 'n/a'
+
+        return '{:.1f} MiB'.format(float(value) / 1024 / 1024)
+
+    def _log_entry(self, entry):
+        """
+        :type entry dict
+        """
+        self._logger.info('{source} ({query}): peak RSS {peak}, retained {retained}, traced peak {traced}'.format(
+            source=entry['source'],
+            query=entry['query'],
+            peak=self._format_bytes(entry['rss_peak']),
+            retained=self._format_bytes(entry['retained']),
+            traced=self._format_bytes(entry['traced_peak'])
+        ))
+
+        for allocator in entry['top_allocators']:
+            self._logger.info('> {location}: {size} in {count} blocks'.format(
+                location=allocator['location'],
+                size=self._format_bytes(allocator['size']),
+                count=allocator['count']
+            ))
+
+    def get_entries(self):
+        """
+        :rtype: list[dict]
+        """
+        return self._entries
+
+    def get_summary(self):
+        """
+        :rtype: dict
+        """
+        return {
+            'process_peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+            'sources': self._entries,
+        }
+
+    def write_summary(self, path=None):
+        """
+        Write machine-readable summary (JSON) of all profiled sources
+
+        :type path str
+        """
+        path = path or self._summary_path
+
+        if not path:
+            return
+
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+
+        with open(tmp_path, 'w') as fp:
+            json.dump(self.get_summary(), fp, indent=True)
+
+        os.rename(tmp_path, path)
+        self._logger.info('Memory profile summary written to {}'.format(path))
+
+
+# process-wide profiler, disabled by default
+_profiler = None
+
+
+def setup_memory_profiler(summary_path=None):
+    """
+    Enable memory profiling when REPORTER_MEMORY_PROFILE environment variable
+    (or summary_path argument) is set
+
+    :type summary_path str
+    :rtype: MemoryProfiler|None
+    """
+    global _profiler
+
+    summary_path = summary_path or os.environ.get('REPORTER_MEMORY_PROFILE')
+
+    if summary_path:
+        _profiler = MemoryProfiler(summary_path=summary_path)
+
+    return _profiler
+
+
+def get_memory_profiler():
+    """
+    :rtype: MemoryProfiler|None
+    """
+    return _profiler
+
+
+@contextmanager
+def profile_memory(source, query=''):
+    """
+    Profile the with block when memory profiling is enabled, do nothing otherwise
+
+    :type source str
+    :type query str
+    """
+    if _profiler is None:
+        yield
+    else:
+        with _profiler.profile(source, query):
+            yield
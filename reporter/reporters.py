@@ -4,6 +4,7 @@ Contains handling of different services that reports can be sent to
 """
 import json
 import logging
+import os
 import time
 import datetime
 
@@ -14,6 +15,9 @@ from jira.client import JIRA
 
 from .config import JIRA_CONFIG
 from reporter.classifier import Classifier
+from reporter.metrics import get_metrics
+from reporter.planner import FilingPlanner
+from reporter.ticket_cache import TicketCache
 
 
 class Jira(object):
@@ -23,7 +27,13 @@ class Jira(object):
     @see http://jira-python.readthedocs.org/en/latest/
     """
 
-    JQL = "description ~ '{hash_value}'"
+    # tickets are looked up using "unique_id" custom field, the hash is then compared with the field's value
+    JQL = "{field} ~ '\"{hash_value}\"'"
+
+    # tickets filed before the field was set have the hash in the description only (see bin/backfill_unique_id.py),
+    # they're searched for only when JIRA_CONFIG['legacy_lookup_before'] is set (e.g. 2018-11-20)
+    JQL_LEGACY = "description ~ '{hash_value}'"
+    JQL_CREATED_BEFORE = " AND created < '{date}'"
 
     REOPEN_AFTER_DAYS = 14  # reopen still valid tickets when they were closed X days ago
     REOPEN_TRANSITION_COMMENT = '[~{assignee}], I reopened this ticket - logs say it is still valid'
@@ -32,17 +42,33 @@ class Jira(object):
     RESOLUTION_WONT_FIX = "Won't Fix"
     RESOLUTION_DUPLICATE = "Duplicate"
 
+    # outcomes of report() call (used by metrics)
+    RESULT_CREATED = 'created'
+    RESULT_DUPLICATE = 'duplicate'
+    RESULT_SKIPPED = 'skipped'
+    RESULT_FAILED = 'failed'
+
     def __init__(self):
         self._logger = logging.getLogger('Jira')
+        self._metrics = get_metrics()
         self._jira = JIRA(server=JIRA_CONFIG['url'], basic_auth=[JIRA_CONFIG['user'], JIRA_CONFIG['password']])
 
         self._fields = JIRA_CONFIG.get('fields')
         self._last_seen_field = self._fields['custom']['last_seen']
+        self._unique_id_field = self._fields['custom'].get('unique_id')  # e.g. customfield_13200
+        self._legacy_lookup_before = JIRA_CONFIG.get('legacy_lookup_before')  # when the field was rolled out
 
         self._project = JIRA_CONFIG.get('project')
         self._server = self._jira.client_info()
 
         self._classifier = Classifier()
+        self._planner = FilingPlanner(classifier=self._classifier, project=self._project, fields=self._fields)
+
+        # skip Jira lookups for tickets that were recently confirmed to exist
+        self._ticket_cache = TicketCache(
+            path=os.environ.get('REPORTER_TICKET_CACHE'),
+            ttl=int(os.environ.get('REPORTER_TICKET_CACHE_TTL', 0))
+        )
 
         self._logger.info("Using {} project on <{}>".format(self._project, self._server))
 
@@ -52,6 +78,82 @@ class Jira(object):
     def _get_issue_url(self, issue_id):
         return '{server}/browse/{issue_id}'.format(server=self._server, issue_id=issue_id)
 
+    def get_unique_id_field(self):
+        """
+        Return the ID of the custom field with the report's hash, e.g. customfield_13200 (None when not configured)
+
+        :rtype: str|None
+        """
+        return self._unique_id_field
+
+    @staticmethod
+    def get_field_jql_name(field):
+        """
+        Return JQL name of a given custom field, e.g. cf[13200] for customfield_13200
+
+        :type field str
+        :rtype: str
+        """
+        return 'cf[{}]'.format(field.replace('customfield_', ''))
+
+    def _search_tickets(self, unique_id):
+        """
+        Return tickets with a given unique_id
+
+        The custom field is searched first. When legacy_lookup_before is configured, the description of tickets
+        created before that date is searched as well (tickets found that way get the field set, so that the next
+        lookups are exact). Remove it from the config once bin/backfill_unique_id.py was run.
+
+        :type unique_id str
+        :rtype: list[jira.resources.Issue]
+        """
+        if self._unique_id_field:
+            self._metrics.incr('jira_calls_total', call='search')
+            tickets = self._jira.search_issues(
+                self.JQL.format(field=self.get_field_jql_name(self._unique_id_field), hash_value=unique_id)
+            )
+
+            # the text search is fuzzy, compare the values
+            tickets = [ticket for ticket in tickets
+                       if getattr(ticket.fields, self._unique_id_field, None) == unique_id]
+
+            if tickets or not self._legacy_lookup_before:
+                self._metrics.incr('jira_lookups_total', by='field', found=str(len(tickets) > 0).lower())
+                return tickets
+
+        jql = self.JQL_LEGACY.format(hash_value=unique_id)
+
+        if self._unique_id_field:
+            jql += self.JQL_CREATED_BEFORE.format(date=self._legacy_lookup_before)
+
+        self._metrics.incr('jira_calls_total', call='search')
+        tickets = self._jira.search_issues(jql)
+
+        self._metrics.incr('jira_lookups_total', by='description', found=str(len(tickets) > 0).lower())
+
+        if self._unique_id_field:
+            for ticket in tickets:
+                self.set_unique_id(ticket, unique_id)
+
+        return tickets
+
+    def set_unique_id(self, ticket, unique_id):
+        """
+        Set the custom field with the report's hash for a given ticket
+
+        :type ticket jira.resources.Issue
+        :type unique_id str
+        :rtype: bool
+        """
+        try:
+            self._logger.info('Setting the unique ID of {}'.format(ticket.key))
+            self._metrics.incr('jira_calls_total', call='update')
+            ticket.update(fields={self._unique_id_field: unique_id})
+            return True
+        except Exception:
+            self._logger.error('Failed to set the unique ID field ({})'.format(self._unique_id_field), exc_info=True)
+            return False
+
     def ticket_exists(self, unique_id):
         """
         Checks if ticket with a given unique_id exists
@@ -59,9 +161,17 @@ class Jira(object):
         :type unique_id str
         """
         self._logger.info('Checking {} unique ID...'.format(unique_id))
-        tickets = self._jira.search_issues(
-            self.JQL.format(hash_value=unique_id)
-        )
+
+        cached = self._ticket_cache.get(unique_id)
+
+        if cached is not None:
+            self._logger.info('<{url}> was recently confirmed ({status})'.format(
+                url=self._get_issue_url(cached['key']), status=cached['resolution'] or cached['status']))
+            self._metrics.incr('jira_ticket_cache_total', result='hit')
+            return True
+
+        self._metrics.incr('jira_ticket_cache_total', result='miss')
+        tickets = self._search_tickets(unique_id)
 
         if len(tickets) > 0:
             self._logger.info('Found {} ticket(s)'.format(len(tickets)))
@@ -82,6 +192,7 @@ class Jira(object):
                     if str(fields.resolution) != self.RESOLUTION_WONT_FIX and \
                             str(fields.resolution) != self.RESOLUTION_DUPLICATE:
                         self._logger.info('Updating ER date')
+                        self._metrics.incr('jira_calls_total', call='update')
                         ticket.update(fields={
                             self._last_seen_field: self.get_today_timestamp()
                         })
@@ -100,16 +211,19 @@ class Jira(object):
                         # get transition ID for Open status, it varies between projects
                         transitions = {}
 
+                        self._metrics.incr('jira_calls_total', call='transitions')
                         for transition in self.get_api_client().transitions(issue=ticket):
                             transitions[transition['name']] = transition['id']
 
                         # reopen and comment the ticket
                         try:
+                            self._metrics.incr('jira_calls_total', call='transition')
                             self.get_api_client().transition_issue(
                                 issue=ticket,
                                 transitionId=transitions['Open']
                             )
 
+                            self._metrics.incr('jira_calls_total', call='comment')
                             self.get_api_client().add_comment(
                                 issue=ticket,
                                 body=self.REOPEN_TRANSITION_COMMENT.format(
@@ -119,10 +233,30 @@ class Jira(object):
                         except Exception:
                             self._logger.error('Failed to reopen {}'.format(ticket), exc_info=True)
 
+            self._cache_tickets(unique_id, tickets)
             return True
         else:
             return False
 
+    def _cache_tickets(self, unique_id, tickets):
+        """
+        Remember the ticket found for a given unique_id, closed tickets that can be reopened are never cached
+
+        :type unique_id str
+        :type tickets list[jira.resources.Issue]
+        """
+        entries = [
+            (ticket.key, str(ticket.fields.status), str(ticket.fields.resolution) if ticket.fields.resolution else None)
+            for ticket in tickets
+        ]
+
+        # keep the ticket that needs to be checked again if there's any
+        entries.sort(key=lambda (_, status, resolution): status == self.STATUS_CLOSED and
+                     resolution not in (self.RESOLUTION_WONT_FIX, self.RESOLUTION_DUPLICATE), reverse=True)
+
+        (key, status, resolution) = entries[0]
+        self._ticket_cache.set(unique_id, key, status, resolution)
+
     @staticmethod
     def get_today_timestamp():
         """
@@ -147,6 +281,21 @@ class Jira(object):
 
         return resolution_date is not None and resolution_date < resolution_threshold
 
+    def plan(self, reports, filed=None):
+        """
+        Return filings for reports that need to be looked up in Jira (see reporter/planner.py)
+
+        :type reports list[reporter.reports.Report]
+        :type filed set
+        :rtype: list[reporter.planner.Filing]
+        """
+        filings = self._planner.plan(reports, filed)
+
+        if len(filings) < len(reports):
+            self._metrics.incr('jira_reports_total', len(reports) - len(filings), result=self.RESULT_SKIPPED)
+
+        return filings
+
     def report(self, report):
         """
         Send given report to JIRA
@@ -155,55 +304,54 @@ class Jira(object):
 
         :type report reporter.reports.Report
         """
-        self._logger.info('Reporting "{}"'.format(report.get_summary()))
-
-        # let's first check if the report is already in JIRA
-        # use "hash" added to a ticket description
-        try:
-            if self.ticket_exists(report.get_unique_id()):
-                return False
-        except Exception:
-            self._logger.error('Failed to look up ticket duplicates', exc_info=True)
-            return False
+        reported = any([self.file(filing) == self.RESULT_CREATED for filing in self.plan([report])])
+        self.flush()
 
-        # add a hash and counter
-        description = report.get_description().strip()
+        return reported
 
-        description += '\n\n========================\nHash: {hash}\nOccurrences: {counter} in the last hour'.format(
-            hash=report.get_unique_id(), counter=report.get_counter()
-        )
+    def flush(self):
+        """
+        Write tickets confirmed by the filings so far to the cache (see reporter/ticket_cache.py)
+        """
+        self._ticket_cache.save()
 
-        # it's not, create a ticket
-        ticket_dict = {
-            "project": {'key': self._project},
-            "summary": report.get_summary()[:250],
-            "description": description,
-            "labels": report.get_labels()
-        }
+    def file(self, filing):
+        """
+        Create the ticket for a given filing (see plan) unless it's already in JIRA, return the outcome
 
-        # set default fields as defined in the config.py
-        ticket_dict.update(self._fields['default'])
+        RESULT_FAILED is returned when either the lookup or the ticket creation failed (file the report again).
 
-        # PLATFORM-2405: classify the report: set a proper project and component
-        (project, component_id) = None, None
+        :type filing reporter.planner.Filing
+        :rtype: str
+        """
+        with self._metrics.timer('jira_report_seconds'):
+            result = self._file(filing)
 
-        classification = self._classifier.classify(report)
+        self._metrics.incr('jira_reports_total', result=result)
+        return result
 
-        if classification:
-            (project, component_id) = classification
+    def _file(self, filing):
+        """
+        :type filing reporter.planner.Filing
+        :rtype: str
+        """
+        report = filing.report
+        self._logger.info('Reporting "{}"'.format(report.get_summary()))
 
-        # we do not want to file tickets in MAIN project anymore
-        if project == self._classifier.PROJECT_MAIN:
-            self._logger.info('MAIN tickets are now skipped')
-            return False
+        # let's first check if the report is already in JIRA
+        # use "hash" stored in the unique_id field (or added to the description of legacy tickets)
+        try:
+            with self._metrics.timer('jira_stage_seconds', stage='lookup'):
+                exists = self.ticket_exists(report.get_unique_id())
 
-        if project:
-            ticket_dict['project']['key'] = project
-            # overwrite default fields with project specific ones
-            ticket_dict.update(self._fields.get(project, {}))
+            if exists:
+                return self.RESULT_DUPLICATE
+        except Exception:
+            self._logger.error('Failed to look up ticket duplicates', exc_info=True)
+            return self.RESULT_FAILED
 
-        if component_id:
-            ticket_dict['components'] = [{'id': str(component_id)}]  # "expected 'id' property to be a string"
+        # it's not, create a ticket
+        ticket_dict = dict(filing.fields)
 
         # PLATFORM-2441: set "ER Date" to indicate when was the last time this ticket was still valid
         ticket_dict[self._last_seen_field] = self.get_today_timestamp()
@@ -212,12 +360,17 @@ class Jira(object):
         self._logger.info('Reporting {}'.format(json.dumps(ticket_dict)))
 
         try:
-            new_issue = self._jira.create_issue(fields=ticket_dict)
+            self._metrics.incr('jira_calls_total', call='create')
+
+            with self._metrics.timer('jira_stage_seconds', stage='create'):
+                new_issue = self._jira.create_issue(fields=ticket_dict)
+
             issue_id = new_issue.key
 
             self._logger.info('Reported <{}>'.format(self._get_issue_url(issue_id)))
+            self._ticket_cache.set(report.get_unique_id(), issue_id, str(new_issue.fields.status))
         except Exception:
             self._logger.error('Failed to report a ticket', exc_info=True)
-            return False
+            return self.RESULT_FAILED
 
-        return True
+        return self.RESULT_CREATED
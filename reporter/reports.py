@@ -16,6 +16,9 @@ class Report(object):
             self.add_label(label)
 
         self._counter = False
+        self._period = False
+        self._sampling = False
+        self._counter_margin = False
         self._unique_id = False
         self._url = False
 
@@ -35,6 +38,27 @@ class Report(object):
         """ Get occurrences counter """
         return self._counter
 
+    def set_period(self, period):
+        """ Set the length (in seconds) of the time window occurrences were counted in """
+        self._period = period
+
+    def get_period(self):
+        """ Get the length (in seconds) of the time window occurrences were counted in """
+        return self._period
+
+    def set_sampling(self, sampling, counter_margin):
+        """ Mark the counter as estimated from a given percentage of entries (with a given margin of error) """
+        self._sampling = sampling
+        self._counter_margin = counter_margin
+
+    def get_sampling(self):
+        """ Get the percentage of entries the counter was estimated from """
+        return self._sampling
+
+    def get_counter_margin(self):
+        """ Get the margin of error of the estimated counter """
+        return self._counter_margin
+
     def set_url(self, url):
         """ Set URL for this report """
         self._url = url
@@ -64,6 +88,36 @@ class Report(object):
         """ Get report labels """
         return self._labels
 
+    def to_dict(self):
+        """ Returns JSON-serializable representation of the report (see from_dict) """
+        return {
+            'summary': self._summary,
+            'description': self._description,
+            'labels': self._labels,
+            'counter': self._counter,
+            'period': self._period,
+            'sampling': self._sampling,
+            'counter_margin': self._counter_margin,
+            'unique_id': self._unique_id,
+            'url': self._url,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """ Creates the report from the representation returned by to_dict """
+        report = cls(summary=data['summary'], description=data['description'])
+
+        for label in data['labels']:
+            report.add_label(label)
+
+        report.set_counter(data['counter'])
+        report.set_period(data['period'])
+        report.set_sampling(data['sampling'], data['counter_margin'])
+        report.set_unique_id(data['unique_id'])
+        report.set_url(data['url'])
+
+        return report
+
     def __repr__(self):
         """ Returns human readable representation of the object """
         return '<Report: {summary} [{labels}] ({unique_id})>\n{description}'.format(
@@ -0,0 +1,309 @@
+"""
+Local history of per-key occurrences counts (hourly rollups)
+
+Each run's per-key counts are stored, so that trends and multi-hour totals
+can be checked without querying Elasticsearch again.
+
+Enable it by setting REPORTER_ROLLUPS_PATH to a directory path.
+"""
+import json
+import logging
+import mmap
+import os
+import time
+
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+
+
+class RollupStore(object):
+    """
+    Keys are mapped to rows of per-day count matrices (a row per key, a column per hour of the day).
+
+    directory/
+      keys.json          - key -> row index
+      counts-YYYYMMDD    - memory-mapped matrix of unsigned 32-bit counts (grows as new keys are added)
+    """
+    HOUR = 3600
+    DAY = 86400
+    HOURS = 24
+
+    # matrices are extended by this many rows at once
+    ROWS_CHUNK = 1024
+
+    TYPECODE = 'I'
+
+    def __init__(self, path):
+        """
+        :type path str
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._path = path
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        self._keys = self._load_keys()
+        self._keys_changed = False
+
+        self._maps = dict()  # day -> (file, mmap)
+        self._cell_size = array(self.TYPECODE).itemsize
+
+    def _get_keys_path(self):
+        return os.path.join(self._path, 'keys.json')
+
+    def _load_keys(self):
+        """
+        :rtype: OrderedDict
+        """
+        if os.path.exists(self._get_keys_path()):
+            with open(self._get_keys_path()) as fp:
+                return OrderedDict(sorted(json.load(fp).items(), key=lambda item: item[1]))
+
+        return OrderedDict()
+
+    def _save_keys(self):
+        tmp_path = '{}.{}.tmp'.format(self._get_keys_path(), os.getpid())
+
+        with open(tmp_path, 'w') as fp:
+            json.dump(self._keys, fp)
+
+        os.rename(tmp_path, self._get_keys_path())
+        self._keys_changed = False
+
+    @classmethod
+    def _get_day(cls, timestamp):
+        """
+        :type timestamp int
+        :rtype: str
+        """
+        return datetime.utcfromtimestamp(timestamp).strftime('%Y%m%d')
+
+    def _get_row_size(self):
+        return self.HOURS * self._cell_size
+
+    def _get_map(self, day, rows=0):
+        """
+        Return memory-mapped matrix for a given day with at least a given number of rows
+
+        :type day str
+        :type rows int
+        :rtype: mmap.mmap|None
+        """
+        path = os.path.join(self._path, 'counts-{}'.format(day))
+
+        if day in self._maps:
+            (fp, counts) = self._maps[day]
+
+            if len(counts) >= rows * self._get_row_size():
+                return counts
+
+            counts.close()
+            fp.close()
+            del self._maps[day]
+        elif not os.path.exists(path):
+            if not rows:
+                return None
+
+            open(path, 'wb').close()
+
+        size = os.path.getsize(path)
+
+        if size == 0 and not rows:
+            return None
+
+        fp = open(path, 'r+b')
+
+        if size < rows * self._get_row_size():
+            # extend the file by a chunk of rows (filled with zeros)
+            chunks = (rows + self.ROWS_CHUNK - 1) // self.ROWS_CHUNK
+            size = chunks * self.ROWS_CHUNK * self._get_row_size()
+
+            fp.truncate(size)
+
+        counts = mmap.mmap(fp.fileno(), size)
+        self._maps[day] = (fp, counts)
+
+        return counts
+
+    def _get_index(self, key):
+        """
+        :type key str
+        :rtype: int
+        """
+        if key not in self._keys:
+            self._keys[key] = len(self._keys)
+            self._keys_changed = True
+
+        return self._keys[key]
+
+    def add_counts(self, counts, timestamp=None):
+        """
+        Add per-key counts to the hour of a given timestamp
+
+        :type counts dict
+        :type timestamp int
+        """
+        timestamp = int(timestamp or time.time())
+        day = self._get_day(timestamp)
+        hour = (timestamp % self.DAY) // self.HOUR
+
+        indices = [(self._get_index(key), count) for (key, count) in counts.items()]
+        matrix = self._get_map(day, rows=len(self._keys))
+
+        for (index, count) in indices:
+            offset = index * self._get_row_size() + hour * self._cell_size
+
+            cell = array(self.TYPECODE, matrix[offset:offset + self._cell_size])
+            cell[0] += count
+
+            matrix[offset:offset + self._cell_size] = cell.tostring()
+
+        if self._keys_changed:
+            self._save_keys()
+
+    def flush(self):
+        """
+        Write changes to the disk
+        """
+        for (_, counts) in self._maps.values():
+            counts.flush()
+
+    def close(self):
+        self.flush()
+
+        for (fp, counts) in self._maps.values():
+            counts.close()
+            fp.close()
+
+        self._maps = dict()
+
+    def _iter_hours(self, since, until):
+        """
+        Yield (day, first hour, last hour) ranges covering a given time range
+
+        :type since int
+        :type until int
+        """
+        start = since - since % self.HOUR
+
+        while start <= until:
+            day_start = start - start % self.DAY
+            day_end = min(until, day_start + self.DAY - 1)
+
+            yield self._get_day(start), (start % self.DAY) // self.HOUR, (day_end % self.DAY) // self.HOUR
+
+            start = day_start + self.DAY
+
+    def get_totals(self, since, until=None):
+        """
+        Return the sum of counts of all keys in a given time range (hourly resolution)
+
+        :type since int
+        :type until int
+        :rtype: dict
+        """
+        until = int(until or time.time())
+        totals = [0] * len(self._keys)
+
+        for (day, first_hour, last_hour) in self._iter_hours(since, until):
+            matrix = self._get_map(day)
+
+            if matrix is None:
+                continue
+
+            # read the entire matrix at once
+            counts = array(self.TYPECODE, matrix[:min(len(matrix), len(totals) * self._get_row_size())])
+
+            for index in range(len(counts) // self.HOURS):
+                row = index * self.HOURS
+                totals[index] += sum(counts[row + first_hour:row + last_hour + 1])
+
+        return dict((key, totals[index]) for (key, index) in self._keys.items() if totals[index])
+
+    def get_total(self, key, since, until=None):
+        """
+        :type key str
+        :type since int
+        :type until int
+        :rtype: int
+        """
+        return sum(self.get_history(key, since, until))
+
+    def get_history(self, key, since, until=None):
+        """
+        Return hourly counts of a given key
+
+        :type key str
+        :type since int
+        :type until int
+        :rtype: list[int]
+        """
+        until = int(until or time.time())
+        history = []
+
+        index = self._keys.get(key)
+
+        for (day, first_hour, last_hour) in self._iter_hours(since, until):
+            matrix = self._get_map(day)
+
+            if index is None or matrix is None or len(matrix) < (index + 1) * self._get_row_size():
+                history += [0] * (last_hour - first_hour + 1)
+                continue
+
+            offset = index * self._get_row_size()
+            row = array(self.TYPECODE, matrix[offset:offset + self._get_row_size()])
+
+            history += row[first_hour:last_hour + 1].tolist()
+
+        return history
+
+    def get_top_movers(self, period=DAY, now=None, limit=10):
+        """
+        Return keys with the highest increase of counts in the last period when compared to the period before
+
+        :type period int
+        :type now int
+        :type limit int
+        :rtype: list[tuple]
+        """
+        now = int(now or time.time())
+
+        # compare full hours (the current one included)
+        end = now - now % self.HOUR + self.HOUR - 1
+
+        current = self.get_totals(since=end - period + 1, until=end)
+        previous = self.get_totals(since=end - 2 * period + 1, until=end - period)
+
+        movers = [(key, count - previous.get(key, 0)) for (key, count) in current.items()]
+        movers.sort(key=lambda item: item[1], reverse=True)
+
+        return [(key, change) for (key, change) in movers[:limit] if change > 0]
+
+
+_store = None
+
+
+def setup_rollup_store(path=None):
+    """
+    Enable the rollup store when the path is provided (either directly or via REPORTER_ROLLUPS_PATH)
+
+    :type path str
+    :rtype: RollupStore|None
+    """
+    global _store
+
+    path = path or os.environ.get('REPORTER_ROLLUPS_PATH')
+
+    if path:
+        _store = RollupStore(path)
+
+    return _store
+
+
+def get_rollup_store():
+    """
+    :rtype: RollupStore|None
+    """
+    return _store
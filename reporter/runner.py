@@ -0,0 +1,448 @@
+"""
+Runs the set of checks and files reports
+"""
+import logging
+import threading
+
+from Queue import Queue, Full
+from time import time
+
+from reporter.checks import CHECKS
+from reporter.concurrency import IOExecutor
+from reporter.metrics import get_metrics
+from reporter.scheduler import Scheduler
+from reporter.sources.msearch import MultiSearch
+
+
+class Runner(object):
+    """
+    Query sources for reports and send them to the reporter (e.g. Jira)
+
+    Source instances and the reporter are created once and kept for all subsequent runs.
+    The scheduler decides which checks are run and how many seconds of logs they query.
+
+    Entries of small sources (see Source.MSEARCH) are fetched first, using a single request per cluster.
+
+    When the spool is set, detected reports are stored there first and filed from it (see reporter/spool.py),
+    reports that were not filed (e.g. the process was killed) are then filed by the next run.
+
+    Reports of each check are filed while the remaining checks are still running (see pipeline).
+    """
+    # avoid hitting Jira with too many searches for ticket hash (we perform 150+ of them)
+    REPORT_DELAY = 1
+
+    # fetch small sources using _msearch requests
+    MULTI_SEARCH = True
+
+    # file reports while checks are running, up to PIPELINE_SIZE checks' reports wait to be filed
+    PIPELINE = True
+    PIPELINE_SIZE = 8
+
+    def __init__(self, reporter_factory, scheduler=None, stop_event=None, executor=None, spool=None):
+        """
+        :type reporter_factory callable
+        :type scheduler reporter.scheduler.Scheduler
+        :type stop_event threading.Event
+        :type executor reporter.concurrency.IOExecutor
+        :type spool reporter.spool.ReportSpool
+        :arg executor: when set, sources are queried concurrently
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._metrics = get_metrics()
+
+        self._reporter_factory = reporter_factory
+        self._reporter = None
+
+        self._scheduler = scheduler or Scheduler(CHECKS)
+        self._sources = dict()
+
+        # when set, the current run is interrupted as soon as possible
+        self._stop_event = stop_event or threading.Event()
+
+        self._executor = executor
+        self._spool = spool
+
+    def get_source(self, check):
+        """
+        Return the source instance for a given check (instances are shared between checks and runs)
+
+        :type check reporter.checks.Check
+        :rtype: reporter.sources.Source
+        """
+        key = check.get_source_key()
+
+        if key not in self._sources:
+            self._sources[key] = check.get_source()
+
+        return self._sources[key]
+
+    def get_reporter(self):
+        """
+        :rtype: reporter.reporters.Jira
+        """
+        if self._reporter is None:
+            self._reporter = self._reporter_factory()
+
+        return self._reporter
+
+    def detect(self, checks=None):
+        """
+        Run checks (the ones that are due when not provided) and return reports
+
+        :type checks list[reporter.checks.Check]
+        :rtype: list[reporter.reports.Report]
+        """
+        reports = dict()  # check index -> reports
+
+        self._run_checks(checks, callback=reports.__setitem__)
+
+        return [report for index in sorted(reports) for report in reports[index]]
+
+    def _run_checks(self, checks, callback):
+        """
+        Run checks (the ones that are due when not provided), the callback is called with the check index
+        and its reports as soon as each check completes
+
+        :type checks list[reporter.checks.Check]
+        :type callback callable
+        """
+        if checks is None:
+            checks = self._scheduler.get_due_checks()
+            self._logger.info('Running {} checks: {}'.format(len(checks), ', '.join(
+                [check.get_name() for check in checks])))
+
+        prefetched = self._multi_search(checks)
+
+        if self._executor is not None:
+            self._detect_concurrently(checks, callback, prefetched)
+            return
+
+        for (index, check) in enumerate(checks):
+            if self._stop_event.is_set():
+                self._logger.info('Stop requested, skipping remaining checks')
+                break
+
+            if index in prefetched:
+                (started, threshold, rows) = prefetched[index]
+                reports = self.get_source(check).process(check.query, rows, threshold=threshold)
+            else:
+                started = time()
+                threshold = self._set_window(check, now=started)
+
+                reports = self.get_source(check).query(check.query, threshold=threshold)
+
+            self._mark_run(check, now=started)
+            callback(index, reports)
+
+    def _set_window(self, check, now):
+        """
+        Set the time window of the check's source, return the threshold scaled to it (see Scheduler.get_threshold)
+
+        :type check reporter.checks.Check
+        :type now float
+        :rtype: int
+        """
+        window = self._scheduler.get_window(check, now=now)
+        self.get_source(check).set_period(window)
+
+        return self._scheduler.get_threshold(check, window)
+
+    def _mark_run(self, check, now):
+        """
+        Mark the check as run, unless its query failed (the next run queries the time since the last successful one)
+
+        :type check reporter.checks.Check
+        :type now float
+        """
+        if self.get_source(check).has_failed():
+            self._logger.warning('{} check failed, it will be run again'.format(check.get_name()))
+            return
+
+        self._scheduler.mark_run(check, now=now)
+
+    def _multi_search(self, checks):
+        """
+        Fetch entries for checks of small sources using _msearch requests (see reporter/sources/msearch.py)
+
+        Returns (started, threshold, rows) tuples keyed by check index,
+        checks whose search failed (or has too many hits) are not there and are run the usual way.
+
+        :type checks list[reporter.checks.Check]
+        :rtype: dict
+        """
+        if not self.MULTI_SEARCH:
+            return dict()
+
+        search = MultiSearch()
+        requests = dict()  # check index -> (started, threshold, request ID)
+        keys = set()
+
+        for (index, check) in enumerate(checks):
+            key = check.get_source_key()
+            source = self.get_source(check)
+
+            # source instances keep the time window, the one set for the previous check would be overwritten
+            if not source.MSEARCH or key in keys:
+                continue
+
+            started = time()
+            threshold = self._set_window(check, now=started)
+
+            request = source.get_multi_search_request(check.query)
+
+            if request is not None:
+                requests[index] = (started, threshold, search.add(*request))
+                keys.add(key)
+
+        if not requests:
+            return dict()
+
+        results = search.execute()
+
+        return dict((index, (started, threshold, results[request_id]))
+                    for (index, (started, threshold, request_id)) in requests.items()
+                    if results[request_id] is not None)
+
+    def _detect_concurrently(self, checks, callback, prefetched=None):
+        """
+        Keep up to executor's max_workers queries in flight, the callback is called with reports of each check
+
+        Source instances keep the time window, hence checks sharing the source are never run at the same time.
+
+        :type checks list[reporter.checks.Check]
+        :type callback callable
+        :type prefetched dict
+        :arg prefetched: (started, threshold, rows) tuples keyed by check index (see _multi_search)
+        """
+        pending = list(enumerate(checks))
+        in_flight = []  # (check index, source key, started, result)
+
+        # entries are already there, run the rest of the stages
+        for (index, (started, threshold, rows)) in sorted((prefetched or dict()).items()):
+            if self._stop_event.is_set():
+                break
+
+            check = checks[index]
+
+            reports = self.get_source(check).process(check.query, rows, threshold=threshold)
+            self._mark_run(check, now=started)
+
+            pending.remove((index, check))
+            callback(index, reports)
+
+        while pending or in_flight:
+            if pending and self._stop_event.is_set():
+                self._logger.info('Stop requested, skipping remaining checks')
+                pending = []
+
+            busy = set([key for (_, key, _, _) in in_flight])
+
+            for (index, check) in list(pending):
+                if len(in_flight) >= self._executor.get_max_workers():
+                    break
+
+                key = check.get_source_key()
+
+                if key in busy:
+                    continue
+
+                started = time()
+                threshold = self._set_window(check, now=started)
+
+                in_flight.append((index, key, started, self.get_source(check).query_async(
+                    self._executor, check.query, threshold=threshold)))
+
+                pending.remove((index, check))
+                busy.add(key)
+
+            if not in_flight:
+                continue
+
+            (index, _, started, result) = in_flight.pop(0)
+
+            reports = result.get()
+            self._mark_run(checks[index], now=started)
+
+            callback(index, reports)
+
+    def file(self, reports, on_handled=None, filed=None):
+        """
+        Send reports to the reporter, return the number of tickets reported
+
+        Reports that would not be filed anyway (see reporter/planner.py) are dropped before any Jira request.
+
+        :type reports list[reporter.reports.Report]
+        :type on_handled callable
+        :type filed set
+        :arg on_handled: called with each report that was filed or dropped (not the ones that failed to be filed)
+        :arg filed: unique IDs of reports filed earlier in this run, these are dropped (updated in place)
+        :rtype: int
+        """
+        if self._stop_event.is_set():
+            self._logger.info('Stop requested, {} reports were not filed'.format(len(reports)))
+            return 0
+
+        self._logger.info('Reporting {} issues...'.format(len(reports)))
+        reporter = self.get_reporter()
+
+        filings = reporter.plan(reports, filed)
+
+        if on_handled is not None:
+            planned_ids = set([id(filing.report) for filing in filings])
+
+            for report in reports:
+                if id(report) not in planned_ids:
+                    on_handled(report)
+
+        reported = 0
+        for (index, filing) in enumerate(filings):
+            if self._stop_event.wait(self.REPORT_DELAY):
+                self._logger.info('Stop requested, {} reports were not filed'.format(len(filings) - index))
+                break
+
+            result = reporter.file(filing)
+
+            # keep the report in the spool, it will be filed again by the next run
+            if result == reporter.RESULT_FAILED:
+                continue
+
+            if result == reporter.RESULT_CREATED:
+                reported += 1
+
+            if filed is not None:
+                filed.add(filing.get_unique_id())
+
+            if on_handled is not None:
+                on_handled(filing.report)
+
+        reporter.flush()
+
+        self._logger.info('Reported {} tickets'.format(reported))
+        return reported
+
+    def file_spool(self):
+        """
+        File reports from the spool (including the ones left by previous runs), return the number of tickets reported
+
+        :rtype: int
+        """
+        batch = self._spool.read()
+
+        reported = self.file(batch.get_reports(), on_handled=batch.mark_handled)
+        self._spool.compact()
+
+        return reported
+
+    def pipeline(self, checks=None):
+        """
+        Detect issues and file reports at the same time, return the number of tickets reported
+
+        Reports of each check are queued as soon as the check completes and filed by a separate thread,
+        hence the run takes as long as the slower of the two stages. Checks wait when there are already
+        PIPELINE_SIZE checks' reports in the queue, i.e. reports do not pile up in memory when Jira is slow.
+
+        :type checks list[reporter.checks.Check]
+        :rtype: int
+        """
+        queue = Queue(maxsize=self.PIPELINE_SIZE)
+
+        with IOExecutor(max_workers=1) as filing:
+            consumer = filing.submit(self._file_queued, queue)
+
+            def _enqueue(_, reports):
+                if not reports:
+                    return
+
+                if self._spool is not None:
+                    batch = self._spool.append(reports)
+                    self._put(queue, (reports, batch.mark_handled), consumer)
+                else:
+                    self._put(queue, (reports, None), consumer)
+
+            try:
+                if self._spool is not None:
+                    # reports left by previous runs are filed first
+                    batch = self._spool.read()
+
+                    if len(batch):
+                        self._put(queue, (batch.get_reports(), batch.mark_handled), consumer)
+
+                self._run_checks(checks, callback=_enqueue)
+            finally:
+                self._put(queue, None, consumer)
+
+            reported = consumer.get()
+
+        if self._spool is not None:
+            self._spool.compact()
+
+        return reported
+
+    def _put(self, queue, item, consumer):
+        """
+        Queue the item, wait when the queue is full (re-raise the consumer's exception when it has stopped)
+
+        :type queue Queue.Queue
+        :type item tuple
+        :type consumer multiprocessing.pool.AsyncResult
+        """
+        try:
+            queue.put_nowait(item)
+            return
+        except Full:
+            pass
+
+        with self._metrics.timer('pipeline_wait_seconds'):
+            while True:
+                try:
+                    queue.put(item, timeout=1)
+                    return
+                except Full:
+                    if consumer.ready():
+                        consumer.get()
+
+    def _file_queued(self, queue):
+        """
+        File queued (reports, on_handled) tuples until None is queued, return the number of tickets reported
+
+        :type queue Queue.Queue
+        :rtype: int
+        """
+        reported = 0
+        filed = set()
+
+        while True:
+            item = queue.get()
+
+            if item is None:
+                break
+
+            # keep reports of the remaining items in the spool (they're not marked as handled)
+            if self._stop_event.is_set():
+                continue
+
+            (reports, on_handled) = item
+            reported += self.file(reports, on_handled=on_handled, filed=filed)
+
+        self._logger.info('Reported {} tickets in total'.format(reported))
+        return reported
+
+    def run(self, checks=None):
+        """
+        Detect issues and file reports
+
+        :type checks list[reporter.checks.Check]
+        :rtype: int
+        """
+        started = time()
+
+        if self.PIPELINE:
+            reported = self.pipeline(checks)
+        elif self._spool is not None:
+            self._spool.append(self.detect(checks))
+            reported = self.file_spool()
+        else:
+            reported = self.file(self.detect(checks))
+
+        self._metrics.timing('run_seconds', time() - started)
+        return reported
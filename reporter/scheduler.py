@@ -0,0 +1,145 @@
+"""
+Decides which checks should be run now, each check has its own interval
+"""
+import json
+import logging
+import math
+import os
+
+from time import time
+
+
+class Scheduler(object):
+    """
+    Keeps track of when each check was run for the last time
+
+    The state can be persisted in a JSON file so that it survives process restarts.
+
+    When there's no state for a given check and slot_length is set (i.e. when run from the hourly CronJob)
+    the check is run in the slot of slot_length seconds that starts its interval, e.g. checks with six hours interval
+    are run at 0:05, 6:05, 12:05 and 18:05.
+
+    Windows are extended to cover the time since the last run (or the entire slot) so that there are no gaps.
+    Thresholds are scaled accordingly when catching up, i.e. a window longer than an hour (or than check.window)
+    needs proportionally more occurrences to be reported. Hourly runs keep the threshold the check was set with.
+    """
+    # run the check a bit earlier rather than wait for the next tick
+    TOLERANCE = 30
+
+    # do not query more than a day of logs when catching up
+    MAX_WINDOW = 86400
+
+    # thresholds are not scaled up to this window (the one of the hourly CronJob)
+    BASELINE_WINDOW = 3600
+
+    def __init__(self, checks, state_path=None, slot_length=None):
+        """
+        :type checks list[reporter.checks.Check]
+        :type state_path str
+        :type slot_length int
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+        self._checks = checks
+        self._state_path = state_path
+        self._slot_length = slot_length
+
+        self._last_runs = self._load_state()
+
+    def _load_state(self):
+        """
+        :rtype: dict
+        """
+        if self._state_path and os.path.exists(self._state_path):
+            try:
+                with open(self._state_path) as fp:
+                    return json.load(fp)
+            except ValueError:
+                self._logger.error('Failed to load the state from {}'.format(self._state_path), exc_info=True)
+
+        return dict()
+
+    def _save_state(self):
+        if not self._state_path:
+            return
+
+        tmp_path = '{}.{}.tmp'.format(self._state_path, os.getpid())
+
+        with open(tmp_path, 'w') as fp:
+            json.dump(self._last_runs, fp, indent=True)
+
+        os.rename(tmp_path, self._state_path)
+
+    def get_last_run(self, check):
+        """
+        :type check reporter.checks.Check
+        :rtype: int|None
+        """
+        return self._last_runs.get(check.get_name())
+
+    def is_due(self, check, now=None):
+        """
+        :type check reporter.checks.Check
+        :type now int
+        :rtype: bool
+        """
+        now = now or time()
+        last_run = self.get_last_run(check)
+
+        if last_run is not None:
+            return now - last_run + self.TOLERANCE >= check.interval
+
+        if self._slot_length:
+            return now % check.interval < self._slot_length
+
+        return True
+
+    def get_due_checks(self, now=None):
+        """
+        :type now int
+        :rtype: list[reporter.checks.Check]
+        """
+        now = now or time()
+        return [check for check in self._checks if self.is_due(check, now)]
+
+    def get_window(self, check, now=None):
+        """
+        Return how many seconds of logs should be queried by a given check
+
+        :type check reporter.checks.Check
+        :type now int
+        :rtype: int
+        """
+        now = now or time()
+        last_run = self.get_last_run(check)
+
+        # make sure there are no gaps between subsequent runs of the check
+        since_last_run = int(now - last_run) if last_run is not None else (self._slot_length or 0)
+
+        return max(check.window, min(since_last_run, self.MAX_WINDOW))
+
+    def get_threshold(self, check, window):
+        """
+        Return the threshold of a given check scaled to the window
+
+        Thresholds are set for hourly runs (or check.window when longer), e.g. checks with a shorter window
+        keep their threshold when run from the hourly CronJob.
+
+        :type check reporter.checks.Check
+        :type window int
+        :rtype: int
+        """
+        baseline = max(check.window, self.BASELINE_WINDOW)
+
+        if window <= baseline:
+            return check.threshold
+
+        return int(math.ceil(check.threshold * float(window) / baseline))
+
+    def mark_run(self, check, now=None):
+        """
+        :type check reporter.checks.Check
+        :type now int
+        """
+        self._last_runs[check.get_name()] = int(now or time())
+        self._save_state()
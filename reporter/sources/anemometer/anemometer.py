@@ -1,4 +1,5 @@
 import json
+import os
 
 from reporter.sources.common import Source
 from reporter.reports import Report
@@ -16,6 +17,12 @@ class AnemometerSource(Source):
 
     REPORT_LABEL = 'Anemometer'
 
+    # fetch stats from these Anemometer datasources (in parallel)
+    DATASOURCES = ['localhost']
+
+    # how many queries with the highest time sum to fetch from each datasource
+    LIMIT = 1000
+
     FULL_MESSAGE_TEMPLATE = """
 *The following query does not perform too well and can be optimized. [View this query details in Anemometer|{url}].*
 
@@ -38,8 +45,14 @@ h5. Raw stats
 {{code}}
 """
 
+    def __init__(self):
+        super(AnemometerSource, self).__init__()
+
+        # responses are cached on disk when REPORTER_ANEMOMETER_CACHE directory is set
+        self._client = AnemometerClient(self.ANEMOMETER_URL, cache_dir=os.environ.get('REPORTER_ANEMOMETER_CACHE'))
+
     def _get_entries(self, query=''):
-        return AnemometerClient(self.ANEMOMETER_URL).get_queries()
+        return self._client.get_queries_from_datasources(self.DATASOURCES, limit=self.LIMIT)
 
     def _filter(self, entry):
         if entry.get('Fingerprint') == 'mysqldump':
@@ -56,12 +69,19 @@ h5. Raw stats
         return False
 
     def _normalize(self, entry):
-        return entry.get('checksum')  # Anenometer generates a hash for us
+        datasource = entry.get('datasource', 'localhost')
+
+        # Anenometer generates a hash for us (keep the hash of localhost queries as it was)
+        if datasource == 'localhost':
+            return entry.get('checksum')
+
+        return '{}-{}'.format(datasource, entry.get('checksum'))
 
     def _get_report(self, entry):
         stats = {k: v for k, v in entry.iteritems() if '_avg' in k or '_sum' in k or '_median' in k}
 
-        url = '{}/index.php?action=show_query&datasource=localhost&checksum={}'.format(self.ANEMOMETER_URL, entry.get('checksum'))
+        url = '{}/index.php?action=show_query&datasource={}&checksum={}'.format(
+            self.ANEMOMETER_URL, entry.get('datasource', 'localhost'), entry.get('checksum'))
 
         report = Report(
             summary='[Anemometer] {} can be optimized'.format(entry.get('snippet')),
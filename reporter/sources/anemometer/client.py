@@ -1,10 +1,16 @@
+import hashlib
+import json
 import logging
-import requests
+import os
+import time
 
 from  urllib import urlencode
 
 from requests.exceptions import RequestException
 
+from reporter.clients import get_clients
+from reporter.concurrency import IOExecutor
+
 
 class AnemometerClient(object):
     """
@@ -32,15 +38,31 @@ class AnemometerClient(object):
         'Fingerprint',
     ]
 
-    def __init__(self, root_url):
+    # rows fetched per request (passed as "offset,limit" in fact-limit parameter)
+    PAGE_SIZE = 150
+
+    # cached responses are used for this many seconds (Anemometer provides daily stats)
+    CACHE_TTL = 6 * 3600
+
+    def __init__(self, root_url, cache_dir=None, cache_ttl=None):
+        """
+        :type root_url str
+        :type cache_dir str
+        :type cache_ttl int
+        :arg cache_dir: keep responses in this directory (not cached when not set)
+        """
         self._http = None
         self._logger = logging.getLogger(self.__class__.__name__)
         self._root_url = root_url
 
+        self._cache_dir = cache_dir
+        self._cache_ttl = cache_ttl or self.CACHE_TTL
+
     @property
     def http(self):
         if self._http is None:
-            self._http = requests.session()
+            # keep-alive connections are shared by all clients (see reporter/clients.py)
+            self._http = get_clients().get_http_session(self._root_url)
 
         return self._http
 
@@ -49,32 +71,152 @@ class AnemometerClient(object):
 
         return '{}/index.php?{}'.format(self._root_url, encoded_params)
 
-    def get_queries(self, fields=None, order=None, limit=None, group=None):
-        # apply default values
-        fields = fields or self.FIELDS
-        order = order or 'Query_time_sum DESC'
-        limit = limit or 150
-        group = group or 'checksum'
+    def _get_cache_path(self, url):
+        """
+        :type url str
+        :rtype: str
+        """
+        return os.path.join(self._cache_dir, 'anemometer-{}.json'.format(hashlib.md5(url).hexdigest()))
+
+    def _read_cache(self, url):
+        """
+        :type url str
+        :rtype: dict|None
+        """
+        if not self._cache_dir or not os.path.exists(self._get_cache_path(url)):
+            return None
+
+        try:
+            with open(self._get_cache_path(url)) as fp:
+                return json.load(fp)
+        except ValueError:
+            self._logger.error('Failed to read the cached response for <{}>'.format(url), exc_info=True)
+            return None
+
+    def _write_cache(self, url, queries, etag=None):
+        """
+        :type url str
+        :type queries list
+        :type etag str|None
+        """
+        if not self._cache_dir:
+            return
+
+        if not os.path.isdir(self._cache_dir):
+            os.makedirs(self._cache_dir)
+
+        path = self._get_cache_path(url)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+
+        with open(tmp_path, 'w') as fp:
+            json.dump({'fetched': int(time.time()), 'etag': etag, 'result': queries}, fp)
+
+        os.rename(tmp_path, path)
+
+    def _fetch(self, url):
+        """
+        Fetch a given API URL, use the cached response when it's fresh (or was not modified)
+
+        :type url str
+        :rtype: list
+        """
+        cached = self._read_cache(url)
+
+        if cached is not None and time.time() - cached['fetched'] < self._cache_ttl:
+            self._logger.info('Using cached <{}>'.format(url))
+            return cached['result']
+
+        headers = dict()
 
-        # format the URL
-        url = self._get_full_url(params={
-            'action': 'api',
-            'output': 'json',
-            'datasource': 'localhost',
-            'fact-group': group,
-            'fact-order': order,
-            'fact-limit': limit,
-            'table_fields[]': fields
-        })
+        if cached is not None and cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
 
         self._logger.info('Fetching <{}>'.format(url))
 
         try:
-            resp = self.http.get(url).json()
-            queries = resp.get('result', [])
+            resp = self.http.get(url, headers=headers, timeout=get_clients().get_timeout())
 
-            self._logger.info('Got {} queries'.format(len(queries)))
+            if resp.status_code == 304:
+                self._logger.info('Not modified since the last fetch')
+                queries = cached['result']
+            else:
+                resp.raise_for_status()
+                queries = resp.json().get('result', [])
+
+            self._write_cache(url, queries, etag=resp.headers.get('ETag'))
             return queries
         except RequestException as e:
             self._logger.error('HTTP request failed', exc_info=True)
             raise e
+
+    def get_queries(self, fields=None, order=None, limit=None, group=None, datasource=None):
+        """
+        Fetch up to limit queries stats from a given datasource (page by page)
+
+        :type fields list[str]
+        :type order str
+        :type limit int
+        :type group str
+        :type datasource str
+        :rtype: list[dict]
+        """
+        # apply default values
+        fields = fields or self.FIELDS
+        order = order or 'Query_time_sum DESC'
+        limit = limit or 150
+        group = group or 'checksum'
+        datasource = datasource or 'localhost'
+
+        queries = []
+
+        while len(queries) < limit:
+            page_size = min(self.PAGE_SIZE, limit - len(queries))
+
+            # format the URL
+            url = self._get_full_url(params={
+                'action': 'api',
+                'output': 'json',
+                'datasource': datasource,
+                'fact-group': group,
+                'fact-order': order,
+                'fact-limit': '{},{}'.format(len(queries), page_size),
+                'table_fields[]': fields
+            })
+
+            page = self._fetch(url)
+            queries += page
+
+            # the last page
+            if len(page) < page_size:
+                break
+
+        for query in queries:
+            query['datasource'] = datasource
+
+        self._logger.info('Got {} queries from {} datasource'.format(len(queries), datasource))
+        return queries
+
+    def get_queries_from_datasources(self, datasources, executor=None, **kwargs):
+        """
+        Fetch queries stats from multiple datasources in parallel (see get_queries for arguments)
+
+        :type datasources list[str]
+        :type executor reporter.concurrency.IOExecutor
+        :rtype: list[dict]
+        """
+        if executor is None:
+            with IOExecutor(max_workers=len(datasources)) as executor:
+                return self.get_queries_from_datasources(datasources, executor, **kwargs)
+
+        results = [self.get_queries_async(executor, datasource=datasource, **kwargs) for datasource in datasources]
+        return [query for result in results for query in result.get()]
+
+    def get_queries_async(self, executor, fields=None, order=None, limit=None, group=None, datasource=None):
+        """
+        Submit get_queries call to a given I/O executor
+
+        :type executor reporter.concurrency.IOExecutor
+        :rtype: multiprocessing.pool.AsyncResult
+        """
+        return executor.submit(self.get_queries, fields=fields, order=order, limit=limit, group=group,
+                               datasource=datasource)
@@ -2,7 +2,7 @@ import json
 import re
 
 from reporter.sources.common import KibanaSource
-from reporter.helpers import is_from_production_host, generalize_sql
+from reporter.helpers import is_from_production_host, generalize_sql, FROM_PRODUCTION_HOST_NAME
 from reporter.reports import Report
 
 
@@ -26,12 +26,16 @@ h3. The Camel says "{{{{{full_message}}}}}"
 
     ELASTICSEARCH_INDEX_PREFIX = 'logstash-backend'
     LIMIT = 150000
+    COUNT_PRECHECK = True
 
     # @see https://wikia-inc.atlassian.net/browse/SUS-3449
     ELASTICSEARCH_QUERY = '@message: "LB::error" AND @context.error: *'
 
     REPORT_LABEL = 'BackendErrors'
 
+    # the same as _filter, evaluated for the entire batch of entries
+    FILTER = FROM_PRODUCTION_HOST_NAME
+
     def _get_entries(self, query):
         return self._kibana.query_by_string(query=self.ELASTICSEARCH_QUERY, limit=self.LIMIT)
 
@@ -4,7 +4,7 @@ Report caching related problems
 
 from common import KibanaSource
 
-from reporter.helpers import is_from_production_host
+from reporter.helpers import is_from_production_host, FROM_PRODUCTION_HOST
 from reporter.reports import Report
 
 
@@ -12,6 +12,9 @@ class NotCachedWikiaApiResponsesSource(KibanaSource):
     """ Get wikia.php API responses that are not cached """
     REPORT_LABEL = 'APIResponsesNotCached'
 
+    # filter out entries not coming from production hosts in Elasticsearch
+    ELASTICSEARCH_FILTER = FROM_PRODUCTION_HOST
+
     FULL_MESSAGE_TEMPLATE = """
 The following wikia.php API response can probably be cached on CDN layer (and invalidated when required)
 to decrease the load on the backend servers.
@@ -28,6 +31,10 @@ curl -svo /dev/null "{url}"
 
     LIMIT = 100000  # ~1.8mm entries daily => 75k an hour
 
+    # we only care about responses above the threshold of 500, count at most 1000 controller / method pairs
+    # (for 100k entries counts are overestimated by at most 100)
+    HEAVY_HITTERS_CAPACITY = 1000
+
     def _get_entries(self, query):
         """ Return matching not cached responses log entries """
         # @see https://kibana.wikia-inc.com/#/dashboard/elasticsearch/wikia.php%20caching%20disabled
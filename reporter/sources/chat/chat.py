@@ -25,10 +25,20 @@ h3. {full_message}
 
     def _get_entries(self, query):
         """ Return entries matching given query """
-        return self._kibana.query_by_string(
-            query='@fields.app_name:chat AND severity:error AND @source_host:chat-s* AND @message:*{}*'.format(query),
-            limit=self.LIMIT
-        )
+        rows = self._kibana.query_by_string(query=self._get_query_string(query), limit=self.LIMIT)
+
+        # the phrase matches entire words only, keep the substring match of the former "*query*" wildcard
+        return [row for row in rows if query.lower() in row.get('@message', '').lower()]
+
+    @staticmethod
+    def _get_query_string(query):
+        """
+        Leading wildcards (i.e. @message:*query*) are expensive, the phrase is pushed down instead
+
+        :type query str
+        :rtype: str
+        """
+        return '@fields.app_name:chat AND severity:error AND @source_host:chat-s* AND @message:"{}"'.format(query)
 
     def _filter(self, entry):
         return True
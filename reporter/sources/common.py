@@ -4,16 +4,92 @@ Common classes allowing us to access logs from various sources
 
 import hashlib
 import logging
-import re
+import math
+import multiprocessing
+import os
+import threading
+import time
 import urllib
 
-from wikia_common_kibana import Kibana
+from collections import Counter
+from itertools import izip
+
+from reporter.frame import Frame
+from reporter.heavy_hitters import SpaceSaving
+from reporter.hosts import get_host_index, HostIndex
+from reporter.metrics import Metrics, get_metrics
+from reporter.profiling import get_memory_profiler, profile_memory
+from reporter.rollups import get_rollup_store
+from reporter.sources.kibana import KibanaClient
+from reporter.sources.queries import rewrite_query_string
+
+
+# the source instance used by normalization worker processes (inherited via fork)
+_worker_source = None
+
+
+def _filter_and_normalize_chunk(args):
+    """
+    Run _filter and _normalize for a chunk of entries in a worker process
+
+    :type args tuple
+    :rtype: tuple
+    """
+    (chunk, labels) = args
+
+    source = _worker_source
+    source._metrics = Metrics()  # collect worker's counters separately and pass them back
+
+    (entries_count, normalized) = source._filter_and_normalize(chunk, labels)
+
+    return entries_count, normalized, {
+        'normalize_failures_total': source._metrics.get_counter('normalize_failures_total', **labels),
+        'hits_not_normalized_total': source._metrics.get_counter('hits_not_normalized_total', **labels),
+    }
 
 
 class Source(object):
     """ An abstract class for data providers to inherit from """
+
+    # when set, _filter and _normalize are run in a pool of processes
+    # for windows with more entries than NORMALIZE_CHUNK_SIZE (opt-in via REPORTER_NORMALIZE_PROCESSES)
+    NORMALIZE_PROCESSES = None
+    NORMALIZE_CHUNK_SIZE = 10000
+
+    # when set, entries are grouped approximately keeping at most this many keys (see reporter/heavy_hitters.py)
+    # keys that occur more than (entries count / HEAVY_HITTERS_CAPACITY) times are guaranteed to be reported
+    HEAVY_HITTERS_CAPACITY = None
+
+    # when set, entries are filtered and normalized in batches (see reporter/frame.py), the predicate
+    # (see reporter/predicates.py) needs to be equivalent to _filter which remains the per-entry fallback
+    FILTER = None
+
+    # returned by _normalize_batch for entries that failed to be normalized
+    NORMALIZE_FAILED = object()
+
+    # z-score of the confidence level reported for counts estimated from sampled entries (95%)
+    SAMPLING_CONFIDENCE_Z = 1.96
+
+    # set for sources returning a few dozens of entries, they're then fetched together with other ones
+    # (see get_multi_search_request and reporter/runner.py)
+    MSEARCH = False
+
+    # when set, the number of matching entries is checked first (see _get_count) and entries are not fetched
+    # when it's below the threshold (no group could reach it then)
+    COUNT_PRECHECK = False
+
     def __init__(self):
         self._logger = logging.getLogger(self.__class__.__name__)
+        self._metrics = get_metrics()
+
+        # percentage of entries fetched by the source (None when all of them are fetched)
+        self._sampling = None
+
+        # query -> when counts were added to the rollup store for the last time
+        self._rollups_recorded = dict()
+
+        # set when the last fetch of entries failed
+        self._failed = False
 
     def query(self, query='', threshold=50):
         """
@@ -25,24 +101,189 @@ class Source(object):
         - reports are grouped (using the key returned by _normalize_entries)
         - each report is than formatted
         """
+        with profile_memory(self.__class__.__name__, query):
+            return self._query(query, threshold)
+
+    def query_async(self, executor, query='', threshold=50):
+        """
+        Fetch entries using a given I/O executor, the rest of the stages is run when get()
+        is called on the returned result
+
+        :type executor reporter.concurrency.IOExecutor
+        :type query str
+        :type threshold int
+        :rtype: reporter.concurrency.ChainedResult|reporter.concurrency.DeferredResult
+        """
+        # memory of all stages is profiled together, the query is not overlapped with other ones then
+        if get_memory_profiler() is not None:
+            return executor.defer(self.query, query, threshold)
+
+        result = executor.submit(self._fetch_entries, query, threshold)
+
+        return executor.chain(result, lambda rows: self._process_entries(query, rows, threshold))
 
+    def process(self, query, rows, threshold=50):
+        """
+        Run the stages following the fetch for entries fetched elsewhere (see get_multi_search_request)
+
+        :type query str
+        :type rows list
+        :type threshold int
+        :rtype: list[reporter.reports.Report]
+        """
+        self._failed = False
+
+        with profile_memory(self.__class__.__name__, query):
+            return self._process_entries(query, rows, threshold)
+
+    def has_failed(self):
+        """
+        Did the last fetch of entries fail? (e.g. Elasticsearch was not available)
+
+        :rtype: bool
+        """
+        return self._failed
+
+    def get_multi_search_request(self, query=''):
+        """
+        Return the request that fetches entries for a given query together with other sources
+        (see reporter/sources/msearch.py), None when the source does not support it
+
+        :type query str
+        :rtype: tuple|None
+        """
+        return None
+
+    def _query(self, query, threshold):
+        """
+        Run all the stages of the query, see query method
+        """
+        return self._process_entries(query, self._fetch_entries(query, threshold), threshold)
+
+    def _get_labels(self, query):
+        """
+        Metrics are tagged with the source class and the query
+
+        :type query str
+        :rtype: dict
+        """
+        return dict(source=self.__class__.__name__, query=query)
+
+    def _fetch_entries(self, query, threshold=None):
+        """
+        Get the entries from the source, returns None when the request fails
+        (or when there's less matching entries than the threshold, see COUNT_PRECHECK)
+
+        :type query str
+        :type threshold int
+        :rtype: list|None
+        """
         if query != '':
             self._logger.info("Query: '{}'".format(query))
 
-        # filter the entries
+        labels = self._get_labels(query)
+        self._failed = False
+
+        if threshold is not None and self._is_below_threshold(query, threshold):
+            return None
+
         try:
-            entries = [entry for entry in self._get_entries(query) if self._filter(entry)]
+            with self._metrics.timer('stage_seconds', stage='fetch', **labels):
+                return self._get_entries(query)
         except:
             self._logger.error('self._get_entries raised an exception', exc_info=True)
+            self._metrics.incr('query_errors_total', **labels)
+            self._failed = True
+            return None
+
+    def _is_below_threshold(self, query, threshold):
+        """
+        Check if fewer entries than the threshold match the query (see COUNT_PRECHECK)
+
+        Counts of all keys are kept when the rollup store is enabled, hence entries are always fetched then.
+
+        :type query str
+        :type threshold int
+        :rtype: bool
+        """
+        if not self.COUNT_PRECHECK or get_rollup_store() is not None:
+            return False
+
+        labels = self._get_labels(query)
+
+        try:
+            with self._metrics.timer('stage_seconds', stage='count', **labels):
+                count = self._get_count(query)
+        except:
+            self._logger.error('self._get_count raised an exception', exc_info=True)
+            self._metrics.incr('count_errors_total', **labels)
+            return False
+
+        if count is None or count >= threshold:
+            return False
+
+        self._logger.info("Got {} matching entries (threshold is {}), skipping the query".format(count, threshold))
+        self._metrics.incr('queries_skipped_total', **labels)
+
+        return True
+
+    def _process_entries(self, query, rows, threshold):
+        """
+        Filter, normalize and group fetched entries and generate reports
+
+        :type query str
+        :type rows list|None
+        :type threshold int
+        :rtype: list[reporter.reports.Report]
+        """
+        if rows is None:
             return []
 
-        self._logger.info("Got {} entries after filtering".format(len(entries)))
+        labels = self._get_labels(query)
+
+        # filter the entries
+        try:
+            if self._use_parallel_normalization(rows):
+                # filter and group them using a pool of processes
+                with self._metrics.timer('stage_seconds', stage='filter_normalize', **labels):
+                    (entries_count, normalized) = self._normalize_entries_parallel(rows, labels)
+            elif self._use_batch_processing():
+                with self._metrics.timer('stage_seconds', stage='filter_normalize_batch', **labels):
+                    (entries_count, normalized) = self._filter_and_normalize(rows, labels)
+            else:
+                with self._metrics.timer('stage_seconds', stage='filter', **labels):
+                    entries = [entry for entry in rows if self._filter(entry)]
+
+                entries_count = len(entries)
+                normalized = None
+        except:
+            self._logger.error('self._filter raised an exception', exc_info=True)
+            self._metrics.incr('query_errors_total', **labels)
+            return []
+
+        self._metrics.incr('hits_fetched_total', len(rows), **labels)
+        self._metrics.incr('hits_filtered_out_total', len(rows) - entries_count, **labels)
+
+        self._logger.info("Got {} entries after filtering".format(entries_count))
 
         # group them
-        normalized = self._normalize_entries(entries)
+        if normalized is None:
+            with self._metrics.timer('stage_seconds', stage='normalize', **labels):
+                normalized = self._normalize_entries(entries, labels)
+
+        self._metrics.incr('groups_total', len(normalized), **labels)
+
+        self._record_rollups(query, normalized)
+
+        if self.HEAVY_HITTERS_CAPACITY and entries_count > self.HEAVY_HITTERS_CAPACITY * threshold:
+            self._logger.warning('Reports with less than {} occurrences can be missing (threshold is {})'.format(
+                entries_count // self.HEAVY_HITTERS_CAPACITY, threshold))
 
         # generate reports
-        reports = self._generate_reports(normalized, threshold)
+        with self._metrics.timer('stage_seconds', stage='report', **labels):
+            reports = self._generate_reports(normalized, threshold)
+
+        self._metrics.incr('reports_total', len(reports), **labels)
 
         # log all reports
         self._logger.info("Returning {} reports (with threshold set to {} applied)".format(len(reports), threshold))
@@ -55,9 +296,58 @@ class Source(object):
 
         return reports
 
-    def _normalize_entries(self, entries):
+    def set_period(self, period):
+        """
+        Set how many seconds of logs should be queried
+
+        Sources that query a time window need to override this method
+
+        :type period int
+        """
+        pass
+
+    def get_period(self):
+        """
+        Return how many seconds of logs are queried (None when the source does not query a time window)
+
+        :rtype: int|None
+        """
+        return None
+
+    def _record_rollups(self, query, normalized, now=None):
+        """
+        Add per-key counts to the rollup store (when enabled, see reporter/rollups.py)
+
+        Windows of subsequent runs can overlap (e.g. 15 minutes of logs checked every 5 minutes),
+        counts are then scaled down to the part of the window that was not recorded yet.
+
+        :type query str
+        :type normalized dict
+        :type now int
+        """
+        store = get_rollup_store()
+
+        if store is None:
+            return
+
+        now = int(now or time.time())
+
+        period = self.get_period()
+        last_recorded = self._rollups_recorded.get(query)
+
+        weight = min(1.0, float(now - last_recorded) / period) if period and last_recorded else 1.0
+
+        store.add_counts(dict(
+            (self._get_unique_id(key), int(round(self._scale_count(item['cnt'])[0] * weight)))
+            for (key, item) in normalized.iteritems()
+        ), timestamp=now)
+
+        self._rollups_recorded[query] = now
+
+    def _normalize_entries(self, entries, labels=None):
         """ Run all entries through _normalize method """
-        normalized = dict()
+        labels = labels or {}
+        normalized = SpaceSaving(self.HEAVY_HITTERS_CAPACITY) if self.HEAVY_HITTERS_CAPACITY else dict()
 
         for entry in entries:
             try:
@@ -69,32 +359,281 @@ class Source(object):
             except UnicodeError:
                 # ignore UTF parsing errors
                 self._logger.error('Entry parsing error', exc_info=True)
+                self._metrics.incr('normalize_failures_total', **labels)
                 continue
 
             # all entries will be grouped
             # using the key return by _normalize method
             if key is not None:
-                has_all_required_fields = self._has_all_required_fields(entry)
+                self._add_to_group(normalized, key, entry)
+            else:
+                self._logger.debug('Entry not normalized: {}'.format(entry))
+                self._metrics.incr('hits_not_normalized_total', **labels)
+
+        return normalized.to_dict() if isinstance(normalized, SpaceSaving) else normalized
+
+    def _add_to_group(self, normalized, key, entry):
+        """
+        Count the entry in the group of a given key
+
+        :type normalized dict|SpaceSaving
+        :type key str
+        :type entry dict
+        """
+        has_all_required_fields = self._has_all_required_fields(entry)
+
+        if key not in normalized:
+            normalized[key] = {
+                'cnt': 1,
+                'entry': entry,
+                'has_all_required_fields': has_all_required_fields
+            }
+        else:
+            if isinstance(normalized, SpaceSaving):
+                normalized.incr(key)
+            else:
+                normalized[key]['cnt'] += 1
+
+            # update the normalized entry if we finally got the full context
+            # @see PLATFORM-1162
+            if has_all_required_fields and not normalized[key]['has_all_required_fields']:
+                normalized[key]['entry'] = entry
+                normalized[key]['has_all_required_fields'] = True
+
+    def _use_batch_processing(self):
+        """
+        :rtype: bool
+        """
+        return self.FILTER is not None
+
+    def _filter_and_normalize(self, entries, labels=None):
+        """
+        Filter and group entries, returns the number of entries that passed the filter and grouped entries
+
+        The batch path is used when available, the per-entry one (_filter and _normalize_entries)
+        serves as a fallback.
+
+        :type entries list
+        :type labels dict
+        :rtype: tuple
+        """
+        labels = labels or {}
+
+        if self._use_batch_processing():
+            try:
+                return self._filter_and_normalize_batch(entries, labels)
+            except Exception:
+                self._logger.error('Batch processing failed, falling back to per-entry processing', exc_info=True)
+                self._metrics.incr('batch_fallbacks_total', **labels)
+
+        entries = [entry for entry in entries if self._filter(entry)]
+        return len(entries), self._normalize_entries(entries, labels)
+
+    def _filter_and_normalize_batch(self, entries, labels=None):
+        """
+        Filter entries using FILTER predicate evaluated on the entire frame, normalize them
+        using _normalize_batch and group them (counts of keys are taken at once)
+
+        :type entries list
+        :type labels dict
+        :rtype: tuple
+        """
+        labels = labels or {}
+
+        frame = Frame(entries)
+        frame = frame.select(self.FILTER.evaluate(frame))
 
-                if key not in normalized:
+        keys = self._normalize_batch(frame)
+
+        # extra normalization (the same as in _normalize_entries)
+        extra = dict()
+        failures = 0
+        not_normalized = 0
+
+        for (index, key) in enumerate(keys):
+            if key is self.NORMALIZE_FAILED:
+                failures += 1
+                keys[index] = None
+            elif key is None:
+                not_normalized += 1
+            else:
+                if key not in extra:
+                    extra[key] = key.lower().replace(' ', '')
+
+                keys[index] = extra[key]
+
+        if self.HEAVY_HITTERS_CAPACITY:
+            normalized = SpaceSaving(self.HEAVY_HITTERS_CAPACITY)
+
+            for (key, entry) in izip(keys, frame.get_entries()):
+                if key is not None:
+                    self._add_to_group(normalized, key, entry)
+
+            normalized = normalized.to_dict()
+        else:
+            counts = Counter(keys)
+            normalized = dict()
+
+            for (key, entry) in izip(keys, frame.get_entries()):
+                if key is None:
+                    continue
+
+                item = normalized.get(key)
+
+                if item is None:
                     normalized[key] = {
-                        'cnt': 1,
+                        'cnt': counts[key],
                         'entry': entry,
-                        'has_all_required_fields': has_all_required_fields
+                        'has_all_required_fields': self._has_all_required_fields(entry)
                     }
+                elif not item['has_all_required_fields'] and self._has_all_required_fields(entry):
+                    # @see PLATFORM-1162
+                    item['entry'] = entry
+                    item['has_all_required_fields'] = True
+
+        self._metrics.incr('normalize_failures_total', failures, **labels)
+        self._metrics.incr('hits_not_normalized_total', not_normalized, **labels)
+
+        return len(frame), normalized
+
+    def _normalize_batch(self, frame):
+        """
+        Return keys for all entries of a given frame (None when the entry can not be normalized and
+        NORMALIZE_FAILED on UTF parsing errors)
+
+        Sources can override this method to run normalization rules on entire columns,
+        by default _normalize is called for each entry.
+
+        :type frame reporter.frame.Frame
+        :rtype: list
+        """
+        keys = []
+
+        for entry in frame.get_entries():
+            try:
+                keys.append(self._normalize(entry))
+            except UnicodeError:
+                self._logger.error('Entry parsing error', exc_info=True)
+                keys.append(self.NORMALIZE_FAILED)
+
+        return keys
+
+    def _get_normalize_processes(self):
+        """
+        :rtype: int
+        """
+        return self.NORMALIZE_PROCESSES or int(os.environ.get('REPORTER_NORMALIZE_PROCESSES', 0))
+
+    def _use_parallel_normalization(self, entries):
+        """
+        :type entries list
+        :rtype: bool
+        """
+        if self._get_normalize_processes() < 2 or len(entries) <= self.NORMALIZE_CHUNK_SIZE:
+            return False
+
+        # forking while other threads are running can deadlock on locks they hold (logging, metrics, HTTP pools)
+        if threading.active_count() > 1:
+            self._logger.warning('Other threads are running, entries are normalized in a single process')
+            return False
+
+        return True
+
+    def _normalize_entries_parallel(self, entries, labels=None):
+        """
+        Split entries into chunks and run _filter and _normalize on them in a pool of processes.
+
+        Returns the number of entries that passed the filter and grouped entries
+        (the same as _normalize_entries would return).
+
+        :type entries list
+        :type labels dict
+        :rtype: tuple
+        """
+        global _worker_source
+
+        labels = labels or {}
+        chunks = [
+            (entries[offset:offset + self.NORMALIZE_CHUNK_SIZE], labels)
+            for offset in range(0, len(entries), self.NORMALIZE_CHUNK_SIZE)
+        ]
+
+        processes = self._get_normalize_processes()
+
+        self._logger.info('Normalizing {} entries in {} chunks using {} processes'.format(
+            len(entries), len(chunks), processes))
+
+        # worker processes are forked and inherit the source instance
+        _worker_source = self
+        pool = multiprocessing.Pool(processes=processes)
+
+        try:
+            # map() keeps the order of chunks which we rely on when merging
+            results = pool.map(_filter_and_normalize_chunk, chunks)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            _worker_source = None
+
+        entries_count = 0
+        tables = []
+
+        for (chunk_entries_count, table, counters) in results:
+            entries_count += chunk_entries_count
+            tables.append(table)
+
+            for (name, value) in counters.items():
+                self._metrics.incr(name, value, **labels)
+
+        return entries_count, self._merge_normalized_entries(tables)
+
+    @staticmethod
+    def _merge_normalized_entries(tables):
+        """
+        Merge partial group tables (as returned by _normalize_entries for consecutive chunks of entries)
+        the same way _normalize_entries would group all the entries at once
+
+        Approximate tables (see HEAVY_HITTERS_CAPACITY) are merged so that counts are still not underestimated:
+        a key missing in a table with evictions could have occurred there up to the table's lowest count times.
+
+        :type tables list[dict]
+        :rtype: dict
+        """
+        merged = dict()
+        floors = [
+            min(item['cnt'] for item in table.itervalues())
+            if any(item.get('error') for item in table.itervalues()) else 0
+            for table in tables
+        ]
+
+        for table in tables:
+            for key, item in table.iteritems():
+                if key not in merged:
+                    merged[key] = item
                 else:
-                    normalized[key]['cnt'] += 1
+                    merged[key]['cnt'] += item['cnt']
 
-                    # update the normalized entry if we finally got the full context
-                    # @see PLATFORM-1162
-                    if has_all_required_fields and not normalized[key]['has_all_required_fields']:
-                        normalized[key]['entry'] = entry
-                        normalized[key]['has_all_required_fields'] = True
+                    # the first entry with all required fields wins (see _normalize_entries)
+                    if item['has_all_required_fields'] and not merged[key]['has_all_required_fields']:
+                        merged[key]['entry'] = item['entry']
+                        merged[key]['has_all_required_fields'] = True
 
-            else:
-                self._logger.debug('Entry not normalized: {}'.format(entry))
+                    if 'error' in item:
+                        merged[key]['error'] += item['error']
+
+        for (table, floor) in zip(tables, floors):
+            if floor == 0:
+                continue
+
+            for key, item in merged.iteritems():
+                if key not in table:
+                    item['cnt'] += floor
+                    item['error'] = item.get('error', 0) + floor
 
-        return normalized
+        return merged
 
     def _generate_reports(self, items, threshold):
         """
@@ -102,6 +641,9 @@ class Source(object):
         """
         reports = list()
 
+        store = get_rollup_store()
+        now = int(time.time())
+
         for key, item in items.iteritems():
             try:
                 report = self._get_report(item['entry'])
@@ -113,20 +655,68 @@ class Source(object):
                 self._logger.error('get_report raised an exception', exc_info=True)
                 continue
 
-            if item['cnt'] < threshold:
-                self._logger.info('Skipped "{}" ({} occurrences)'.format(report.get_summary(), item['cnt']))
+            # approximate counts (see HEAVY_HITTERS_CAPACITY) can be overestimated by up to the error,
+            # compare the upper bound with the threshold so that no key that could reach it is skipped
+            error = item.get('error', 0)
+            (counter, margin) = self._scale_count(item['cnt'])
+
+            # estimated counts (see SAMPLING) are compared using the lower bound of the margin of error,
+            # there were at least as many occurrences as sampled entries though
+            if max(counter - margin, item['cnt']) < threshold:
+                self._logger.info('Skipped "{}" ({} occurrences)'.format(report.get_summary(), counter))
                 continue
 
             # update the report with the "hash" generated previously via _normalize
-            m = hashlib.md5()
-            m.update(key)
-            report.set_unique_id(m.hexdigest())
+            report.set_unique_id(self._get_unique_id(key))
+
+            report.set_counter(counter)
+
+            if self._sampling:
+                report.set_sampling(self._sampling, margin)
+
+            if error > 0:
+                report.append_to_description(
+                    '\n\n*Occurrences* are counted approximately, there were between {} and {}.'.format(
+                        self._scale_count(item['cnt'] - error)[0], counter))
+
+            if store is not None:
+                report.append_to_description('\n\n*Occurrences in the last 24 hours*: {}'.format(
+                    store.get_total(report.get_unique_id(), since=now - store.DAY + 1, until=now)))
 
-            report.set_counter(item['cnt'])
             reports.append(report)
 
         return reports
 
+    @staticmethod
+    def _get_unique_id(key):
+        """
+        Return the hash of the normalized key (used to find duplicated tickets)
+
+        :type key str
+        :rtype: str
+        """
+        m = hashlib.md5()
+        m.update(key)
+        return m.hexdigest()
+
+    def _scale_count(self, count):
+        """
+        Estimate the number of occurrences from the number of sampled entries
+
+        Returns the estimate and the margin of error (at SAMPLING_CONFIDENCE_Z confidence level),
+        each entry is sampled independently, hence the sampled count follows the binomial distribution.
+
+        :type count int
+        :rtype: tuple
+        """
+        if not self._sampling or self._sampling >= 100:
+            return count, 0
+
+        rate = self._sampling / 100.0
+        margin = self.SAMPLING_CONFIDENCE_Z * math.sqrt(count * (1 - rate)) / rate
+
+        return int(round(count / rate)), int(math.ceil(margin))
+
     @staticmethod
     def _has_all_required_fields(entry):
         """
@@ -135,6 +725,15 @@ class Source(object):
         """
         return True
 
+    def _get_count(self, query):
+        """
+        Return the number of entries _get_entries would return (before filtering), None when unknown
+
+        :type query str
+        :rtype: int|None
+        """
+        return None
+
     def _get_entries(self, query):
         """ This method will query the source and return matching entries """
         raise NotImplementedError("_get_entries() method needs to be overwritten in your class!")
@@ -168,7 +767,7 @@ class Source(object):
 
 class KibanaSource(Source):
     """ elasticsearch-powered data provider """
-    LIMIT = 100000  # limit how many rows can be fetched from elasticsearch
+    LIMIT = 100000  # limit how many rows can be fetched by a single elasticsearch request (windows are split above it)
 
     # TODO: move to a separate class
     ENV_PREVIEW = 'Preview'
@@ -176,15 +775,120 @@ class KibanaSource(Source):
     ENV_BACKUP_DC = 'Reston'
     ENV_STAGING = 'Staging'
 
-    PREVIEW_HOST = 'staging-s1'
+    PREVIEW_HOST = HostIndex.PREVIEW_HOST
+
+    ENVS = {
+        HostIndex.DC_PREVIEW: ENV_PREVIEW,
+        HostIndex.DC_MAIN: ENV_MAIN_DC,
+        HostIndex.DC_BACKUP: ENV_BACKUP_DC,
+    }
 
     KIBANA_URL = "https://kibana5.wikia-inc.com/app/kibana#/discover?_g=(time:(from:now-6h,mode:quick,to:now))&_a=(columns:!({columns}),index:'{index}-*',query:(query_string:(analyze_wildcard:!t,query:'{query}')),sort:!('@timestamp',desc))"
 
     ELASTICSEARCH_INDEX_PREFIX = 'logstash-other'
 
-    def __init__(self, period=3600):
+    # percentage of matching entries to fetch (sampled by the document ID), occurrences are then scaled back
+    SAMPLING = None
+
+    # predicate compiled into Elasticsearch filter clauses (defaults to FILTER), hits that do not match it
+    # are not fetched at all, _filter is still run for fetched entries (see reporter/predicates.py)
+    ELASTICSEARCH_FILTER = None
+
+    # a query string or query DSL dict matching entries returned by _get_entries, required by MSEARCH
+    ELASTICSEARCH_QUERY = None
+
+    # how many hits can be returned by the search sent via _msearch (it's scrolled when there's more of them)
+    MSEARCH_LIMIT = 1000
+
+    def __init__(self, period=3600, sampling=None):
+        """
+        :type period int
+        :type sampling int
+        :arg sampling: fetch only a given percentage of matching entries (overrides SAMPLING)
+        """
         super(KibanaSource, self).__init__()
-        self._kibana = Kibana(period=period, index_prefix=self.ELASTICSEARCH_INDEX_PREFIX)
+        self._kibana = KibanaClient(period=period, index_prefix=self.ELASTICSEARCH_INDEX_PREFIX)
+
+        self._sampling = sampling or self.SAMPLING
+        self._kibana.set_sampling(self._sampling)
+
+        self._kibana.set_filters(self._get_elasticsearch_filters())
+
+    def _get_elasticsearch_filters(self):
+        """
+        :rtype: list[dict]
+        """
+        predicate = self.ELASTICSEARCH_FILTER or self.FILTER
+        clause = predicate.to_elasticsearch() if predicate is not None else None
+
+        if clause is None:
+            return []
+
+        self._logger.debug('Filters pushed down to Elasticsearch: {}'.format(clause))
+        return [clause]
+
+    def set_period(self, period):
+        """
+        :type period int
+        """
+        self._kibana.set_period(period)
+
+    def get_period(self):
+        """
+        :rtype: int
+        """
+        return self._kibana.get_period()
+
+    def query(self, query='', threshold=50):
+        """
+        Sources can be kept between runs (see reporter/runner.py), move the time window to now
+        """
+        self._kibana.refresh_window()
+        return super(KibanaSource, self).query(query, threshold)
+
+    def query_async(self, executor, query='', threshold=50):
+        """
+        Move the time window to now before the request is submitted
+        """
+        self._kibana.refresh_window()
+        return super(KibanaSource, self).query_async(executor, query, threshold)
+
+    def get_multi_search_request(self, query=''):
+        """
+        Move the time window to now and return the search request for ELASTICSEARCH_QUERY
+
+        :type query str
+        :rtype: tuple|None
+        """
+        if not self.MSEARCH:
+            return None
+
+        self._kibana.refresh_window()
+        return self._kibana.get_search_request(
+            self._get_elasticsearch_query(query), limit=min(self.LIMIT, self.MSEARCH_LIMIT))
+
+    def _get_count(self, query):
+        """
+        Count hits matching the query in the current time window
+
+        :type query str
+        :rtype: int
+        """
+        return self._kibana.count(self._get_elasticsearch_query(query))
+
+    def _get_elasticsearch_query(self, query):
+        """
+        Return ELASTICSEARCH_QUERY as query DSL (query strings are rewritten into filters)
+
+        :type query str
+        :rtype: dict
+        """
+        assert self.ELASTICSEARCH_QUERY is not None, 'You need to specify ELASTICSEARCH_QUERY in your class'
+
+        if isinstance(self.ELASTICSEARCH_QUERY, basestring):
+            return rewrite_query_string(self.ELASTICSEARCH_QUERY)
+
+        return self.ELASTICSEARCH_QUERY
 
     def _get_entries(self, query):
         """ Send the query to elasticsearch """
@@ -213,27 +917,16 @@ class KibanaSource(Source):
         :type entry dict
         :rtype: str
         """
-        host = entry.get('@source_host', '')
         env = entry.get('@fields', {}).get('environment')
-        is_preview = host == self.PREVIEW_HOST
 
         # get env info from @fields.environment
         if env == 'staging':
             return self.ENV_STAGING
 
-        if is_preview:
-            # staging-s1
-            env = self.ENV_PREVIEW
-        else:
-            # SJC or Reston?
-            if re.search(r'\-r\d+$', host) is not None:
-                # ap-r20
-                env = self.ENV_BACKUP_DC
-            else:
-                # ap-s32
-                env = self.ENV_MAIN_DC
+        # staging-s1, ap-r20 (Reston) or ap-s32 (SJC), see reporter/hosts.py
+        datacenter = get_host_index().get_datacenter(entry.get('@source_host', ''))
 
-        return env
+        return self.ENVS[datacenter]
 
     def format_kibana_url(self, query, columns=None, index=None):
         # https://kibana5.wikia-inc.com/app/kibana#/discover?_g=(time:(from:now-6h,mode:quick,to:now))&_a=(index:'logstash-other-*',query:(query_string:(analyze_wildcard:!t,query:'@fields.app_name:chat')),sort:!('@timestamp',desc))
@@ -284,3 +977,6 @@ class KibanaSource(Source):
 
         # set JIRA URL field
         report.set_url(self._get_url_from_entry(entry))
+
+        # occurrences were counted in this time window
+        report.set_period(self._kibana.get_period())
@@ -8,12 +8,15 @@ import json
 from common import KibanaSource
 
 from reporter.reports import Report
-from reporter.helpers import is_from_production_host
+from reporter.helpers import is_from_production_host, FROM_PRODUCTION_HOST
 
 
 class HeliosSource(KibanaSource):
     REPORT_LABEL = 'Helios'
 
+    # filter out entries not coming from production hosts in Elasticsearch
+    ELASTICSEARCH_FILTER = FROM_PRODUCTION_HOST
+
     REPORT_TEMPLATE = """
 h3. {message}
 
@@ -27,9 +30,12 @@ h3. {message}
     # use Helios-specific index
     ELASTICSEARCH_INDEX_PREFIX = 'logstash-helios'
 
+    ELASTICSEARCH_QUERY = 'level:"error"'
+    MSEARCH = True
+
     def _get_entries(self, query):
         return self._kibana.query_by_string(
-                query='level:"error"',
+                query=self.ELASTICSEARCH_QUERY,
                 limit=self.LIMIT)
 
     def _filter(self, entry):
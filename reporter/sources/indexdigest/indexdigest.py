@@ -38,6 +38,9 @@ h6. Reported by {version} - https://github.com/macbre/index-digest#checks
     # https://github.com/macbre/index-digest#syslog
     ELASTICSEARCH_QUERY = 'report.type: *'
 
+    # only a few reports are pushed, fetch them together with other sources
+    MSEARCH = True
+
     REPORT_LABEL = 'index-digest'
 
     def _get_entries(self, query):
@@ -0,0 +1,620 @@
+"""
+Elasticsearch client used by Kibana-powered sources
+"""
+import codecs
+import gzip
+import json
+import math
+import re
+import socket
+import threading
+import time
+
+from itertools import chain, islice
+from StringIO import StringIO
+from urllib import quote, urlencode
+
+from elasticsearch.exceptions import ConnectionError, ConnectionTimeout, HTTP_EXCEPTIONS, TransportError
+from urllib3.exceptions import HTTPError, ReadTimeoutError
+from wikia_common_kibana import Kibana
+
+from reporter.clients import get_clients
+from reporter.concurrency import IOExecutor
+from reporter.sources.queries import rewrite_query_string
+
+
+HITS_RE = re.compile(r'"hits"\s*:\s*\{')
+HITS_ARRAY_RE = re.compile(r'"hits"\s*:\s*\[')
+SCROLL_ID_RE = re.compile(r'"_scroll_id"\s*:\s*"([^"]+)"')
+TOTAL_RE = re.compile(r'"total"\s*:\s*(?:\{\s*"value"\s*:\s*)?(\d+)')
+
+
+def iter_hits(chunks, meta=None):
+    """
+    Decode hits of the search response one by one, as soon as chunks of the response arrive
+
+    Neither the raw response nor the entire decoded object are kept in memory.
+    _scroll_id and hits.total are stored in a given meta dict.
+
+    :type chunks collections.Iterable[str]
+    :type meta dict
+    :rtype: collections.Iterable[dict]
+    """
+    meta = meta if meta is not None else dict()
+
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+
+    buf = u''
+    pos = None  # set once we're past the hits array start
+    exhausted = False
+
+    while True:
+        if pos is None:
+            match = HITS_ARRAY_RE.search(buf)
+
+            if match:
+                header = buf[:match.start()]
+
+                scroll_id = SCROLL_ID_RE.search(header)
+                hits = HITS_RE.search(header)
+                total = TOTAL_RE.search(header, hits.end()) if hits else None
+
+                meta['_scroll_id'] = scroll_id.group(1) if scroll_id else None
+                meta['total'] = int(total.group(1)) if total else None
+
+                pos = match.end()
+                continue
+        else:
+            # skip separators between hits
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+
+            if pos < len(buf):
+                if buf[pos] == ']':
+                    # read the rest of the response, _scroll_id can follow hits
+                    trailer = buf[pos:] + u''.join(utf8.decode(chunk) for chunk in chunks)
+
+                    if meta['_scroll_id'] is None:
+                        scroll_id = SCROLL_ID_RE.search(trailer)
+                        meta['_scroll_id'] = scroll_id.group(1) if scroll_id else None
+
+                    return
+
+                try:
+                    (hit, end) = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    # the hit is not complete yet, wait for the next chunk
+                    if exhausted:
+                        raise
+                    end = None
+
+                if end is not None:
+                    pos = end
+                    yield hit
+                    continue
+
+            # forget the hits that were already decoded
+            buf = buf[pos:]
+            pos = 0
+
+        if exhausted:
+            raise ValueError('Unexpected end of the search response')
+
+        try:
+            buf += utf8.decode(next(chunks))
+        except StopIteration:
+            buf += utf8.decode(b'', True)
+            exhausted = True
+
+
+class RowsBudget(object):
+    """
+    How many rows can still be fetched by all slices of a search (they're fetched concurrently)
+    """
+    def __init__(self, rows):
+        """
+        :type rows int
+        """
+        self._lock = threading.Lock()
+        self._left = rows
+        self._exhausted = False
+
+    def take(self):
+        """
+        Return True when one more row can be fetched
+
+        :rtype: bool
+        """
+        with self._lock:
+            if self._left <= 0:
+                self._exhausted = True
+                return False
+
+            self._left -= 1
+            return True
+
+    def is_exhausted(self):
+        """
+        :rtype: bool
+        """
+        return self._exhausted
+
+
+class KibanaClient(Kibana):
+    """
+    Extends wikia_common_kibana's client
+
+    The time window can be moved forward so that a single instance can be used for many runs.
+    Elasticsearch connections pool is shared by all instances (see reporter/clients.py).
+
+    Responses are gzip-compressed and hits are decoded as they're streamed from the scroll API.
+
+    Only daily indices overlapping the time window are queried (logs are indexed by their @timestamp),
+    e.g. the last hour of logs is fetched from today's index only unless the window crosses midnight.
+
+    When the time window has more hits than the limit, it's split into slices that are fetched concurrently
+    (slices with too many hits are split again), so that the results are not truncated. Up to MAX_ROWS rows
+    (or the limit when higher) are fetched by all slices in total, so that they fit in memory.
+    """
+    # keep the scroll context alive between batches
+    SCROLL = '5m'
+
+    # how many slices a window can be split into at once
+    MAX_SLICES = 16
+
+    # how many times a slice can be split again
+    MAX_SPLIT_DEPTH = 3
+
+    # how many slices are fetched at the same time
+    SLICES_CONCURRENCY = 4
+
+    # how many rows can be fetched by all slices of a window
+    MAX_ROWS = 300000
+
+    # how many bytes are read from the response stream at once
+    STREAM_CHUNK_SIZE = 65536
+
+    def __init__(self, period=3600, index_prefix='logstash-other', **kwargs):
+        """
+        :type period int
+        :type index_prefix str
+        """
+        super(KibanaClient, self).__init__(period=period, index_prefix=index_prefix, **kwargs)
+
+        # use the shared client instead of the one created by the parent class
+        self._es = get_clients().get_elasticsearch(kwargs.get('es_host') or self.ELASTICSEARCH_HOST)
+
+        self._period = period
+        self._index_prefix = index_prefix
+        self._index_sep = kwargs.get('index_sep', '-')
+
+        self._sampling = None
+        self._filters = []
+
+    def get_period(self):
+        """
+        :rtype: int
+        """
+        return self._period
+
+    def set_period(self, period):
+        """
+        Set the length of the time window, it's applied by refresh_window()
+
+        :type period int
+        """
+        self._period = period
+
+    def set_sampling(self, sampling):
+        """
+        Set the default percentage of results to be returned
+
+        :type sampling int|None
+        """
+        self._sampling = sampling
+
+    def set_filters(self, filters):
+        """
+        Set clauses that all returned hits need to match (they're run in the filter context)
+
+        :type filters list[dict]
+        """
+        self._filters = filters
+
+    def refresh_window(self, now=None):
+        """
+        Move the time window (and indices to query) so that it ends now
+
+        :type now int
+        """
+        now = int(now or time.time())
+
+        self._since = now - self._period
+        self._to = now - self.SHORT_DELAY  # give logs some time to reach Logstash
+
+        self._index = self._get_index(self._since, self._to)
+
+        self._logger.debug("Querying for messages from between %s and %s using %s indices",
+                           self.format_timestamp(self._since), self.format_timestamp(self._to), self._index)
+
+    def _get_index(self, since, to):
+        """
+        Return comma-separated names of daily indices (in UTC) overlapping a given time range
+
+        :type since int
+        :type to int
+        :rtype: str
+        """
+        return ','.join([
+            self.format_index(prefix=self._index_prefix, timestamp=day * self.DAY, sep=self._index_sep)
+            for day in range(since // self.DAY, to // self.DAY + 1)
+        ])
+
+    def _get_time_range_filter(self, since=None, to=None, closed=True):
+        """
+        :type since int
+        :type to int
+        :type closed bool
+        :arg closed: include the end of the time range (timestamps are formatted with a second precision,
+            i.e. hits from the second following "to" are not included when it's False)
+        :rtype: dict
+        """
+        return {
+            "range": {
+                "@timestamp": {
+                    "gte": self.format_timestamp(since if since is not None else self._since),
+                    "lte" if closed else "lt": self.format_timestamp(to if to is not None else self._to)
+                }
+            }
+        }
+
+    def _get_search_body(self, query, fields=None, sampling=None, since=None, to=None, closed=True):
+        """
+        :type query object
+        :type fields list[str] or None
+        :type sampling int or None
+        :type since int
+        :type to int
+        :type closed bool
+        :arg since: the beginning of the time range (defaults to the window's one)
+        :arg to: the end of the time range (defaults to the window's one)
+        :arg closed: include the end of the time range (see _get_time_range_filter)
+        :rtype: dict
+        """
+        body = {
+            "query": {
+                "bool": {
+                    "must": [
+                        query,
+                        self._get_time_range_filter(since, to, closed),
+                    ]
+                }
+            },
+            "sort": ["_doc"],  # return the next batch of results from every shard that still has results to return
+        }
+
+        # not scored and cached by Elasticsearch
+        if self._filters:
+            body['query']['bool']['filter'] = self._filters
+
+        # @see https://www.elastic.co/guide/en/elasticsearch/reference/current/search-request-source-filtering.html
+        if fields:
+            body['_source'] = {
+                "includes": fields
+            }
+
+        # sample the results if needed
+        if sampling is not None:
+            body['query']['bool']['must'].append({
+                'script': {
+                    'script': {
+                        'lang': 'painless',
+                        'source': "Math.abs(doc['_id'].value.hashCode()) % 100 < params.sampling",
+                        'params': {
+                            'sampling': sampling
+                        }
+                    }
+                }
+            })
+
+        return body
+
+    def query_by_string(self, query, fields=None, limit=10, sampling=None):
+        """
+        Returns raw rows that match the given query string
+
+        The query string is rewritten into cheaper filters (see reporter/sources/queries.py)
+
+        :type query str
+        :type fields list[str] or None
+        :type limit int
+        :type sampling int or None
+        :rtype: list
+        """
+        return self._search(rewrite_query_string(query), fields, limit, sampling)
+
+    def count(self, query):
+        """
+        Return the number of hits matching a given query in the time window (sampling is not applied)
+
+        :type query object
+        :rtype: int
+        """
+        body = self._get_search_body(query)
+
+        return self._es.count(index=self._index, body={'query': body['query']}, ignore_unavailable=True)['count']
+
+    def get_search_request(self, query, fields=None, limit=10, sampling=None):
+        """
+        Return the (Elasticsearch client, index, body) tuple of a search returning up to limit hits at once,
+        it's meant to be sent together with other ones (see reporter/sources/msearch.py)
+
+        :type query object
+        :type fields list[str] or None
+        :type limit int
+        :type sampling int or None
+        :rtype: tuple
+        """
+        body = self._get_search_body(query, fields, sampling if sampling is not None else self._sampling)
+        body['size'] = limit
+
+        return self._es, self._index, body
+
+    def _search(self, query, fields=None, limit=50000, sampling=None):
+        """
+        Perform the search and return raw rows (see iter_search)
+
+        :type query object
+        :type fields list[str] or None
+        :type limit int
+        :type sampling int or None
+        :arg limit: how many rows can be fetched by a single request (the window is split when there's more hits)
+        :rtype: list
+        """
+        sampling = sampling if sampling is not None else self._sampling
+        budget = RowsBudget(max(limit, self.MAX_ROWS))
+
+        rows = self._search_slice(query, fields, limit, sampling, self._since, self._to, budget=budget)
+
+        if budget.is_exhausted():
+            self._logger.warning('Results truncated: {} rows fetched from slices of the window (see MAX_ROWS)'.format(
+                len(rows)))
+
+        self._logger.info("{:d} rows returned".format(len(rows)))
+        return rows
+
+    def _search_slice(self, query, fields, limit, sampling, since, to, depth=0, closed=True, budget=None):
+        """
+        Return rows from a given time range, split it into slices when it has more hits than the limit
+
+        :type query object
+        :type fields list[str] or None
+        :type limit int
+        :type sampling int or None
+        :type since int
+        :type to int
+        :type depth int
+        :type closed bool
+        :type budget RowsBudget
+        :rtype: list
+        """
+        if budget is not None and budget.is_exhausted():
+            return []
+
+        meta = dict()
+        hits = self.iter_search(query, fields, sampling, meta=meta, since=since, to=to, closed=closed)
+
+        try:
+            first = next(hits, None)
+            total = meta.get('total')
+
+            if first is not None and total > limit:
+                if to - since + int(closed) > 1 and depth < self.MAX_SPLIT_DEPTH:
+                    hits.close()
+                    return self._search_slices(query, fields, limit, sampling, since, to, total, depth, closed,
+                                               budget)
+
+                self._logger.warning('Results truncated: {} hits between {} and {}, {} fetched'.format(
+                    total, self.format_timestamp(since), self.format_timestamp(to), limit))
+
+            rows = []
+
+            if first is not None:
+                for hit in chain([first], islice(hits, 0, limit - 1)):
+                    if budget is not None and not budget.take():
+                        break
+
+                    rows.append(hit['_source'])
+        finally:
+            hits.close()
+
+        return rows
+
+    def _search_slices(self, query, fields, limit, sampling, since, to, total, depth, closed, budget=None):
+        """
+        Split a given time range into slices (expected to have less hits than the limit) and fetch them concurrently
+
+        Slices do not include their ends (the next slice starts there), except for the last one that ends
+        where the time range does. Hence every hit is fetched once, regardless of timestamps precision.
+
+        :rtype: list
+        """
+        length = to - since + int(closed)
+        count = min(self.MAX_SLICES, max(2, int(math.ceil(float(total) / limit))), length)
+        step = float(length) / count
+
+        bounds = [since + int(round(index * step)) for index in range(count)] + [to]
+        slices = [(bounds[index], bounds[index + 1], False) for index in range(count - 1)] + \
+            [(bounds[count - 1], to, closed)]
+
+        self._logger.info('{} hits between {} and {} (limit is {}), splitting into {} slices of {} seconds'.format(
+            total, self.format_timestamp(since), self.format_timestamp(to), limit, count, int(step)))
+
+        def _fetch(time_range):
+            (slice_since, slice_to, slice_closed) = time_range
+            return self._search_slice(query, fields, limit, sampling, slice_since, slice_to, depth + 1, slice_closed,
+                                      budget)
+
+        with IOExecutor(max_workers=min(count, self.SLICES_CONCURRENCY)) as executor:
+            results = executor.map(_fetch, slices)
+
+        return [row for rows in results for row in rows]
+
+    def iter_search(self, query, fields=None, sampling=None, meta=None, since=None, to=None, closed=True):
+        """
+        Yield hits matching a given query using the scroll API, one by one
+
+        :type query object
+        :type fields list[str] or None
+        :type sampling int or None
+        :type meta dict
+        :type since int
+        :type to int
+        :type closed bool
+        :arg meta: hits.total of the search is stored there once the first hit is yielded
+        :arg closed: include the end of the time range (see _get_time_range_filter)
+        :rtype: collections.Iterable[dict]
+        """
+        body = self._get_search_body(query, fields, sampling, since, to, closed)
+        self._logger.debug("Running {} query".format(json.dumps(body)))
+
+        # indices of the slice only
+        index = self._get_index(since, to) if since is not None and to is not None else self._index
+
+        # do not fail when today's index was not created yet
+        params = dict(scroll=self.SCROLL, size=self._batch_size, ignore_unavailable='true')
+
+        meta = meta if meta is not None else dict()
+        hits = self._stream_hits('/{}/_search'.format(quote(index, safe=',')), params, body, meta)
+
+        while True:
+            count = 0
+
+            for hit in hits:
+                count += 1
+                yield hit
+
+            # scroll context is not cleared, it causes "403 Forbidden: You don't have access to this resource"
+            if count == 0 or not meta.get('_scroll_id'):
+                return
+
+            scroll_id = meta['_scroll_id']
+            meta = dict()  # the first response's metadata is kept in the dict passed by the caller
+            hits = self._stream_hits('/_search/scroll', None, dict(scroll=self.SCROLL, scroll_id=scroll_id), meta)
+
+    def _stream_hits(self, url, params, body, meta):
+        """
+        Send the request and decode hits from the response stream
+
+        Streaming needs the urllib3 pool of the connection (Urllib3HttpConnection). Other connection
+        classes fall back to Transport.perform_request with the entire response decoded at once.
+
+        :type url str
+        :type params dict|None
+        :type body dict
+        :type meta dict
+        :rtype: collections.Iterable[dict]
+        """
+        transport = self._es.transport
+
+        if not all(hasattr(connection, 'pool') for connection in transport.connection_pool.connections):
+            # perform_request pops its own options from params
+            response = transport.perform_request('POST', url, params=dict(params) if params else None, body=body)
+            hits = response.get('hits', {})
+            total = hits.get('total')
+
+            meta['_scroll_id'] = response.get('_scroll_id')
+            meta['total'] = total.get('value') if isinstance(total, dict) else total
+
+            for hit in hits.get('hits', []):
+                yield hit
+
+            return
+
+        if params:
+            url = '{}?{}'.format(url, urlencode(params))
+
+        response = self._open_stream(url, json.dumps(body))
+        consumed = False
+
+        try:
+            for hit in iter_hits(response.stream(self.STREAM_CHUNK_SIZE), meta):
+                yield hit
+
+            consumed = True
+        finally:
+            # do not put back to the pool a connection with unread data
+            if not consumed:
+                response.close()
+
+            response.release_conn()
+
+    def _open_stream(self, url, body):
+        """
+        Send the request and return the response without reading it
+
+        Connections that fail are marked as dead and the request is retried on the next one,
+        the same way Transport.perform_request does.
+
+        :type url str
+        :type body str
+        :rtype: urllib3.response.HTTPResponse
+        """
+        transport = self._es.transport
+
+        for attempt in range(transport.max_retries + 1):
+            connection = transport.get_connection()
+            headers = connection.headers.copy()  # includes "Accept-Encoding: gzip,deflate" when compression is enabled
+            data = body
+
+            if connection.http_compress:
+                buf = StringIO()
+                with gzip.GzipFile(fileobj=buf, mode='wb') as fp:
+                    fp.write(body)
+
+                data = buf.getvalue()
+                headers['content-encoding'] = 'gzip'
+
+            try:
+                response = connection.pool.urlopen(
+                    'POST', connection.url_prefix + url, data, headers=headers, retries=False, preload_content=False)
+            except (HTTPError, socket.error) as ex:
+                timed_out = isinstance(ex, (ReadTimeoutError, socket.timeout))
+
+                if timed_out and not transport.retry_on_timeout:
+                    raise ConnectionTimeout('TIMEOUT', str(ex), ex)
+
+                # only mark as dead if we are retrying
+                transport.mark_dead(connection)
+
+                if attempt == transport.max_retries:
+                    raise (ConnectionTimeout if timed_out else ConnectionError)('N/A', str(ex), ex)
+
+                self._logger.warning('Request to {} failed, retrying: {}'.format(connection.host, ex))
+                continue
+
+            if 200 <= response.status < 300:
+                transport.connection_pool.mark_live(connection)
+                return response
+
+            raw_data = response.data.decode('utf-8')
+            response.release_conn()
+
+            if response.status in transport.retry_on_status and attempt < transport.max_retries:
+                transport.mark_dead(connection)
+                self._logger.warning('Request to {} returned HTTP {}, retrying'.format(
+                    connection.host, response.status))
+                continue
+
+            try:
+                error = json.loads(raw_data)
+            except ValueError:
+                error = None
+
+            message = error.get('error', raw_data) if isinstance(error, dict) else raw_data
+            if isinstance(message, dict):
+                message = message.get('type', message)
+
+            raise HTTP_EXCEPTIONS.get(response.status, TransportError)(response.status, message, error)
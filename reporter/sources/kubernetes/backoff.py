@@ -16,6 +16,8 @@ class KubernetesBackoffSource(KubernetesSource):
     # eventMessage to query for
     EVENT_MESSAGE = 'Job has reached the specified backoff limit'
 
+    MSEARCH = True
+
     def _get_report(self, entry):
         """
         Format the report to be sent to JIRA
@@ -5,6 +5,7 @@ import re
 import urllib
 
 from reporter.sources.common import KibanaSource
+from reporter.sources.queries import rewrite_query_string
 
 
 class KubernetesSource(KibanaSource):
@@ -33,10 +34,16 @@ h3. Details
         """ Return entries matching given query """
         assert self.EVENT_MESSAGE is not False, 'You need to specif EVENT_MESSAGE in your class'
 
-        return self._kibana.query_by_string(
-            query='eventMessage: "{}" AND  kubernetes.namespace_name: "prod"'.format(self.EVENT_MESSAGE),
-            limit=self.LIMIT
-        )
+        return self._kibana.query_by_string(query=self._get_query_string(), limit=self.LIMIT)
+
+    def _get_query_string(self):
+        """
+        :rtype: str
+        """
+        return 'eventMessage: "{}" AND  kubernetes.namespace_name: "prod"'.format(self.EVENT_MESSAGE)
+
+    def _get_elasticsearch_query(self, query):
+        return rewrite_query_string(self._get_query_string())
 
     def _filter(self, entry):
         return True
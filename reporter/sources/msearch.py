@@ -0,0 +1,117 @@
+"""
+Fetches hits for many small sources using a single _msearch request per Elasticsearch cluster
+
+Sources like Helios or index-digest return a few dozens of hits, yet each of them pays a full request
+round trip. Their searches are sent together and the responses are fanned back out to each source.
+
+@see https://www.elastic.co/guide/en/elasticsearch/reference/6.8/search-multi-search.html
+"""
+import logging
+
+from collections import OrderedDict
+
+from reporter.metrics import get_metrics
+
+
+class MultiSearch(object):
+    """
+    search = MultiSearch()
+    helios = search.add(*helios_source.get_multi_search_request(''))
+    ...
+    rows = search.execute()[helios]  # None when the search failed or the results were truncated
+    """
+    def __init__(self):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._metrics = get_metrics()
+
+        self._requests = []  # (Elasticsearch client, index, body)
+
+    def __len__(self):
+        return len(self._requests)
+
+    def add(self, es, index, body):
+        """
+        Add a search request, returns its ID (an index in the list returned by execute)
+
+        :type es elasticsearch.Elasticsearch
+        :type index str
+        :type body dict
+        :arg body: search request body, "size" needs to be set
+        :rtype: int
+        """
+        self._requests.append((es, index, body))
+        return len(self._requests) - 1
+
+    def execute(self):
+        """
+        Send the requests (one _msearch request per cluster), return rows for each of them
+
+        None is returned for searches that failed or have more hits than the requested size,
+        these need to be fetched using the scroll API.
+
+        :rtype: list[list|None]
+        """
+        results = [None] * len(self._requests)
+
+        # Elasticsearch clients are shared by all sources querying the same cluster (see reporter/clients.py)
+        clusters = OrderedDict()  # id(client) -> [request ID]
+
+        for (request_id, (es, _, _)) in enumerate(self._requests):
+            clusters.setdefault(id(es), []).append(request_id)
+
+        for request_ids in clusters.values():
+            for (request_id, rows) in zip(request_ids, self._execute_cluster(request_ids)):
+                results[request_id] = rows
+
+        return results
+
+    def _execute_cluster(self, request_ids):
+        """
+        :type request_ids list[int]
+        :rtype: list[list|None]
+        """
+        es = self._requests[request_ids[0]][0]
+        body = []
+
+        for request_id in request_ids:
+            (_, index, search) = self._requests[request_id]
+            body += [{'index': index, 'ignore_unavailable': True}, search]
+
+        self._logger.info('Sending {} searches in a single _msearch request'.format(len(request_ids)))
+
+        try:
+            with self._metrics.timer('stage_seconds', stage='msearch'):
+                responses = es.msearch(body=body)['responses']
+        except:
+            self._logger.error('_msearch request failed', exc_info=True)
+            self._metrics.incr('msearch_errors_total', len(request_ids))
+            return [None] * len(request_ids)
+
+        self._metrics.incr('msearch_requests_total')
+        self._metrics.incr('msearch_searches_total', len(request_ids))
+
+        return [self._get_rows(self._requests[request_id], response)
+                for (request_id, response) in zip(request_ids, responses)]
+
+    def _get_rows(self, request, response):
+        """
+        :type request tuple
+        :type response dict
+        :rtype: list|None
+        """
+        (_, index, search) = request
+
+        if 'error' in response:
+            self._logger.error('Search on {} failed: {}'.format(index, response['error']))
+            self._metrics.incr('msearch_errors_total')
+            return None
+
+        total = response['hits']['total']
+        total = total['value'] if isinstance(total, dict) else total  # Elasticsearch 7.x format
+
+        if total > search['size']:
+            self._logger.info('Search on {} has {} hits (more than {}), it will be scrolled'.format(
+                index, total, search['size']))
+            return None
+
+        return [hit['_source'] for hit in response['hits']['hits']]
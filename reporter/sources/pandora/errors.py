@@ -1,5 +1,6 @@
 import re
 
+from reporter.predicates import Exists, In
 from reporter.reports import Report
 
 from common import PandoraLogsSource
@@ -9,6 +10,9 @@ class PandoraErrorsSource(PandoraLogsSource):
     """ Get Pandora errors from elasticsearch """
     REPORT_LABEL = 'PandoraErrors'
 
+    # the same as _filter, evaluated for the entire batch of entries
+    FILTER = In('rawLevel', ['WARN', 'ERROR']) & Exists('rawMessage') & Exists('appname')
+
     def _get_entries(self, query):
         """ Return matching entries by given prefix """
         return self._kibana.query_by_string(
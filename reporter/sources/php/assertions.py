@@ -1,7 +1,7 @@
 import json
 import re
 
-from reporter.helpers import is_from_production_host
+from reporter.helpers import is_from_production_host, FROM_PRODUCTION_HOST
 from reporter.reports import Report
 
 from common import PHPLogsSource
@@ -13,6 +13,9 @@ class PHPAssertionsSource(PHPLogsSource):
     """
     REPORT_LABEL = 'PHPAssertion'
 
+    # filter out entries not coming from production hosts in Elasticsearch
+    ELASTICSEARCH_FILTER = FROM_PRODUCTION_HOST
+
     FULL_MESSAGE_TEMPLATE = """
 h1. {assertion}
 
@@ -1,7 +1,8 @@
 import json
 import re
 
-from reporter.helpers import generalize_sql, is_from_production_host
+from reporter.helpers import generalize_sql, is_from_production_host, FROM_PRODUCTION_HOST
+from reporter.predicates import In
 from reporter.reports import Report
 
 from common import PHPLogsSource
@@ -38,6 +39,9 @@ h3. Backtrace
     ER_QUERY_INTERRUPTED = 1317
     ER_CONNECTION_LOST = 2013
 
+    # filter out entries not coming from production hosts and deadlocks in Elasticsearch
+    ELASTICSEARCH_FILTER = FROM_PRODUCTION_HOST & ~In('@context.errno', [ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT])
+
     def _get_entries(self, query):
         """ Return matching exception logs """
         return self._kibana.get_rows(match={"@exception.class": 'DBQueryError'}, limit=self.LIMIT)
@@ -238,6 +242,9 @@ h5. Backtrace
     # use dedicated SQL logs index
     ELASTICSEARCH_INDEX_PREFIX = 'logstash-mediawiki-sql'
 
+    # filter out entries not coming from production hosts in Elasticsearch
+    ELASTICSEARCH_FILTER = FROM_PRODUCTION_HOST
+
     def _get_entries(self, query):
         """ Return matching exception logs """
         # @see http://www.solrtutorial.com/solr-query-syntax.html
@@ -2,8 +2,10 @@ import json
 import re
 import urllib
 
-from reporter.helpers import is_from_production_host
+from reporter.helpers import is_from_production_host, FROM_PRODUCTION_HOST
+from reporter.predicates import Contains, Matches
 from reporter.reports import Report
+from reporter.sources.queries import rewrite_query_string
 
 from common import PHPLogsSource
 
@@ -12,9 +14,99 @@ class PHPErrorsSource(PHPLogsSource):
     """ Get PHP errors from elasticsearch """
     REPORT_LABEL = 'PHPErrors'
 
+    # quiet hours of warnings do not need to be fetched
+    COUNT_PRECHECK = True
+
+    # the same as _filter, evaluated for the entire batch of entries
+    FILTER = FROM_PRODUCTION_HOST & \
+        Matches('@message', r'on line \d+', phrase='on line') & \
+        ~Contains('@message', 'Allowed memory size of')
+
+    # (regex, replacement) applied in the given order by _normalize
+    NORMALIZE_RULES = [
+        (re.compile(r'\n'), ''),
+
+        # remove exception prefix
+        # Exception from line 141 of /includes/wikia/nirvana/WikiaView.class.php:
+        (re.compile(r'Exception from line \d+ of [^:]+:'), 'Exception:'),
+
+        # remove HTTP adresses
+        # Missing or invalid pubid from http://dragonball.wikia.com/__varnish_liftium/config in /var/www/liftium/delivery/config.php on line 17
+        (re.compile(r'https?://[^\s]+'), '<URL>'),
+
+        # remove release-specific part
+        # /usr/wikia/slot1/3006/src
+        (re.compile(r'/usr/wikia/slot1/\d+(/src)?'), ''),
+        # /data/deploytools/build/wikia.foo/src
+        (re.compile(r'/data/deploytools/build/wikia.[^/]+/src'), ''),
+
+        # remove DOMDocument::loadHTML() errors details
+        # Tag figure invalid in Entity, line: 286
+        # Unexpected end tag : p in Entity, line: 82
+        (re.compile(r'DOMDocument::loadHTML\(\): [^,]+, line: \d+'), 'DOMDocument::loadHTML(): X, line: N'),
+
+        # remove popen() arguments
+        (re.compile(r'popen\([^\)]+\)'), 'popen(X)'),
+
+        # remove exec arguments
+        (re.compile(r'Unable to fork \[[^\]]+\]'), 'Unable to fork [X]'),
+
+        # normalize /tmp and /images paths
+        (re.compile(r'/tmp/\w+'), '/tmp/X'),
+        (re.compile(r'\(/images/[^)]+\)'), '(/images/X)'),
+
+        # normalize swift paths
+        (re.compile(r'mwstore://swift-backend/[^ ]+'), 'mwstore://swift-backend/X'),
+
+        # normalize "17956864 bytes" and "offset 65532
+        (re.compile(r'\d+ bytes'), 'N bytes'),
+        (re.compile(r'offset \d+'), 'offset N'),
+
+        # normalize preg_match() related warnings
+        (re.compile(r'Unknown modifier \'\w+\''), 'Unknown modifier X'),
+        (re.compile(r'Compilation failed: unmatched parentheses at offset \d+'),
+         'Compilation failed: unmatched parentheses at offset N'),
+
+        # normalize fatals (PLATFORM-1463)
+        (re.compile(r'PHP Fatal Error:\s+', re.IGNORECASE), 'PHP Fatal Error: '),
+        (re.compile(r'PHP Notice:\s+'), 'PHP Notice: '),
+
+        # remove long backtraces from error message
+        (re.compile(r'\s?Stack trace:(.*)\{main\}\s?', re.MULTILINE), ''),
+
+        # remove line number from simple_html_dom.php fatal errors
+        (re.compile(r'simplehtmldom/simple_html_dom.php on line \d+'), 'simplehtmldom/simple_html_dom.php'),
+
+        # remove index name / offset from notices
+        (re.compile(r'Undefined index: [^\s]+ in'), 'Undefined index: X in'),
+        (re.compile(r'Undefined offset: \d+ in'), 'Undefined offset: N in'),
+
+        # remove moving part of <!--LINK 0:459-->
+        (re.compile(r'<!--LINK \d+:\d+-->'), '<!--LINK N:N-->'),
+
+        # remove PID from "Error while sending QUERY packet." warnings
+        (re.compile(r'Error while sending \w+ packet. PID=\d+'), 'Error while sending X packet. PID=N'),
+
+        # FD_SETSIZE.It is set to 1024, but you have descriptors numbered at least as high as 2279.
+        (re.compile(r'descriptors numbered at least as high as \d+'), 'descriptors numbered at least as high as N'),
+        (re.compile(r'--enable-fd-setsize=\d+'), '--enable-fd-setsize=N'),
+    ]
+
     def _get_entries(self, query):
         """ Return matching entries by given prefix """
-        return self._kibana.query_by_string(query='@message:"^{}"'.format(query), limit=self.LIMIT)
+        # the phrase can be anywhere in the message, "^" sent before was dropped by the analyzer anyway
+        return self._kibana.query_by_string(query=self._get_query_string(query), limit=self.LIMIT)
+
+    @staticmethod
+    def _get_query_string(query):
+        """
+        :type query str
+        :rtype: str
+        """
+        return '@message:"{}"'.format(query)
+
+    def _get_elasticsearch_query(self, query):
+        return rewrite_query_string(self._get_query_string(query))
 
     def _filter(self, entry):
         """ Remove log entries that are not coming from main DC or lack key information """
@@ -79,81 +171,50 @@ class PHPErrorsSource(PHPLogsSource):
 
         Call to a member function getText() on a non-object in /includes/api/ApiParse.php on line 20
         """
-        message = entry.get('@message')
-        message = message.replace('\n', '')
-
-        # remove exception prefix
-        # Exception from line 141 of /includes/wikia/nirvana/WikiaView.class.php:
-        message = re.sub(r'Exception from line \d+ of [^:]+:', 'Exception:', message)
-
-        # remove HTTP adresses
-        # Missing or invalid pubid from http://dragonball.wikia.com/__varnish_liftium/config in /var/www/liftium/delivery/config.php on line 17
-        message = re.sub(r'https?://[^\s]+', '<URL>', message)
-
-        # remove release-specific part
-        # /usr/wikia/slot1/3006/src
-        message = re.sub(r'/usr/wikia/slot1/\d+(/src)?', '', message)
-        # /data/deploytools/build/wikia.foo/src
-        message = re.sub(r'/data/deploytools/build/wikia.[^/]+/src', '', message)
-
-        # remove DOMDocument::loadHTML() errors details
-        # Tag figure invalid in Entity, line: 286
-        # Unexpected end tag : p in Entity, line: 82
-        message = re.sub(r'DOMDocument::loadHTML\(\): [^,]+, line: \d+', 'DOMDocument::loadHTML(): X, line: N', message)
-
-        # remove popen() arguments
-        message = re.sub(r'popen\([^\)]+\)', 'popen(X)', message)
-
-        # remove exec arguments
-        message = re.sub(r'Unable to fork \[[^\]]+\]', 'Unable to fork [X]', message)
-
-        # normalize /tmp and /images paths
-        message = re.sub(r'/tmp/\w+', '/tmp/X', message)
-        message = re.sub(r'\(/images/[^)]+\)', '(/images/X)', message)
+        message = self._normalize_message(entry.get('@message'))
 
-        # normalize swift paths
-        message = re.sub(r'mwstore://swift-backend/[^ ]+', 'mwstore://swift-backend/X', message)
-
-        # normalize "17956864 bytes" and "offset 65532
-        message = re.sub(r'\d+ bytes', 'N bytes', message)
-        message = re.sub(r'offset \d+', 'offset N', message)
-
-        # normalize preg_match() related warnings
-        message = re.sub(r'Unknown modifier \'\w+\'', 'Unknown modifier X', message)
-        message = re.sub(r'Compilation failed: unmatched parentheses at offset \d+',
-                         'Compilation failed: unmatched parentheses at offset N', message)
+        # update the entry
+        entry['@message_normalized'] = message
 
-        # normalize fatals (PLATFORM-1463)
-        message = re.sub(r'PHP Fatal Error:\s+', 'PHP Fatal Error: ', message, flags=re.IGNORECASE)
-        message = re.sub(r'PHP Notice:\s+', 'PHP Notice: ', message)
+        # production or preview?
+        env = self._get_env_from_entry(entry)
 
-        # remove long backtraces from error message
-        message = re.sub(r'\s?Stack trace:(.*)\{main\}\s?', '', message, flags=re.MULTILINE)
+        return 'PHP-{}-{}'.format(message, env)
 
-        # remove line number from simple_html_dom.php fatal errors
-        message = re.sub(r'simplehtmldom/simple_html_dom.php on line \d+', 'simplehtmldom/simple_html_dom.php', message)
+    @classmethod
+    def _normalize_message(cls, message):
+        """
+        Apply NORMALIZE_RULES to a given message
 
-        # remove index name / offset from notices
-        message = re.sub(r'Undefined index: [^\s]+ in', 'Undefined index: X in', message)
-        message = re.sub(r'Undefined offset: \d+ in', 'Undefined offset: N in', message)
+        :type message str
+        :rtype: str
+        """
+        for (regex, replacement) in cls.NORMALIZE_RULES:
+            message = regex.sub(replacement, message)
 
-        # remove moving part of <!--LINK 0:459-->
-        message = re.sub(r'<!--LINK \d+:\d+-->', '<!--LINK N:N-->', message)
+        return message
 
-        # remove PID from "Error while sending QUERY packet." warnings
-        message = re.sub(r'Error while sending \w+ packet. PID=\d+', 'Error while sending X packet. PID=N', message)
+    def _normalize_batch(self, frame):
+        """
+        Normalization rules are applied once per distinct message and environment once per distinct host
+        """
+        messages = frame.replace('@message', self.NORMALIZE_RULES)
+        envs = frame.map_distinct_rows(['@source_host', '@fields.environment'], self._get_env_from_entry)
 
-        # FD_SETSIZE.It is set to 1024, but you have descriptors numbered at least as high as 2279.
-        message = re.sub(r'descriptors numbered at least as high as \d+', 'descriptors numbered at least as high as N', message)
-        message = re.sub(r'--enable-fd-setsize=\d+', '--enable-fd-setsize=N', message)
+        keys = dict()  # (message, env) -> key
 
-        # update the entry
-        entry['@message_normalized'] = message
+        for (entry, message, env) in zip(frame.get_entries(), messages, envs):
+            # update the entry
+            entry['@message_normalized'] = message
 
-        # production or preview?
-        env = self._get_env_from_entry(entry)
+            if (message, env) not in keys:
+                try:
+                    keys[(message, env)] = 'PHP-{}-{}'.format(message, env)
+                except UnicodeError:
+                    self._logger.error('Entry parsing error', exc_info=True)
+                    keys[(message, env)] = self.NORMALIZE_FAILED
 
-        return 'PHP-{}-{}'.format(message, env)
+        return [keys[(message, env)] for (message, env) in zip(messages, envs)]
 
     @staticmethod
     def _has_all_required_fields(entry):
@@ -1,7 +1,7 @@
 import json
 import re
 
-from reporter.helpers import is_from_production_host
+from reporter.helpers import is_from_production_host, FROM_PRODUCTION_HOST
 from reporter.reports import Report
 
 from common import PHPLogsSource
@@ -13,6 +13,9 @@ class PHPExceptionsSource(PHPLogsSource):
     """
     REPORT_LABEL = 'PHPExceptions'
 
+    # filter out entries not coming from production hosts in Elasticsearch
+    ELASTICSEARCH_FILTER = FROM_PRODUCTION_HOST
+
     FULL_MESSAGE_TEMPLATE = """
 h1. {exception}
 
@@ -144,6 +147,9 @@ class PHPTypeErrorsSource(PHPLogsSource):
     """
     REPORT_LABEL = 'PHPTypeError'
 
+    # filter out entries not coming from production hosts in Elasticsearch
+    ELASTICSEARCH_FILTER = FROM_PRODUCTION_HOST
+
     def _get_entries(self, query):
         """ Return errors and exceptions reported via WikiaLogger with error severity """
         # http://php.net/manual/en/class.typeerror.php
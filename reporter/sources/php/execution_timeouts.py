@@ -1,4 +1,4 @@
-from reporter.helpers import is_from_production_host
+from reporter.helpers import is_from_production_host, FROM_PRODUCTION_HOST
 from reporter.reports import Report
 from common import PHPLogsSource
 
@@ -12,6 +12,9 @@ class PHPExecutionTimeoutSource(PHPLogsSource):
 
     REPORT_LABEL = "php-timeout"
 
+    # filter out entries not coming from production hosts in Elasticsearch
+    ELASTICSEARCH_FILTER = FROM_PRODUCTION_HOST
+
     REPORT_TEMPLATE = """
 The below URL is taking too much time to render. This is usually caused by extremely large articles.
 
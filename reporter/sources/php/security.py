@@ -1,6 +1,6 @@
 import json
 
-from reporter.helpers import is_from_production_host
+from reporter.helpers import is_from_production_host, FROM_PRODUCTION_HOST
 from reporter.reports import Report
 
 from common import PHPLogsSource
@@ -15,6 +15,9 @@ class PHPSecuritySource(PHPLogsSource):
     """
     REPORT_LABEL = 'CSRFDetector'
 
+    # filter out entries not coming from production hosts in Elasticsearch
+    ELASTICSEARCH_FILTER = FROM_PRODUCTION_HOST
+
     FULL_MESSAGE_TEMPLATE = """
 h2. {message}
 
@@ -26,9 +29,12 @@ h5. Backtrace
 
     EXCEPTION_CLASS = 'Wikia\Security\Exception'
 
+    ELASTICSEARCH_QUERY = {"match": {"@exception.class": EXCEPTION_CLASS}}
+    MSEARCH = True
+
     def _get_entries(self, query):
         """ Return failed security assertions logs """
-        return self._kibana.get_rows(match={"@exception.class": self.EXCEPTION_CLASS}, limit=self.LIMIT)
+        return self._kibana.get_rows(match=self.ELASTICSEARCH_QUERY['match'], limit=self.LIMIT)
 
     def _filter(self, entry):
         return is_from_production_host(entry)
@@ -12,8 +12,11 @@ class PHPTriggeredSource(PHPLogsSource):
     """
     REPORT_LABEL = 'PHPTriggered'
 
+    ELASTICSEARCH_QUERY = '@context.jira_reporter: 1 AND @context.tags: *'
+    MSEARCH = True
+
     def _get_entries(self, query):
-        return self._kibana.query_by_string(query='@context.jira_reporter: 1 AND @context.tags: *', limit=self.LIMIT)
+        return self._kibana.query_by_string(query=self.ELASTICSEARCH_QUERY, limit=self.LIMIT)
 
     def _filter(self, entry):
         return True
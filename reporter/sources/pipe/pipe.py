@@ -24,6 +24,9 @@ class ReportsPipeSource(KibanaSource):
     # https://github.com/macbre/index-digest#syslog
     ELASTICSEARCH_QUERY = 'report.hash: *'
 
+    # only a few reports are pushed, fetch them together with other sources
+    MSEARCH = True
+
     def _get_entries(self, query):
         return self._kibana.query_by_string(query=self.ELASTICSEARCH_QUERY, limit=self.LIMIT)
 
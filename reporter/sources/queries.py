@@ -0,0 +1,145 @@
+"""
+Rewrites Lucene query strings (as used in Kibana) into cheaper Elasticsearch queries
+
+Query strings are run in the scoring query context and wildcards / regular expressions in them
+are expensive. Clauses of a query string joined with AND are translated into non-scoring filters
+(that Elasticsearch caches):
+
+- field: *                -> exists
+- field: "foo bar"        -> match_phrase
+- field: foo              -> match
+- field: foo*             -> prefix (lowercase prefixes only, query string normalizes them)
+- field: /[sr].*/         -> prefix filters (other regular expressions are kept as regexp filter)
+- field: [10 TO *]        -> range
+- -clause                 -> must_not
+
+Clauses that can not be translated (e.g. leading wildcards) are kept as query string filters.
+Query strings with OR or parentheses are not split at all.
+"""
+import re
+
+# field: value (value can be quoted or a range)
+CLAUSE_RE = re.compile(r'^(?P<negated>-)?(?P<field>[\w@.]+):\s*(?P<value>"[^"]*"|\[[^\]]+\]|\S+)$')
+
+# [10 TO *]
+RANGE_RE = re.compile(r'^\[(?P<gte>\S+) TO (?P<lte>\S+)\]$')
+
+# /ap-.*/ or /[sr].*/
+REGEXP_PREFIX_RE = re.compile(r'^/(?P<prefix>[\w-]+)\.\*/$')
+REGEXP_CHARACTERS_RE = re.compile(r'^/\[(?P<characters>\w+)\]\.\*/$')
+
+
+def split_query_string(query):
+    """
+    Split query string into clauses joined with AND, returns None when the query can not be split
+
+    :type query str
+    :rtype: list[str]|None
+    """
+    clauses = []
+    clause = ''
+    in_quotes = False
+
+    for part in re.split(r'(\s+|")', query.strip()):
+        if part == '"':
+            in_quotes = not in_quotes
+        elif not in_quotes:
+            if part == 'AND':
+                clauses.append(clause.strip())
+                clause = ''
+                continue
+
+            if part in ('OR', 'NOT', '&&', '||') or '(' in part or ')' in part:
+                return None
+
+        clause += part
+
+    clauses.append(clause.strip())
+
+    if in_quotes or not all(clauses):
+        return None
+
+    # "foo: bar test" means "foo: bar OR test"
+    if not all(CLAUSE_RE.match(clause) or not re.search(r'\s', re.sub(r'"[^"]*"', '', clause)) for clause in clauses):
+        return None
+
+    return clauses
+
+
+def rewrite_clause(clause):
+    """
+    Return (negated, filter) tuple for a given query string clause
+
+    :type clause str
+    :rtype: tuple
+    """
+    matches = CLAUSE_RE.match(clause)
+
+    if matches is None:
+        return False, {'query_string': {'query': clause}}
+
+    negated = matches.group('negated') is not None
+    field = matches.group('field')
+    value = matches.group('value')
+
+    if value == '*':
+        return negated, {'exists': {'field': field}}
+
+    if value.startswith('"'):
+        return negated, {'match_phrase': {field: value[1:-1]}}
+
+    if RANGE_RE.match(value):
+        bounds = RANGE_RE.match(value).groupdict()
+        return negated, {'range': {field: dict((key, bound) for (key, bound) in bounds.items() if bound != '*')}}
+
+    if REGEXP_PREFIX_RE.match(value):
+        return negated, {'prefix': {field: REGEXP_PREFIX_RE.match(value).group('prefix')}}
+
+    if REGEXP_CHARACTERS_RE.match(value):
+        return negated, {
+            'bool': {
+                'should': [{'prefix': {field: character}}
+                           for character in REGEXP_CHARACTERS_RE.match(value).group('characters')],
+                'minimum_should_match': 1,
+            }
+        }
+
+    if len(value) > 2 and value.startswith('/') and value.endswith('/'):
+        return negated, {'regexp': {field: value[1:-1]}}
+
+    # query string normalizes (lowercases) prefixes, it's not done by the prefix query
+    if re.match(r'^[a-z0-9_-]+\*$', value):
+        return negated, {'prefix': {field: value[:-1]}}
+
+    if re.match(r'^[\w.-]+$', value):
+        return negated, {'match': {field: value}}
+
+    # e.g. leading wildcards
+    return False, {'query_string': {'query': clause}}
+
+
+def rewrite_query_string(query):
+    """
+    Return Elasticsearch query (in the filter context) equivalent to a given query string
+
+    :type query str
+    :rtype: dict
+    """
+    clauses = split_query_string(query)
+
+    if clauses is None:
+        return {'bool': {'filter': [{'query_string': {'query': query}}]}}
+
+    filters = []
+    must_not = []
+
+    for clause in clauses:
+        (negated, rewritten) = rewrite_clause(clause)
+        (must_not if negated else filters).append(rewritten)
+
+    query = {'bool': {'filter': filters}}
+
+    if must_not:
+        query['bool']['must_not'] = must_not
+
+    return query
@@ -25,9 +25,12 @@ h3. {full_message}
 
     KIBANA_QUERY = 'appname: "vignette" AND logger_name: "{}" AND level: "ERROR"'.format(LOGGER)
 
+    ELASTICSEARCH_QUERY = KIBANA_QUERY
+    MSEARCH = True
+
     def _get_entries(self, query):
         return self._kibana.query_by_string(
-            query=self.KIBANA_QUERY,
+            query=self.ELASTICSEARCH_QUERY,
             limit=self.LIMIT
         )
 
@@ -0,0 +1,263 @@
+"""
+Durable local spool of detected reports
+
+Detected reports are appended to a JSONL file before they're filed, so that they're not lost when Jira is slow
+or the process is killed mid-run. Filing consumes the spool and checkpoints the offset of the first report
+that was not handled yet, the next run resumes from there.
+
+path          - one serialized report per line (append-only)
+path.offset   - the checkpoint (byte offset in the spool)
+
+Enable it by setting REPORTER_SPOOL_PATH to a file path.
+"""
+import json
+import logging
+import os
+import threading
+
+from reporter.reports import Report
+
+
+class SpoolBatch(object):
+    """
+    Reports read from (or appended to) the spool, they're marked as handled once filed or dropped
+    """
+    def __init__(self, spool, entries):
+        """
+        :type spool ReportSpool
+        :type entries list[tuple]
+        :arg entries: list of (offset of the line, report) tuples
+        """
+        self._spool = spool
+        self._entries = entries
+        self._offsets = dict((id(report), offset) for (offset, report) in entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_reports(self):
+        """
+        :rtype: list[reporter.reports.Report]
+        """
+        return [report for (_, report) in self._entries]
+
+    def mark_handled(self, report):
+        """
+        :type report reporter.reports.Report
+        """
+        self._spool.mark_handled(self._offsets[id(report)])
+
+
+class ReportSpool(object):
+    """
+    Append-only JSONL file of reports with a checkpoint
+
+    Reports can be handled in any order and by many batches (e.g. reports left by the previous run and
+    the ones appended by the current one). The checkpoint is only moved up to the first line that was
+    not handled yet, regardless of the batch it belongs to.
+    """
+    # how many bytes are read at once when looking for the end of the last complete line
+    CHUNK_SIZE = 4096
+
+    def __init__(self, path):
+        """
+        :type path str
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+
+        self._path = path
+        self._checkpoint = self._load_checkpoint()
+        self._truncate_incomplete_line()
+
+        # lines that were read or appended and were not handled yet (offset of the line -> offset of the next one)
+        self._pending = dict()
+        self._end = self._checkpoint  # the end of the last read or appended line
+
+    def _get_checkpoint_path(self):
+        return '{}.offset'.format(self._path)
+
+    def _load_checkpoint(self):
+        """
+        :rtype: int
+        """
+        if os.path.exists(self._get_checkpoint_path()):
+            with open(self._get_checkpoint_path()) as fp:
+                return json.load(fp)['offset']
+
+        return 0
+
+    def _truncate_incomplete_line(self):
+        """
+        Remove the incomplete line (e.g. the process was killed while appending), so that reports are appended after
+        the last complete one
+        """
+        if not os.path.exists(self._path):
+            return
+
+        with open(self._path, 'r+b') as fp:
+            fp.seek(0, os.SEEK_END)
+            size = end = fp.tell()
+
+            while end > 0:
+                start = max(0, end - self.CHUNK_SIZE)
+                fp.seek(start)
+
+                index = fp.read(end - start).rfind('\n')
+
+                if index >= 0:
+                    end = start + index + 1
+                    break
+
+                end = start
+
+            if end < size:
+                self._logger.warning('Incomplete line at the end of the spool removed ({} bytes)'.format(size - end))
+                fp.truncate(end)
+
+    def _save_checkpoint(self):
+        tmp_path = '{}.{}.tmp'.format(self._get_checkpoint_path(), os.getpid())
+
+        with open(tmp_path, 'w') as fp:
+            json.dump({'offset': self._checkpoint}, fp)
+
+        os.rename(tmp_path, self._get_checkpoint_path())
+
+    def get_checkpoint(self):
+        """
+        :rtype: int
+        """
+        return self._checkpoint
+
+    def mark_handled(self, offset):
+        """
+        Mark the line at a given offset as handled, the checkpoint is moved to the first pending line
+
+        :type offset int
+        """
+        with self._lock:
+            if self._pending.pop(offset, None) is None:
+                return
+
+            self._move_checkpoint()
+
+    def _move_checkpoint(self):
+        checkpoint = min(self._pending) if self._pending else self._end
+
+        if checkpoint > self._checkpoint:
+            self._checkpoint = checkpoint
+            self._save_checkpoint()
+
+    def _add_pending(self, entries):
+        """
+        :type entries list[tuple]
+        :arg entries: list of (offset of the line, offset of the next line) tuples
+        """
+        for (offset, end) in entries:
+            self._pending[offset] = end
+            self._end = max(self._end, end)
+
+    def append(self, reports):
+        """
+        Append reports to the spool (they're on the disk once this method returns)
+
+        Returns the batch of appended reports, they can be marked as handled without reading the spool again.
+
+        :type reports list[reporter.reports.Report]
+        :rtype: SpoolBatch
+        """
+        lines = [json.dumps(report.to_dict()) + '\n' for report in reports]
+        entries = []
+
+        with self._lock:
+            with open(self._path, 'ab') as fp:
+                fp.seek(0, os.SEEK_END)
+                offset = fp.tell()
+
+                for (line, report) in zip(lines, reports):
+                    entries.append((offset, report))
+                    offset += len(line)
+
+                fp.write(''.join(lines))
+                fp.flush()
+                os.fsync(fp.fileno())
+
+            self._add_pending([(start, start + len(line)) for ((start, _), line) in zip(entries, lines)])
+
+        self._logger.info('{} reports spooled'.format(len(reports)))
+        return SpoolBatch(self, entries)
+
+    def read(self):
+        """
+        Return reports that were not handled yet
+
+        Incomplete lines (e.g. the process was killed while appending) and lines that can not be decoded are skipped.
+
+        :rtype: SpoolBatch
+        """
+        entries = []
+        lines = []
+
+        with self._lock:
+            if os.path.exists(self._path):
+                with open(self._path, 'rb') as fp:
+                    fp.seek(self._checkpoint)
+                    offset = self._checkpoint
+
+                    for line in fp:
+                        if not line.endswith('\n'):
+                            self._logger.warning('Incomplete line at the end of the spool skipped')
+                            break
+
+                        try:
+                            entries.append((offset, Report.from_dict(json.loads(line))))
+                            lines.append((offset, offset + len(line)))
+                        except (ValueError, KeyError, TypeError):
+                            self._logger.warning('Malformed line at offset {} of the spool skipped'.format(offset),
+                                                 exc_info=True)
+
+                        offset += len(line)
+                        self._end = max(self._end, offset)
+
+            self._add_pending(lines)
+
+            # do not read skipped lines again
+            self._move_checkpoint()
+
+        self._logger.info('{} reports read from the spool'.format(len(entries)))
+        return SpoolBatch(self, entries)
+
+    def compact(self):
+        """
+        Truncate the spool when all reports were handled
+        """
+        with self._lock:
+            if not os.path.exists(self._path) or os.path.getsize(self._path) != self._checkpoint:
+                return
+
+            with open(self._path, 'wb'):
+                pass
+
+            self._checkpoint = 0
+            self._end = 0
+            self._save_checkpoint()
+
+
+_spool = None
+
+
+def setup_spool(path=None):
+    """
+    Enable the spool when the path is provided (either directly or via REPORTER_SPOOL_PATH)
+
+    :type path str
+    :rtype: ReportSpool|None
+    """
+    global _spool
+
+    path = path or os.environ.get('REPORTER_SPOOL_PATH')
+
+    if path:
+        _spool = ReportSpool(path)
+
+    return _spool
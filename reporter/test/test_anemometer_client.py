@@ -0,0 +1,114 @@
+"""
+Set of unit tests for AnemometerClient class
+"""
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from urlparse import parse_qs, urlparse
+
+from ..sources.anemometer.client import AnemometerClient
+
+
+class FakeAnemometerHandler(BaseHTTPRequestHandler):
+    """ Serves 320 queries for each datasource, responses have an ETag """
+    protocol_version = 'HTTP/1.1'
+
+    QUERIES = 320
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        self.server.requests.append(params)
+
+        etag = '"{}"'.format(params['datasource'][0])
+
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        (offset, limit) = [int(value) for value in params['fact-limit'][0].split(',')]
+
+        body = json.dumps({'result': [
+            {'checksum': str(checksum)} for checksum in range(offset, min(self.QUERIES, offset + limit))
+        ]})
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+class FakeAnemometerServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class AnemometerClientTestClass(unittest.TestCase):
+    """
+    Unit tests for AnemometerClient class
+    """
+    def setUp(self):
+        self._server = FakeAnemometerServer(('127.0.0.1', 0), FakeAnemometerHandler)
+        self._server.requests = []
+
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        self._url = 'http://127.0.0.1:{}/anemometer'.format(self._server.server_port)
+        self._cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+        shutil.rmtree(self._cache_dir)
+
+    def test_pagination(self):
+        client = AnemometerClient(self._url)
+
+        queries = client.get_queries(limit=1000)
+
+        assert len(queries) == 320
+        assert [query['checksum'] for query in queries] == [str(checksum) for checksum in range(320)]
+        assert queries[0]['datasource'] == 'localhost'
+
+        assert [params['fact-limit'][0] for params in self._server.requests] == ['0,150', '150,150', '300,150']
+
+        # stop when the limit is reached
+        assert len(client.get_queries(limit=200)) == 200
+        assert [params['fact-limit'][0] for params in self._server.requests[3:]] == ['0,150', '150,50']
+
+    def test_datasources(self):
+        client = AnemometerClient(self._url)
+
+        queries = client.get_queries_from_datasources(['localhost', 'dbs-a'], limit=10)
+
+        assert len(queries) == 20
+        assert [query['datasource'] for query in queries] == ['localhost'] * 10 + ['dbs-a'] * 10
+
+    def test_cache(self):
+        client = AnemometerClient(self._url, cache_dir=self._cache_dir)
+
+        assert len(client.get_queries(limit=10)) == 10
+        assert len(self._server.requests) == 1
+
+        # served from the cache
+        assert len(AnemometerClient(self._url, cache_dir=self._cache_dir).get_queries(limit=10)) == 10
+        assert len(self._server.requests) == 1
+
+        # expired, but not modified
+        client = AnemometerClient(self._url, cache_dir=self._cache_dir, cache_ttl=-1)
+
+        assert len(client.get_queries(limit=10)) == 10
+        assert len(self._server.requests) == 2
@@ -0,0 +1,44 @@
+"""
+Set of unit tests for ClientsRegistry class
+"""
+import unittest
+
+from ..clients import ClientsRegistry, get_clients
+from ..sources.anemometer.client import AnemometerClient
+from ..sources.kibana import KibanaClient
+
+
+class ClientsRegistryTestClass(unittest.TestCase):
+    """
+    Unit tests for ClientsRegistry class
+    """
+    def test_elasticsearch(self):
+        clients = ClientsRegistry(pool_size=5, timeout=3)
+
+        es = clients.get_elasticsearch('es.example.net')
+
+        assert clients.get_elasticsearch('es.example.net') is es
+        assert clients.get_elasticsearch(['es.example.net', 'es2.example.net']) is not es
+
+        connection = es.transport.get_connection()
+        assert connection.pool.pool.maxsize == 5
+        assert connection.timeout == 3
+
+    def test_http_session(self):
+        clients = ClientsRegistry(pool_size=5)
+
+        session = clients.get_http_session('http://anemometer.example.net/anemometer')
+
+        assert clients.get_http_session('http://anemometer.example.net/foo/index.php') is session
+        assert clients.get_http_session('https://anemometer.example.net/anemometer') is not session
+
+        assert session.get_adapter('http://anemometer.example.net/')._pool_maxsize == 5
+        assert clients.get_timeout() == ClientsRegistry.TIMEOUT
+
+    def test_shared_clients(self):
+        # all Kibana clients share the same connections pool
+        assert KibanaClient()._es is KibanaClient(index_prefix='logstash-mediawiki')._es
+        assert KibanaClient()._es is get_clients().get_elasticsearch(KibanaClient.ELASTICSEARCH_HOST)
+
+        assert AnemometerClient('http://anemometer.example.net').http is \
+            AnemometerClient('http://anemometer.example.net').http
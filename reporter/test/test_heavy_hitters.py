@@ -0,0 +1,89 @@
+"""
+Set of unit tests for SpaceSaving class
+"""
+import random
+import unittest
+
+from collections import Counter
+
+from ..heavy_hitters import SpaceSaving
+from ..sources import Source
+
+
+class SpaceSavingTestClass(unittest.TestCase):
+    """
+    Unit tests for SpaceSaving class
+    """
+    @staticmethod
+    def _count(table, keys):
+        for key in keys:
+            if key in table:
+                table.incr(key)
+            else:
+                table[key] = {'cnt': 1}
+
+    def test_exact_counts(self):
+        table = SpaceSaving(capacity=5)
+        self._count(table, ['foo', 'bar', 'foo', 'test', 'foo'])
+
+        assert len(table) == 3
+        assert table['foo'] == {'cnt': 3, 'error': 0}
+        assert table['bar'] == {'cnt': 1, 'error': 0}
+        assert table.get_total() == 5
+        assert table.get_max_error() == 1
+
+    def test_eviction(self):
+        table = SpaceSaving(capacity=2)
+        self._count(table, ['foo', 'foo', 'foo', 'bar', 'test'])
+
+        # "bar" (the least frequent key) was replaced by "test"
+        assert len(table) == 2
+        assert 'bar' not in table
+        assert table['foo'] == {'cnt': 3, 'error': 0}
+        assert table['test'] == {'cnt': 2, 'error': 1}
+
+    def test_guarantees(self):
+        rand = random.Random(42)
+
+        # a few heavy hitters and a long tail of noise
+        keys = ['heavy-{}'.format(i) for i in range(5) for _ in range(500 * (i + 1))] + \
+            ['noise-{}'.format(rand.randint(0, 20000)) for _ in range(20000)]
+        rand.shuffle(keys)
+
+        table = SpaceSaving(capacity=100)
+        self._count(table, keys)
+
+        assert len(table) == 100
+        assert table.get_total() == len(keys)
+
+        for key, count in Counter(keys).items():
+            if count > len(keys) / 100:
+                assert key in table, key
+
+            if key in table:
+                # counts are overestimated by at most the error
+                assert count <= table[key]['cnt'] <= count + table[key]['error']
+                assert table[key]['error'] <= table.get_max_error()
+
+    def test_merge_approximate_tables(self):
+        merged = Source._merge_normalized_entries([
+            {
+                'foo': {'cnt': 10, 'error': 0, 'entry': 1, 'has_all_required_fields': True},
+                'bar': {'cnt': 3, 'error': 0, 'entry': 2, 'has_all_required_fields': True},
+            },
+            {
+                'foo': {'cnt': 4, 'error': 0, 'entry': 3, 'has_all_required_fields': True},
+                'test': {'cnt': 2, 'error': 1, 'entry': 4, 'has_all_required_fields': True},
+            },
+        ])
+
+        assert merged['foo']['cnt'] == 14
+        assert merged['foo']['error'] == 0
+
+        # "bar" could occur in the second chunk up to two times before being evicted
+        assert merged['bar']['cnt'] == 5
+        assert merged['bar']['error'] == 2
+
+        # there were no evictions in the first chunk
+        assert merged['test']['cnt'] == 2
+        assert merged['test']['error'] == 1
@@ -23,6 +23,7 @@ class UtilsTestClass(unittest.TestCase):
 
         assert is_from_production_host('ap-r32')
         assert is_from_production_host('dev-foo') is False
+        assert is_from_production_host(u'ap-s32')  # JSON-decoded values are unicode
 
         assert is_from_production_host('deploy-s3')
         assert is_from_production_host('deploy-r2')
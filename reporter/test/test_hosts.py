@@ -0,0 +1,50 @@
+"""
+Set of unit tests for HostIndex class
+"""
+import tempfile
+import unittest
+
+from ..hosts import HostIndex, Host
+
+
+class HostIndexTestClass(unittest.TestCase):
+    """
+    Unit tests for HostIndex class
+    """
+    def test_get(self):
+        index = HostIndex()
+
+        assert index.get('ap-s32') == Host(name='ap-s32', is_production=True, datacenter=HostIndex.DC_MAIN)
+        assert index.get('task-r1') == Host(name='task-r1', is_production=True, datacenter=HostIndex.DC_BACKUP)
+        assert index.get('staging-s1') == Host(name='staging-s1', is_production=True, datacenter=HostIndex.DC_PREVIEW)
+        assert index.get(u'dev-foo') == Host(name='dev-foo', is_production=False, datacenter=HostIndex.DC_MAIN)
+
+        assert index.is_production('staging-ap-s1') is True
+        assert index.is_production('') is False
+        assert index.get_datacenter('service-r1') == HostIndex.DC_BACKUP
+
+        assert len(index) == 7
+
+        # hosts are classified once
+        assert index.get('ap-s32') is index.get('ap-s32')
+
+    def test_max_size(self):
+        index = HostIndex()
+        index.MAX_SIZE = 2
+
+        index.preload(['ap-s1', 'ap-s2'])
+        assert len(index) == 2
+
+        assert index.is_production('ap-s3') is True
+        assert len(index) == 1
+
+    def test_preload_from_file(self):
+        with tempfile.NamedTemporaryFile() as fp:
+            fp.write('ap-s1\n\nap-r2\n')
+            fp.flush()
+
+            index = HostIndex()
+            index.preload_from_file(fp.name)
+
+        assert len(index) == 2
+        assert index.get_datacenter('ap-r2') == HostIndex.DC_BACKUP
@@ -0,0 +1,308 @@
+"""
+Set of unit tests for KibanaClient class
+"""
+import gzip
+import json
+import socket
+import threading
+import unittest
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from collections import OrderedDict
+from SocketServer import ThreadingMixIn
+from StringIO import StringIO
+
+from elasticsearch import Elasticsearch, RequestsHttpConnection
+
+from ..clients import ClientsRegistry
+from ..sources.common import KibanaSource
+from ..sources import DBQueryErrorsSource, PHPErrorsSource
+from ..sources.kibana import KibanaClient, iter_hits
+
+
+def _get_response(scroll_id, hits, total=3):
+    # keep the order of fields used by Elasticsearch
+    return json.dumps(OrderedDict([
+        ('_scroll_id', scroll_id),
+        ('took', 1),
+        ('timed_out', False),
+        ('_shards', {'total': 5, 'successful': 5, 'skipped': 0, 'failed': 0}),
+        ('hits', OrderedDict([
+            ('total', total),
+            ('max_score', None),
+            ('hits', [{'_index': 'logstash-other', '_id': str(hit), '_source': {'@message': u'f\xf3o {}'.format(hit)}}
+                      for hit in hits]),
+        ])),
+    ]))
+
+
+class FakeElasticsearchHandler(BaseHTTPRequestHandler):
+    """ Serves scroll API responses (gzipped when requested) with three hits in total """
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.GzipFile(fileobj=StringIO(body)).read()
+            self.server.compressed += 1
+
+        self.server.requests.append((self.path, json.loads(body)))
+
+        if self.path.startswith('/_search/scroll'):
+            response = _get_response('scroll-2', [2] if json.loads(body)['scroll_id'] == 'scroll-1' else [])
+        else:
+            response = _get_response('scroll-1', [0, 1])
+
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            buf = StringIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb') as fp:
+                fp.write(response)
+
+            response = buf.getvalue()
+            self.send_response(200)
+            self.send_header('Content-Encoding', 'gzip')
+        else:
+            self.send_response(200)
+
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+class FakeElasticsearchServer(ThreadingMixIn, HTTPServer):
+    """ Keep-alive connections are handled in separate threads """
+    daemon_threads = True
+
+
+class FakeKibanaClient(KibanaClient):
+    """ Returns a hit for every second of the window, hits.total reflects the time range """
+    def __init__(self, **kwargs):
+        super(FakeKibanaClient, self).__init__(**kwargs)
+        self.ranges = []
+
+    def iter_search(self, query, fields=None, sampling=None, meta=None, since=None, to=None, closed=True):
+        since = since if since is not None else self._since
+        to = to if to is not None else self._to
+
+        self.ranges.append(self._get_time_range_filter(since, to, closed)['range']['@timestamp'])
+        timestamps = range(since, to + 1 if closed else to)
+
+        if meta is not None:
+            meta['total'] = len(timestamps)
+
+        for timestamp in timestamps:
+            yield {'_source': {'@timestamp': timestamp}}
+
+
+class KibanaClientTestClass(unittest.TestCase):
+    """
+    Unit tests for KibanaClient class
+    """
+    def test_iter_hits(self):
+        response = _get_response('c2NhbjsxOzE=', range(5), total=123)
+
+        # split the response into small chunks (including the middle of multi-byte UTF-8 sequences)
+        for chunk_size in [1, 2, 7, 64, len(response)]:
+            meta = dict()
+            chunks = [response[i:i + chunk_size] for i in range(0, len(response), chunk_size)]
+
+            hits = list(iter_hits(chunks, meta))
+
+            assert hits == json.loads(response)['hits']['hits']
+            assert meta == {'_scroll_id': 'c2NhbjsxOzE=', 'total': 123}
+
+        # Elasticsearch 7.x format of hits.total
+        meta = dict()
+        assert list(iter_hits(['{"hits":{"total":{"value":2,"relation":"eq"},"hits":[]}}'], meta)) == []
+        assert meta == {'_scroll_id': None, 'total': 2}
+
+        # truncated response
+        with self.assertRaises(ValueError):
+            list(iter_hits([response[:-50]]))
+
+    def test_sampling(self):
+        client = KibanaClient()
+        assert len(client._get_search_body({'match': {'@message': 'foo'}})['query']['bool']['must']) == 2
+
+        body = client._get_search_body({'match': {'@message': 'foo'}}, sampling=10)
+        assert body['query']['bool']['must'][2]['script']['script']['params'] == {'sampling': 10}
+
+        # sources can fetch a sample of entries
+        assert KibanaSource(sampling=10)._kibana._sampling == 10
+        assert KibanaSource()._kibana._sampling is None
+
+    def test_filters(self):
+        client = KibanaClient()
+        assert 'filter' not in client._get_search_body({'match': {'@message': 'foo'}})['query']['bool']
+
+        client.set_filters([{'exists': {'field': 'appname'}}])
+        assert client._get_search_body({'match': {'@message': 'foo'}})['query']['bool']['filter'] == \
+            [{'exists': {'field': 'appname'}}]
+
+        # sources push their predicates down to Elasticsearch
+        assert KibanaSource()._kibana._filters == []
+        assert PHPErrorsSource()._kibana._filters == [PHPErrorsSource.FILTER.to_elasticsearch()]
+        assert DBQueryErrorsSource()._kibana._filters == [DBQueryErrorsSource.ELASTICSEARCH_FILTER.to_elasticsearch()]
+
+    def test_split_window(self):
+        client = FakeKibanaClient()
+        client.refresh_window(now=1542369900)
+
+        window = client._get_time_range_filter()['range']['@timestamp']
+        timestamps = range(client._since, client._to + 1)
+
+        # the window fits the limit
+        assert [row['@timestamp'] for row in client.get_rows({'@message': 'foo'}, limit=len(timestamps))] == timestamps
+        assert client.ranges == [window]
+
+        # the window is split into slices, all hits are returned
+        del client.ranges[:]
+        assert [row['@timestamp'] for row in client.get_rows({'@message': 'foo'}, limit=len(timestamps) // 3)] == timestamps
+
+        slices = client.ranges[1:]
+        assert client.ranges[0] == window
+        assert len(slices) == 4
+
+        # every instant of the window is covered by exactly one slice (including sub-second timestamps)
+        assert slices[0]['gte'] == window['gte'] and slices[-1]['lte'] == window['lte']
+        assert all(slices[i]['lt'] == slices[i + 1]['gte'] for i in range(len(slices) - 1))
+        assert all('lte' not in time_range for time_range in slices[:-1])
+
+        # slices with too many hits are split again
+        del client.ranges[:]
+        assert [row['@timestamp'] for row in client.get_rows({'@message': 'foo'}, limit=10)] == timestamps
+        assert len(client.ranges) > 1 + client.MAX_SLICES
+
+        # slices fetch up to MAX_ROWS rows in total, the remaining ones are not queried
+        fetched = len(client.ranges)
+        del client.ranges[:]
+        client.MAX_ROWS = 100
+
+        assert len(client.get_rows({'@message': 'foo'}, limit=10)) == 100
+        assert len(client.ranges) < fetched
+
+        # the limit is applied when higher
+        assert len(client.get_rows({'@message': 'foo'}, limit=len(timestamps))) == len(timestamps)
+        client.MAX_ROWS = KibanaClient.MAX_ROWS
+
+        # results are truncated when the window can not be split anymore
+        client.MAX_SPLIT_DEPTH = 0
+        assert len(client.get_rows({'@message': 'foo'}, limit=10)) == 10
+
+    def test_indices(self):
+        client = KibanaClient(index_prefix='logstash-foo')
+
+        # 2018-11-16 12:05 - only today's index
+        client.refresh_window(now=1542369900)
+        assert client._index == 'logstash-foo-2018.11.16'
+
+        # 2018-11-16 00:30 - the window crosses midnight
+        client.refresh_window(now=1542328200)
+        assert client._index == 'logstash-foo-2018.11.15,logstash-foo-2018.11.16'
+
+        # windows longer than a day
+        client.set_period(2 * client.DAY)
+        client.refresh_window(now=1542369900)
+        assert client._index == 'logstash-foo-2018.11.14,logstash-foo-2018.11.15,logstash-foo-2018.11.16'
+
+        # slices of the window
+        assert client._get_index(client._since, client._since + 60) == 'logstash-foo-2018.11.14'
+
+        # Pandora logs are spread across many indices
+        client = KibanaClient(index_prefix='logstash-*')
+        client.refresh_window(now=1542369900)
+        assert client._index == 'logstash-*-2018.11.16'
+
+    def test_search(self):
+        server = FakeElasticsearchServer(('127.0.0.1', 0), FakeElasticsearchHandler)
+        server.requests = []
+        server.compressed = 0
+
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        try:
+            client = KibanaClient(index_prefix='logstash-foo')
+            client._es = ClientsRegistry().get_elasticsearch('127.0.0.1:{}'.format(server.server_port))
+            client.refresh_window(now=1542369900)
+
+            assert client.get_rows({'@message': 'foo'}, limit=10) == [
+                {'@message': u'f\xf3o 0'}, {'@message': u'f\xf3o 1'}, {'@message': u'f\xf3o 2'}]
+
+            # the first batch and two scroll requests
+            assert [path.split('?')[0] for (path, _) in server.requests] == \
+                ['/logstash-foo-2018.11.16/_search', '/_search/scroll', '/_search/scroll']
+
+            # missing indices are ignored
+            assert 'ignore_unavailable=true' in server.requests[0][0]
+
+            assert server.requests[0][1]['query']['bool']['must'][0] == {'match': {'@message': 'foo'}}
+            assert server.requests[0][1]['sort'] == ['_doc']
+            assert server.requests[1][1]['scroll_id'] == 'scroll-1'
+
+            # requests and responses are gzipped
+            assert server.compressed == 3
+
+            # limit is applied while streaming (the fake server ignores the time range, do not split it)
+            client.MAX_SPLIT_DEPTH = 0
+            del server.requests[:]
+            assert len(client.get_rows({'@message': 'foo'}, limit=1)) == 1
+            assert len(server.requests) == 1
+
+            # query strings are rewritten into filters
+            del server.requests[:]
+            assert len(client.query_by_string('@message: "foo" AND @fields.http_url: *', limit=1)) == 1
+            assert server.requests[0][1]['query']['bool']['must'][0] == {'bool': {'filter': [
+                {'match_phrase': {'@message': 'foo'}}, {'exists': {'field': '@fields.http_url'}}]}}
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_search_fallback(self):
+        server = FakeElasticsearchServer(('127.0.0.1', 0), FakeElasticsearchHandler)
+        server.requests = []
+        server.compressed = 0
+
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        # nothing listens on this port
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        dead_port = sock.getsockname()[1]
+        sock.close()
+
+        try:
+            client = KibanaClient(index_prefix='logstash-foo')
+            client.refresh_window(now=1542369900)
+            client.MAX_SPLIT_DEPTH = 0
+
+            # the dead node is marked as such and the request is retried on the other one
+            hosts = ['127.0.0.1:{}'.format(dead_port), '127.0.0.1:{}'.format(server.server_port)]
+            client._es = Elasticsearch(hosts=hosts, randomize_hosts=False, http_compress=True)
+
+            assert len(client.get_rows({'@message': 'foo'}, limit=10)) == 3
+            assert len(client._es.transport.connection_pool.connections) == 1
+
+            # connections without the urllib3 pool go through Transport.perform_request
+            del server.requests[:]
+            client._es = Elasticsearch(hosts='127.0.0.1:{}'.format(server.server_port),
+                                       connection_class=RequestsHttpConnection)
+
+            meta = dict()
+            assert [hit['_id'] for hit in client.iter_search({'@message': 'foo'}, meta=meta)] == ['0', '1', '2']
+            assert meta == {'_scroll_id': 'scroll-1', 'total': 3}
+
+            assert [path.split('?')[0] for (path, _) in server.requests] == \
+                ['/logstash-foo-2018.11.16/_search', '/_search/scroll', '/_search/scroll']
+            assert 'ignore_unavailable=true' in server.requests[0][0]
+        finally:
+            server.shutdown()
+            server.server_close()
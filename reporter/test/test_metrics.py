@@ -0,0 +1,72 @@
+"""
+Set of unit tests for Metrics class
+"""
+import threading
+import unittest
+
+from ..metrics import Metrics
+
+
+class MetricsTestClass(unittest.TestCase):
+    """
+    Unit tests for Metrics class
+    """
+    def setUp(self):
+        self._metrics = Metrics()
+
+    def test_counters_and_timers(self):
+        self._metrics.incr('hits_total', 5, source='Foo')
+        self._metrics.incr('hits_total', source='Foo')
+        self._metrics.incr('hits_total', source='Bar')
+
+        assert self._metrics.get_counter('hits_total', source='Foo') == 6
+        assert self._metrics.get_counter('hits_total', source='Bar') == 1
+        assert self._metrics.get_counter('hits_total') == 0
+
+        with self._metrics.timer('stage_seconds', stage='fetch'):
+            pass
+
+        self._metrics.timing('stage_seconds', 2.5, stage='fetch')
+
+        (seconds, count) = self._metrics.get_timing('stage_seconds', stage='fetch')
+        assert count == 2
+        assert seconds >= 2.5
+
+    def test_to_prometheus(self):
+        self._metrics.incr('hits_total', 5, source='Foo', query='PHP "Notice"')
+        self._metrics.timing('stage_seconds', 1.5, stage='fetch')
+
+        assert self._metrics.to_prometheus() == \
+            '# TYPE jira_reporter_hits_total counter\n' \
+            'jira_reporter_hits_total{query="PHP \\"Notice\\"",source="Foo"} 5\n' \
+            '# TYPE jira_reporter_stage_seconds summary\n' \
+            'jira_reporter_stage_seconds_sum{stage="fetch"} 1.500000\n' \
+            'jira_reporter_stage_seconds_count{stage="fetch"} 1\n'
+
+    def test_to_statsd(self):
+        self._metrics.incr('hits_total', 5, source='Foo', query='PHP Notice')
+        self._metrics.timing('stage_seconds', 1.5, stage='fetch')
+
+        assert self._metrics.to_statsd() == [
+            'jira_reporter.hits_total:5|c|#query:PHP Notice,source:Foo',
+            'jira_reporter.stage_seconds:1500.000|ms|#stage:fetch',
+        ]
+
+    def test_export_while_updated(self):
+        """ Values are formatted while other threads add new metrics (e.g. /metrics endpoint of the daemon) """
+        def _update():
+            for index in range(2000):
+                self._metrics.incr('hits_total', query=str(index))
+                self._metrics.timing('stage_seconds', 0.1, query=str(index))
+
+        thread = threading.Thread(target=_update)
+        thread.start()
+
+        try:
+            while thread.is_alive():
+                self._metrics.to_prometheus()
+                self._metrics.to_statsd()
+        finally:
+            thread.join()
+
+        assert len(self._metrics.to_statsd()) == 4000
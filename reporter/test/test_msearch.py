@@ -0,0 +1,94 @@
+"""
+Set of unit tests for MultiSearch class
+"""
+import unittest
+
+from ..sources import HeliosSource, KubernetesBackoffSource, PHPErrorsSource, PHPSecuritySource
+from ..sources.msearch import MultiSearch
+
+
+class FakeElasticsearch(object):
+    """ Returns a response with a given number of hits for each search (or an error for a negative one) """
+    def __init__(self, totals):
+        self.totals = list(totals)
+        self.requests = []
+
+    def msearch(self, body):
+        self.requests.append(body)
+
+        responses = []
+
+        for total in self.totals[:len(body) // 2]:
+            if total < 0:
+                responses.append({'error': {'type': 'index_not_found_exception'}, 'status': 404})
+            else:
+                responses.append({'hits': {'total': total, 'hits': [
+                    {'_source': {'@message': 'foo {}'.format(hit)}} for hit in range(min(total, 10))]}})
+
+        del self.totals[:len(body) // 2]
+        return {'responses': responses}
+
+
+class BrokenElasticsearch(object):
+    """ Raises an exception for every request """
+    def msearch(self, body):
+        raise IOError('Connection refused')
+
+
+class MultiSearchTestClass(unittest.TestCase):
+    """
+    Unit tests for MultiSearch class
+    """
+    def test_execute(self):
+        es = FakeElasticsearch([1, 0, 20, -1])
+        other_es = FakeElasticsearch([2])
+
+        search = MultiSearch()
+
+        requests = [
+            search.add(es, 'logstash-helios', {'size': 10}),
+            search.add(es, 'logstash-index-digest', {'size': 10}),
+            search.add(other_es, 'logstash-other', {'size': 10}),
+            search.add(es, 'logstash-pipe', {'size': 10}),  # truncated
+            search.add(es, 'logstash-foo', {'size': 10}),  # failed
+        ]
+
+        assert len(search) == 5
+        assert requests == [0, 1, 2, 3, 4]
+
+        results = search.execute()
+
+        assert results == [[{'@message': 'foo 0'}], [], [{'@message': 'foo 0'}, {'@message': 'foo 1'}], None, None]
+
+        # a single request per cluster
+        assert len(es.requests) == 1
+        assert len(other_es.requests) == 1
+
+        assert es.requests[0][0] == {'index': 'logstash-helios', 'ignore_unavailable': True}
+        assert es.requests[0][1] == {'size': 10}
+        assert [header['index'] for header in es.requests[0][::2]] == \
+            ['logstash-helios', 'logstash-index-digest', 'logstash-pipe', 'logstash-foo']
+
+    def test_failed_request(self):
+        search = MultiSearch()
+        search.add(BrokenElasticsearch(), 'logstash-helios', {'size': 10})
+
+        assert search.execute() == [None]
+
+    def test_sources(self):
+        (es, index, body) = HeliosSource().get_multi_search_request()
+
+        assert index.startswith('logstash-helios-')
+        assert body['size'] == HeliosSource.MSEARCH_LIMIT
+        assert body['query']['bool']['must'][0] == {'bool': {'filter': [{'match_phrase': {'level': 'error'}}]}}
+        assert body['query']['bool']['filter'] == [HeliosSource.ELASTICSEARCH_FILTER.to_elasticsearch()]
+
+        (_, _, body) = PHPSecuritySource().get_multi_search_request()
+        assert body['query']['bool']['must'][0] == {'match': {'@exception.class': 'Wikia\\Security\\Exception'}}
+
+        (_, _, body) = KubernetesBackoffSource().get_multi_search_request()
+        assert body['query']['bool']['must'][0]['bool']['filter'][0] == \
+            {'match_phrase': {'eventMessage': KubernetesBackoffSource.EVENT_MESSAGE}}
+
+        # sources with many hits are scrolled
+        assert PHPErrorsSource().get_multi_search_request() is None
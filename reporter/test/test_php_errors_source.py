@@ -152,6 +152,44 @@ class PHPErrorsSourceTestClass(unittest.TestCase):
             '@message': 'PHP Notice: unserialize(): Error at offset 65532 of 3124123 bytes in /extensions/wikia/ImageServing/drivers/ImageServingDriverMainNS.class.php on line 101',
         }) == 'PHP-PHP Notice: unserialize(): Error at offset N of N bytes in /extensions/wikia/ImageServing/drivers/ImageServingDriverMainNS.class.php on line 101-Production'
 
+    def test_batch_processing(self):
+        """ The batch path should filter and group entries the same way as the per-entry one """
+        def _get_entries():
+            return [
+                {'@message': 'PHP Warning: foo in /usr/wikia/slot1/123/src/Foo.php on line 42', '@fields': {'environment': 'prod'}, '@source_host': 'ap-s1'},
+                {'@message': 'PHP Warning: foo in /usr/wikia/slot1/456/src/Foo.php on line 42', '@fields': {'environment': 'prod', 'http_url': 'http://foo.wikia.com'}, '@source_host': 'ap-s2'},
+                {'@message': 'PHP Warning: foo in /usr/wikia/slot1/456/src/Foo.php on line 42', '@fields': {'environment': 'preview'}, '@source_host': 'staging-s1'},
+                {'@message': 'PHP Warning: foo in /usr/wikia/slot1/123/src/Foo.php on line 42', '@fields': {'environment': 'sandbox'}, '@source_host': 'ap-s1'},
+                {'@message': 'PHP Fatal Error: Allowed memory size of 42 bytes exhausted on line 1', '@fields': {'environment': 'prod'}},
+                {'@message': u'PHP Notice: Undefined index: \u0107 in /Bar.php on line 1', '@fields': {'environment': 'prod'}},
+                {'@message': 'PHP Notice: no context', '@fields': {'environment': 'prod'}},
+                {'@fields': {'environment': 'prod'}},
+            ]
+
+        assert self._source._use_batch_processing() is True
+        (entries_count, normalized) = self._source._filter_and_normalize_batch(_get_entries())
+
+        entries = [entry for entry in _get_entries() if self._source._filter(entry)]
+        assert entries_count == len(entries) == 4
+        assert normalized == self._source._normalize_entries(entries)
+
+        assert sorted((key, item['cnt']) for (key, item) in normalized.items()) == [
+            ('php-phpnotice:undefinedindex:xin/bar.phponline1-production', 1),
+            ('php-phpwarning:fooin/foo.phponline42-preview', 1),
+            ('php-phpwarning:fooin/foo.phponline42-production', 2),
+        ]
+
+        # the entry with @fields.http_url is used for the report
+        item = normalized['php-phpwarning:fooin/foo.phponline42-production']
+        assert item['entry']['@source_host'] == 'ap-s2'
+        assert item['entry']['@message_normalized'] == 'PHP Warning: foo in /Foo.php on line 42'
+
+    def test_count_precheck(self):
+        # the count is run for the same query as the search
+        assert self._source.COUNT_PRECHECK is True
+        assert self._source._get_elasticsearch_query('PHP Warning') == \
+            {'bool': {'filter': [{'match_phrase': {'@message': 'PHP Warning'}}]}}
+
     def test_get_kibana_url(self):
         assert self._source._get_kibana_url({
             '@message': 'PHP Fatal Error: Maximum execution time of 180 seconds exceeded in /usr/wikia/slot1/2996/src/includes/Linker.php on line 184'
@@ -0,0 +1,108 @@
+"""
+Set of unit tests for FilingPlanner
+"""
+import unittest
+
+from reporter.classifier import Classifier
+from reporter.metrics import get_metrics
+from reporter.planner import FilingPlanner
+from reporter.reports import Report
+
+
+class FilingPlannerTestClass(unittest.TestCase):
+    FIELDS = {
+        'default': {
+            'issuetype': {'name': 'Defect'},
+            'priority': {'id': '8'},
+        },
+        'custom': {
+            'unique_id': 'customfield_13200',
+            'last_seen': 'customfield_16900',
+        },
+        'CT': {
+            'issuetype': {'name': 'Task'}
+        }
+    }
+
+    def setUp(self):
+        classifier = Classifier(config={
+            'components': {'Helios': 1, 'Chat': 5},
+            'paths': {'/extensions/wikia/Chat2': 'Chat'},
+        })
+
+        self._planner = FilingPlanner(classifier=classifier, project='ER', fields=self.FIELDS)
+
+    @staticmethod
+    def _get_report(summary, unique_id, counter=10, label=False):
+        report = Report(summary=summary, description='Foo', label=label)
+        report.set_unique_id(unique_id)
+        report.set_counter(counter)
+        return report
+
+    def test_plan(self):
+        metrics = get_metrics()
+        metrics.reset()
+
+        reports = [
+            self._get_report('foo', 'a'),
+            self._get_report('Helios error', 'b', label='Helios'),  # MAIN project
+            self._get_report('foo', 'a', counter=20),  # the same issue, more occurrences
+            self._get_report('bar', 'c'),
+            self._get_report('foo', 'a', counter=5),
+        ]
+
+        filings = self._planner.plan(reports)
+
+        assert [filing.get_unique_id() for filing in filings] == ['a', 'c']
+        assert filings[0].report is reports[2]
+
+        assert metrics.get_counter('filings_skipped_total', reason=FilingPlanner.REASON_MAIN) == 1
+        assert metrics.get_counter('filings_skipped_total', reason=FilingPlanner.REASON_DUPLICATE) == 2
+
+    def test_plan_chunks(self):
+        filed = set()
+
+        assert len(self._planner.plan([self._get_report('foo', 'a'), self._get_report('bar', 'b')], filed)) == 2
+        assert filed == set()
+
+        # reports filed from the previous chunk are skipped
+        filed.add('a')
+        filings = self._planner.plan([self._get_report('foo', 'a', counter=20), self._get_report('baz', 'c')], filed)
+
+        assert [filing.get_unique_id() for filing in filings] == ['c']
+
+    def test_get_fields(self):
+        report = self._get_report('x' * 300, 'e5f9ec048d1dbe19c70f720e002f9cb1', label='PHPErrors')
+        report.set_period(900)
+
+        assert self._planner.get_fields(report) == {
+            'project': {'key': 'ER'},
+            'summary': 'x' * 250,
+            'description': 'Foo\n\n========================\nHash: e5f9ec048d1dbe19c70f720e002f9cb1\n'
+                           'Occurrences: 10 in the last 15 minutes',
+            'labels': ['PHPErrors'],
+            'issuetype': {'name': 'Defect'},
+            'priority': {'id': '8'},
+            'customfield_13200': 'e5f9ec048d1dbe19c70f720e002f9cb1',
+        }
+
+        # project specific fields
+        fields = self._planner.get_fields(self._get_report('foo', 'a', label='php-timeout'))
+
+        assert fields['project'] == {'key': Classifier.PROJECT_COMMUNITY_TECHNICAL}
+        assert fields['issuetype'] == {'name': 'Task'}
+        assert fields['priority'] == {'id': '8'}
+
+        # MAIN tickets are skipped
+        assert self._planner.get_fields(self._get_report('foo', 'a', label='Helios')) is None
+
+    def test_format_description(self):
+        assert FilingPlanner.format_period(None) == 'hour'
+        assert FilingPlanner.format_period(6 * 3600) == '6 hours'
+        assert FilingPlanner.format_period(900) == '15 minutes'
+
+        report = self._get_report('foo', 'a', counter=1230)
+        assert FilingPlanner.format_occurrences(report) == '1230'
+
+        report.set_sampling(10, 66)
+        assert FilingPlanner.format_occurrences(report) == '~1230 (+/- 66, estimated from 10% sample)'
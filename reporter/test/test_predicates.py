@@ -0,0 +1,169 @@
+"""
+Set of unit tests for predicates and Frame class
+"""
+import re
+import unittest
+
+from ..frame import Frame
+from ..helpers import is_from_production_host, FROM_PRODUCTION_HOST, FROM_PRODUCTION_HOST_NAME
+from ..predicates import get_field, Contains, Exists, In, Matches, StartsWith
+from .. import predicates
+
+
+class PredicatesTestClass(unittest.TestCase):
+    """
+    Unit tests for predicates
+    """
+    ENTRIES = [
+        {'@message': 'PHP Warning: foo on line 42', '@fields': {'environment': 'prod'}, '@source_host': 'ap-s10'},
+        {'@message': 'PHP Warning: foo on line 42', '@fields': {'environment': 'sandbox'}, '@source_host': 'ap-r10'},
+        {'@message': 'Allowed memory size of 42 bytes on line 1', '@fields': {'environment': 'prod'}},
+        {'@message': 'PHP Notice: bar', 'kubernetes': {'namespace_name': 'prod'}, '@source_host': 'dev-foo'},
+        {'@message': ['unhashable'], '@fields': []},
+        {},
+    ]
+
+    def test_get_field(self):
+        assert get_field(self.ENTRIES[0], '@message') == 'PHP Warning: foo on line 42'
+        assert get_field(self.ENTRIES[0], '@fields.environment') == 'prod'
+        assert get_field(self.ENTRIES[0], '@fields.foo') is None
+        assert get_field(self.ENTRIES[4], '@fields.environment') is None
+        assert get_field({}, '@fields.environment') is None
+
+    def test_predicates(self):
+        assert Exists('@source_host').matches(self.ENTRIES[0]) is True
+        assert Exists('@source_host').matches(self.ENTRIES[2]) is False
+
+        assert In('@fields.environment', ['prod']).matches(self.ENTRIES[0]) is True
+        assert In('@fields.environment', ['prod']).matches(self.ENTRIES[1]) is False
+
+        assert Contains('@message', 'Allowed memory').matches(self.ENTRIES[2]) is True
+        assert Contains('@message', 'Allowed memory').matches(self.ENTRIES[5]) is False
+
+        assert Matches('@message', r'on line \d+').matches(self.ENTRIES[1]) is True
+        assert Matches('@message', r'^php', re.IGNORECASE).matches(self.ENTRIES[3]) is True
+        assert Matches('@message', r'on line \d+').matches(self.ENTRIES[3]) is False
+
+        assert predicates.Test('@source_host', lambda host: host == 'ap-s10').matches(self.ENTRIES[0]) is True
+
+        predicate = In('@fields.environment', ['prod']) & ~Contains('@message', 'Allowed memory')
+        assert [predicate.matches(entry) for entry in self.ENTRIES] == [True, False, False, False, False, False]
+
+        predicate = Exists('kubernetes') | Matches('@source_host', r'-r\d+$')
+        assert [predicate.matches(entry) for entry in self.ENTRIES] == [False, True, False, True, False, False]
+
+    def test_from_production_host(self):
+        assert [FROM_PRODUCTION_HOST.matches(entry) for entry in self.ENTRIES[:4]] == \
+            [is_from_production_host(entry) for entry in self.ENTRIES[:4]]
+
+        for host in ['ap-s10', 'task-r1', 'staging-ap-s1', 'dev-foo', '']:
+            assert FROM_PRODUCTION_HOST_NAME.matches({'@source_host': host}) is is_from_production_host(host)
+
+        assert FROM_PRODUCTION_HOST_NAME.matches({}) is False
+
+    def test_to_elasticsearch(self):
+        assert Exists('appname').to_elasticsearch() == {'exists': {'field': 'appname'}}
+        assert In('@context.errno', [1205, 1213]).to_elasticsearch() == {'terms': {'@context.errno': [1205, 1213]}}
+        assert In('rawLevel', ['WARN']).to_elasticsearch() == \
+            {'bool': {'should': [{'match_phrase': {'rawLevel': 'WARN'}}], 'minimum_should_match': 1}}
+        assert In('rawLevel', ['WARN', None]).to_elasticsearch() is None
+
+        assert Matches('@message', r'on line \d+').to_elasticsearch() is None
+        assert Matches('@message', r'on line \d+', phrase='on line').to_elasticsearch() == \
+            {'match_phrase': {'@message': 'on line'}}
+        assert Contains('@message', 'memory').to_elasticsearch() is None
+        assert StartsWith('@message', 'BEGIN ', phrase=True).to_elasticsearch() == {'match_phrase': {'@message': 'BEGIN'}}
+        assert predicates.Test('@source_host', bool).to_elasticsearch() is None
+
+        # clauses that can not be compiled are skipped in AND, but not in OR
+        assert (Exists('foo') & predicates.Test('bar', bool)).to_elasticsearch() == {'exists': {'field': 'foo'}}
+        assert (Exists('foo') | predicates.Test('bar', bool)).to_elasticsearch() is None
+        assert (Exists('foo') & Exists('bar')).to_elasticsearch() == \
+            {'bool': {'filter': [{'exists': {'field': 'foo'}}, {'exists': {'field': 'bar'}}]}}
+
+        # only exact clauses can be negated
+        assert (~In('@context.errno', [1213])).to_elasticsearch() == \
+            {'bool': {'must_not': [{'terms': {'@context.errno': [1213]}}]}}
+        assert (~In('@fields.environment', ['prod'])).to_elasticsearch() is None
+        assert (~Matches('@message', 'foo', phrase='foo')).to_elasticsearch() is None
+        assert (~Contains('@message', 'Allowed memory size of', phrase=True)).to_elasticsearch() is None
+        assert (~StartsWith('@message', 'COMMIT ', phrase=True)).to_elasticsearch() is None
+
+        assert FROM_PRODUCTION_HOST.to_elasticsearch() is not None
+        assert FROM_PRODUCTION_HOST_NAME.to_elasticsearch() is None
+
+    def test_phrases_are_not_negated(self):
+        """ Phrases match analyzed text anywhere, entries the predicate matches can not be dropped """
+        predicate = Exists('@message') & \
+            ~StartsWith('@message', 'BEGIN ', phrase=True) & \
+            ~StartsWith('@message', 'COMMIT ', phrase=True) & \
+            ~Contains('@message', 'Allowed memory size of', phrase=True)
+
+        # phrases are in the middle of these messages
+        assert predicate.matches({'@message': "SELECT * FROM jobs WHERE status='commit'"})
+        assert predicate.matches({'@message': '/* begin */ UPDATE page SET page_touched = 1'})
+        assert predicate.matches({'@message': 'PHP Fatal Error: allowed memory size of the cache exceeded on line 1'})
+
+        assert predicate.to_elasticsearch() == {'exists': {'field': '@message'}}
+
+        # positive phrases are pre-filters
+        assert StartsWith('@message', 'COMMIT ', phrase=True).to_elasticsearch() == \
+            {'match_phrase': {'@message': 'COMMIT'}}
+
+    def test_evaluate(self):
+        """ Predicates evaluated on the frame should match per-entry results """
+        frame = Frame(self.ENTRIES)
+
+        tested = [
+            FROM_PRODUCTION_HOST & Matches('@message', r'on line \d+') & ~Contains('@message', 'Allowed memory size of'),
+            FROM_PRODUCTION_HOST_NAME | Exists('kubernetes.namespace_name'),
+            In('@message', [['unhashable']]),
+        ]
+
+        for predicate in tested:
+            assert predicate.evaluate(frame) == [predicate.matches(entry) for entry in self.ENTRIES]
+
+
+class FrameTestClass(unittest.TestCase):
+    """
+    Unit tests for Frame class
+    """
+    def setUp(self):
+        self._frame = Frame([
+            {'@message': 'Foo 1', '@source_host': 'ap-s1'},
+            {'@message': 'Foo 2', '@source_host': 'ap-s1'},
+            {'@message': 'Foo 1', '@source_host': 'ap-s2'},
+            {'@source_host': 'ap-s2'},
+        ])
+
+    def test_get_column(self):
+        assert len(self._frame) == 4
+        assert self._frame.get_column('@message') == ['Foo 1', 'Foo 2', 'Foo 1', None]
+
+    def test_map_distinct(self):
+        calls = []
+
+        def _func(value):
+            calls.append(value)
+            return value
+
+        assert self._frame.map_distinct('@source_host', _func) == ['ap-s1', 'ap-s1', 'ap-s2', 'ap-s2']
+        assert calls == ['ap-s1', 'ap-s2']
+
+        del calls[:]
+
+        assert self._frame.map_distinct_rows(['@message', '@source_host'], lambda entry: _func(entry.get('@message'))) == \
+            ['Foo 1', 'Foo 2', 'Foo 1', None]
+        assert len(calls) == 4
+
+    def test_replace(self):
+        rules = [(re.compile(r'\d+'), 'N'), (re.compile(r'^Foo'), 'Bar')]
+        assert self._frame.replace('@message', rules) == ['Bar N', 'Bar N', 'Bar N', None]
+
+    def test_select(self):
+        self._frame.get_column('@source_host')
+        frame = self._frame.select([True, False, False, True])
+
+        assert frame.get_entries() == [{'@message': 'Foo 1', '@source_host': 'ap-s1'}, {'@source_host': 'ap-s2'}]
+        assert frame.get_column('@source_host') == ['ap-s1', 'ap-s2']
+        assert frame.get_column('@message') == ['Foo 1', None]
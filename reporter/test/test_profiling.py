@@ -0,0 +1,71 @@
+"""
+Set of unit tests for MemoryProfiler class
+"""
+import json
+import os
+import tempfile
+import unittest
+
+from .. import profiling
+from ..concurrency import IOExecutor
+from ..profiling import MemoryProfiler, setup_memory_profiler
+from .test_source import DummySource
+
+
+class MemoryProfilerTestClass(unittest.TestCase):
+    """
+    Unit tests for MemoryProfiler class
+    """
+    def setUp(self):
+        self._profiler = MemoryProfiler()
+
+    def test_profile(self):
+        with self._profiler.profile('FooSource', query='bar'):
+            data = ['x' * 1024 for _ in range(1024)]
+
+        assert len(data) == 1024
+
+        entries = self._profiler.get_entries()
+        assert len(entries) == 1
+
+        entry = entries[0]
+        assert entry['source'] == 'FooSource'
+        assert entry['query'] == 'bar'
+        assert entry['rss_peak'] > 0
+
+        for key in ['rss_before', 'rss_after', 'retained', 'threads', 'traced_peak', 'top_allocators']:
+            assert key in entry
+
+    def test_query_async(self):
+        """ Entries fetched using I/O executor are profiled together with the rest of the stages """
+        profiler = setup_memory_profiler(summary_path='memory.json')
+
+        try:
+            with IOExecutor(max_workers=2) as executor:
+                results = [DummySource().query_async(executor, query='foo', threshold=2) for _ in range(2)]
+
+                # fetched when the result is requested, i.e. queries do not overlap
+                assert profiler.get_entries() == []
+                assert [len(result.get()) for result in results] == [1, 1]
+
+            assert [entry['source'] for entry in profiler.get_entries()] == ['DummySource', 'DummySource']
+        finally:
+            profiling._profiler = None  # pylint:disable=protected-access
+
+    def test_write_summary(self):
+        with self._profiler.profile('FooSource'):
+            pass
+
+        (handle, path) = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+
+        try:
+            self._profiler.write_summary(path)
+
+            with open(path) as fp:
+                summary = json.load(fp)
+
+            assert summary['process_peak_rss'] > 0
+            assert summary['sources'][0]['source'] == 'FooSource'
+        finally:
+            os.unlink(path)
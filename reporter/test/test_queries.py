@@ -0,0 +1,87 @@
+"""
+Set of unit tests for query strings rewriting
+"""
+import unittest
+
+from ..sources.chat.chat import ChatLogsSource
+from ..sources.php.errors import PHPErrorsSource
+from ..sources.queries import split_query_string, rewrite_query_string
+
+
+class QueriesTestClass(unittest.TestCase):
+    """
+    Unit tests for query strings rewriting
+    """
+    def test_split_query_string(self):
+        assert split_query_string('foo: "bar AND test" AND bar: *') == ['foo: "bar AND test"', 'bar: *']
+        assert split_query_string('@context.num_rows: [2000 TO *]') == ['@context.num_rows: [2000 TO *]']
+        assert split_query_string('foo: bar OR bar: foo') is None
+        assert split_query_string('foo: bar test AND bar: *') is None
+        assert split_query_string('(foo: bar) AND bar: *') is None
+        assert split_query_string('foo: "bar') is None
+
+    def test_rewrite_query_string(self):
+        assert rewrite_query_string('@message:* AND severity: "error" AND @source_host: /[sr].*/') == {
+            'bool': {
+                'filter': [
+                    {'exists': {'field': '@message'}},
+                    {'match_phrase': {'severity': 'error'}},
+                    {'bool': {
+                        'should': [{'prefix': {'@source_host': 's'}}, {'prefix': {'@source_host': 'r'}}],
+                        'minimum_should_match': 1
+                    }},
+                ]
+            }
+        }
+
+        assert rewrite_query_string('@source_host:chat-s* AND -rawLevel:"INFO"') == {
+            'bool': {
+                'filter': [{'prefix': {'@source_host': 'chat-s'}}],
+                'must_not': [{'match_phrase': {'rawLevel': 'INFO'}}],
+            }
+        }
+
+        # prefixes with upper case letters are normalized by query string
+        assert rewrite_query_string('@source_host:Chat-S*') == \
+            {'bool': {'filter': [{'query_string': {'query': '@source_host:Chat-S*'}}]}}
+
+        assert rewrite_query_string('foo OR bar') == {'bool': {'filter': [{'query_string': {'query': 'foo OR bar'}}]}}
+
+    def test_source_queries(self):
+        """ Query strings used by sources should be rewritten into filters """
+        assert rewrite_query_string(PHPErrorsSource._get_query_string('PHP Fatal Error')) == \
+            {'bool': {'filter': [{'match_phrase': {'@message': 'PHP Fatal Error'}}]}}
+
+        # no leading wildcard, the phrase is pushed down
+        assert rewrite_query_string(ChatLogsSource._get_query_string('uncaughtException')) == {
+            'bool': {
+                'filter': [
+                    {'match': {'@fields.app_name': 'chat'}},
+                    {'match': {'severity': 'error'}},
+                    {'prefix': {'@source_host': 'chat-s'}},
+                    {'match_phrase': {'@message': 'uncaughtException'}},
+                ]
+            }
+        }
+
+        assert rewrite_query_string('@context.num_rows: [2000 TO *]') == \
+            {'bool': {'filter': [{'range': {'@context.num_rows': {'gte': '2000'}}}]}}
+
+        assert rewrite_query_string('@context.jira_reporter: 1 AND @context.tags: *') == \
+            {'bool': {'filter': [{'match': {'@context.jira_reporter': '1'}}, {'exists': {'field': '@context.tags'}}]}}
+
+        assert rewrite_query_string('kubernetes.labels.type: "pandora" AND rawMessage: * AND -rawLevel:"INFO"') == {
+            'bool': {
+                'filter': [
+                    {'match_phrase': {'kubernetes.labels.type': 'pandora'}},
+                    {'exists': {'field': 'rawMessage'}},
+                ],
+                'must_not': [{'match_phrase': {'rawLevel': 'INFO'}}],
+            }
+        }
+
+        # clauses without a field and leading wildcards are kept as they are
+        assert rewrite_query_string('"PHP Fatal Error: Maximum execution time"') == \
+            {'bool': {'filter': [{'query_string': {'query': '"PHP Fatal Error: Maximum execution time"'}}]}}
+        assert rewrite_query_string('@message:*foo*') == \
+            {'bool': {'filter': [{'query_string': {'query': '@message:*foo*'}}]}}
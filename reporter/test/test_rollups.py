@@ -0,0 +1,84 @@
+"""
+Set of unit tests for RollupStore class
+"""
+import shutil
+import tempfile
+import unittest
+
+from .. import rollups
+from ..rollups import RollupStore, get_rollup_store, setup_rollup_store
+from .test_source import DummySource
+
+
+class RollupStoreTestClass(unittest.TestCase):
+    """
+    Unit tests for RollupStore class
+    """
+    NOW = 1542369900  # 2018-11-16 12:05 UTC
+    HOUR = 3600
+
+    def setUp(self):
+        self._path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._path)
+
+    def test_counts(self):
+        store = RollupStore(self._path)
+        store.ROWS_CHUNK = 2
+
+        store.add_counts({'foo': 5, 'bar': 1}, timestamp=self.NOW)
+        store.add_counts({'foo': 2}, timestamp=self.NOW + 60)  # the same hour
+        store.add_counts({'foo': 1, 'test': 3}, timestamp=self.NOW - 13 * self.HOUR)  # the day before
+
+        assert store.get_history('foo', since=self.NOW - 2 * self.HOUR, until=self.NOW) == [0, 0, 7]
+        assert store.get_history('test', since=self.NOW - 14 * self.HOUR, until=self.NOW - 12 * self.HOUR) == \
+            [0, 3, 0]
+
+        assert store.get_total('foo', since=self.NOW - 24 * self.HOUR, until=self.NOW) == 8
+        assert store.get_total('not-there', since=self.NOW - 24 * self.HOUR, until=self.NOW) == 0
+
+        assert store.get_totals(since=self.NOW - 24 * self.HOUR, until=self.NOW) == {'foo': 8, 'bar': 1, 'test': 3}
+        assert store.get_totals(since=self.NOW - self.HOUR, until=self.NOW) == {'foo': 7, 'bar': 1}
+
+        # more keys than rows allocated
+        store.add_counts(dict(('key-{}'.format(i), i) for i in range(10)), timestamp=self.NOW)
+        assert store.get_total('key-9', since=self.NOW, until=self.NOW) == 9
+
+        store.close()
+
+        # counts are persisted
+        store = RollupStore(self._path)
+        assert store.get_totals(since=self.NOW - self.HOUR, until=self.NOW)['foo'] == 7
+        assert store.get_total('key-9', since=self.NOW, until=self.NOW) == 9
+
+    def test_top_movers(self):
+        store = RollupStore(self._path)
+
+        store.add_counts({'foo': 10, 'bar': 10, 'test': 5}, timestamp=self.NOW - 2 * self.HOUR)
+        store.add_counts({'foo': 50, 'bar': 5, 'new': 20}, timestamp=self.NOW)
+
+        assert store.get_top_movers(period=2 * self.HOUR, now=self.NOW) == [('foo', 40), ('new', 20)]
+        assert store.get_top_movers(period=2 * self.HOUR, now=self.NOW, limit=1) == [('foo', 40)]
+
+    def test_source(self):
+        store = setup_rollup_store(self._path)
+        assert get_rollup_store() is store
+
+        try:
+            source = DummySource()
+            reports = source.query(query='foo', threshold=2)
+
+            unique_id = reports[0].get_unique_id()
+            recorded = source._rollups_recorded['foo']
+
+            assert store.get_total(unique_id, since=recorded - self.HOUR, until=recorded) == 2
+            assert reports[0].get_description().endswith('*Occurrences in the last 24 hours*: 2')
+
+            # overlapping windows are not counted twice
+            source.get_period = lambda: 900
+            source._record_rollups('foo', {'foo-bar': {'cnt': 3}}, now=recorded + 300)
+
+            assert store.get_total(unique_id, since=recorded - self.HOUR, until=recorded + self.HOUR) == 3
+        finally:
+            rollups._store = None
@@ -0,0 +1,267 @@
+"""
+Set of unit tests for Runner and Daemon classes
+"""
+import threading
+import unittest
+
+from ..checks import Check
+from ..concurrency import IOExecutor
+from ..daemon import Daemon
+from ..planner import Filing
+from ..runner import Runner
+from ..scheduler import Scheduler
+from ..reports import Report
+from ..sources import Source
+
+
+class CountingSource(Source):
+    """ Returns a single report for every query """
+    instances = 0
+
+    def __init__(self, prefix='foo'):
+        super(CountingSource, self).__init__()
+        self._prefix = prefix
+        CountingSource.instances += 1
+
+    def query(self, query='', threshold=50):
+        return [Report(summary='{}-{}'.format(self._prefix, query), description='')]
+
+    def query_async(self, executor, query='', threshold=50):
+        return executor.chain(executor.submit(self.query, query, threshold), lambda reports: reports)
+
+
+class MultiSearchSource(Source):
+    """ Entries are fetched via _msearch, they're not there for queries starting with "scroll" """
+    MSEARCH = True
+
+    class Elasticsearch(object):
+        def __init__(self):
+            self.requests = 0
+
+        def msearch(self, body):
+            self.requests += 1
+            return {'responses': [
+                {'hits': {'total': 100 if search['query'].startswith('scroll') else 1, 'hits': [{'_source': search}]}}
+                for search in body[1::2]]}
+
+    es = Elasticsearch()
+
+    def __init__(self, name=''):
+        super(MultiSearchSource, self).__init__()
+        self._name = name
+
+    def get_multi_search_request(self, query=''):
+        return self.es, 'logstash-foo', {'query': query, 'size': 10}
+
+    def query(self, query='', threshold=50):
+        return [Report(summary='scrolled-{}'.format(query), description='')]
+
+    def query_async(self, executor, query='', threshold=50):
+        return executor.chain(executor.submit(self.query, query, threshold), lambda reports: reports)
+
+    def _process_entries(self, query, rows, threshold):
+        return [Report(summary='msearch-{}'.format(rows[0]['query']), description='')]
+
+
+class FakeReporter(object):
+    """ Collects reports """
+    RESULT_CREATED = 'created'
+    RESULT_DUPLICATE = 'duplicate'
+    RESULT_SKIPPED = 'skipped'
+    RESULT_FAILED = 'failed'
+
+    def __init__(self):
+        self.reports = []
+
+    @staticmethod
+    def plan(reports, filed=None):
+        return [Filing(report, fields={}) for report in reports]
+
+    def file(self, filing):
+        self.reports.append(filing.report)
+        return self.RESULT_CREATED
+
+    def flush(self):
+        pass
+
+
+class RunnerTestClass(unittest.TestCase):
+    """
+    Unit tests for Runner class
+    """
+    def setUp(self):
+        CountingSource.instances = 0
+        self._reporter = FakeReporter()
+
+        self._checks = [
+            Check(CountingSource, 'a', threshold=1),
+            Check(CountingSource, 'b', threshold=1),
+            Check(CountingSource, 'c', threshold=1, prefix='bar'),
+        ]
+
+        self._runner = Runner(reporter_factory=lambda: self._reporter, scheduler=Scheduler(self._checks))
+        self._runner.REPORT_DELAY = 0
+
+    def test_run(self):
+        assert self._runner.run() == 3
+
+        # checks are not due yet
+        assert self._runner.run() == 0
+
+        assert self._runner.detect(self._checks[:1])[0].get_summary() == 'foo-a'
+
+        assert [report.get_summary() for report in self._reporter.reports] == ['foo-a', 'foo-b', 'bar-c']
+
+        # sources are shared between checks with the same options and between runs
+        assert CountingSource.instances == 2
+
+    def test_run_concurrently(self):
+        with IOExecutor(max_workers=2) as executor:
+            runner = Runner(reporter_factory=lambda: self._reporter, scheduler=Scheduler(self._checks),
+                            executor=executor)
+            runner.REPORT_DELAY = 0
+
+            assert runner.run() == 3
+
+            # reports are returned in the order of checks
+            assert [report.get_summary() for report in runner.detect(self._checks)] == ['foo-a', 'foo-b', 'bar-c']
+
+        # and filed as soon as checks complete ("foo-b" waits for the source shared with "foo-a")
+        assert sorted([report.get_summary() for report in self._reporter.reports]) == ['bar-c', 'foo-a', 'foo-b']
+        assert CountingSource.instances == 2
+
+    def test_pipeline(self):
+        events = []
+
+        class LoggingSource(CountingSource):
+            def query(self, query='', threshold=50):
+                events.append('query-' + query)
+                return super(LoggingSource, self).query(query, threshold)
+
+        class LoggingReporter(FakeReporter):
+            def file(self, filing):
+                events.append('file-' + filing.report.get_summary())
+                return super(LoggingReporter, self).file(filing)
+
+        checks = [Check(LoggingSource, str(index), threshold=1) for index in range(5)]
+
+        runner = Runner(reporter_factory=LoggingReporter, scheduler=Scheduler(checks))
+        runner.REPORT_DELAY = 0.01
+        runner.PIPELINE_SIZE = 1
+
+        assert runner.run() == 5
+        assert [report.get_summary() for report in runner.get_reporter().reports] == \
+            ['foo-0', 'foo-1', 'foo-2', 'foo-3', 'foo-4']
+
+        # filing starts before all checks are run
+        assert events.index('file-foo-0') < events.index('query-3')
+
+        # and checks wait for it, as the queue holds reports of a single check only
+        assert events.index('file-foo-1') < events.index('query-4')
+
+        # the stop is handled by both stages
+        stop_event = threading.Event()
+        stop_event.set()
+
+        runner = Runner(reporter_factory=FakeReporter, scheduler=Scheduler(checks), stop_event=stop_event)
+        assert runner.pipeline(checks) == 0
+
+    def test_multi_search(self):
+        MultiSearchSource.es.requests = 0
+
+        checks = [
+            Check(CountingSource, 'a', threshold=1),
+            Check(MultiSearchSource, 'b', threshold=1),
+            Check(MultiSearchSource, 'c', threshold=1),  # shares the source with the previous check
+            Check(MultiSearchSource, 'scroll', threshold=1, name='other'),  # has too many hits
+        ]
+
+        runner = Runner(reporter_factory=lambda: self._reporter, scheduler=Scheduler(checks))
+        assert [report.get_summary() for report in runner.detect(checks)] == \
+            ['foo-a', 'msearch-b', 'scrolled-c', 'scrolled-scroll']
+
+        with IOExecutor(max_workers=2) as executor:
+            runner = Runner(reporter_factory=lambda: self._reporter, scheduler=Scheduler(checks), executor=executor)
+            assert [report.get_summary() for report in runner.detect(checks)] == \
+                ['foo-a', 'msearch-b', 'scrolled-c', 'scrolled-scroll']
+
+        # a single _msearch request per run
+        assert MultiSearchSource.es.requests == 2
+
+    def test_catching_up(self):
+        thresholds = []
+
+        class FailingSource(CountingSource):
+            """ Records thresholds, the query of the "fail" check fails """
+            def _get_entries(self, query):
+                if query == 'fail':
+                    raise IOError('Elasticsearch is not available')
+                return []
+
+            def query(self, query='', threshold=50):
+                thresholds.append(threshold)
+                self._fetch_entries(query)
+                return []
+
+        checks = [Check(FailingSource, 'ok', threshold=10), Check(FailingSource, 'fail', threshold=10)]
+        scheduler = Scheduler(checks)
+
+        runner = Runner(reporter_factory=lambda: self._reporter, scheduler=scheduler)
+        runner.detect(checks)
+
+        # failed checks are not marked as run
+        assert scheduler.get_last_run(checks[0]) is not None
+        assert scheduler.get_last_run(checks[1]) is None
+
+        # thresholds are scaled to the window covering the time since the last run
+        scheduler.mark_run(checks[0], now=scheduler.get_last_run(checks[0]) - 3 * 3600)
+        runner.detect(checks[:1])
+
+        assert thresholds[0] == 10
+        assert thresholds[-1] >= 30  # three hours
+
+    def test_stop(self):
+        stop_event = threading.Event()
+        stop_event.set()
+
+        runner = Runner(reporter_factory=FakeReporter, scheduler=Scheduler([Check(CountingSource)]),
+                        stop_event=stop_event)
+
+        assert runner.detect() == []
+        assert runner.file([Report(summary='foo', description='')]) == 0
+
+
+class DaemonTestClass(unittest.TestCase):
+    """
+    Unit tests for Daemon class
+    """
+    def test_run(self):
+        reporter = FakeReporter()
+
+        def runner_factory(stop_event):
+            runner = Runner(reporter_factory=lambda: reporter, scheduler=Scheduler([Check(CountingSource, 'a')]),
+                            stop_event=stop_event)
+            runner.REPORT_DELAY = 0
+
+            # stop the daemon once the first cycle is completed
+            run = runner.run
+
+            def run_and_stop():
+                reported = run()
+                stop_event.set()
+                return reported
+
+            runner.run = run_and_stop
+            return runner
+
+        daemon = Daemon(runner_factory=runner_factory, interval=3600)
+        assert daemon.get_status()['healthy'] is True
+
+        daemon.run(install_signal_handlers=False)
+
+        status = daemon.get_status()
+
+        assert daemon.is_stopped() is True
+        assert status['cycles'] == 1
+        assert status['healthy'] is True
+        assert len(reporter.reports) == 1
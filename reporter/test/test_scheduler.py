@@ -0,0 +1,96 @@
+"""
+Set of unit tests for Scheduler class
+"""
+import json
+import os
+import tempfile
+import unittest
+
+from ..checks import CHECKS, Check
+from ..scheduler import Scheduler
+from ..sources import Source
+
+
+class SchedulerTestClass(unittest.TestCase):
+    """
+    Unit tests for Scheduler class
+    """
+    # 2018-11-16 12:05:00 UTC
+    NOW = 1542369900
+
+    def setUp(self):
+        self._fatals = Check(Source, 'fatals', interval=300, window=900)
+        self._hourly = Check(Source, 'hourly')
+        self._daily = Check(Source, 'daily', interval=Check.DAY)
+
+        self._checks = [self._fatals, self._hourly, self._daily]
+
+    def test_check(self):
+        assert self._hourly.window == 3600
+        assert self._fatals.window == 900
+        assert self._fatals.get_name() == 'Source(fatals)'
+
+    def test_daemon(self):
+        scheduler = Scheduler(self._checks)
+
+        # no state - run all checks
+        assert scheduler.get_due_checks(now=self.NOW) == self._checks
+        assert scheduler.get_window(self._fatals, now=self.NOW) == 900
+
+        for check in self._checks:
+            scheduler.mark_run(check, now=self.NOW)
+
+        assert scheduler.get_due_checks(now=self.NOW + 60) == []
+        assert scheduler.get_due_checks(now=self.NOW + 300) == [self._fatals]
+        assert scheduler.get_due_checks(now=self.NOW + 3600) == [self._fatals, self._hourly]
+        assert scheduler.get_due_checks(now=self.NOW + 86400) == self._checks
+
+        # windows cover the time since the last run
+        assert scheduler.get_window(self._fatals, now=self.NOW + 300) == 900
+        assert scheduler.get_window(self._fatals, now=self.NOW + 1200) == 1200
+        assert scheduler.get_window(self._hourly, now=self.NOW + 3600) == 3600
+        assert scheduler.get_window(self._hourly, now=self.NOW + 7 * 86400) == Scheduler.MAX_WINDOW
+
+        # thresholds are scaled to windows extended after a gap
+        assert scheduler.get_threshold(self._hourly, window=3600) == 50
+        assert scheduler.get_threshold(self._hourly, window=Scheduler.MAX_WINDOW) == 1200
+        assert scheduler.get_threshold(self._fatals, window=1200) == 50
+        assert scheduler.get_threshold(self._fatals, window=7200) == 100
+
+    def test_cronjob(self):
+        scheduler = Scheduler(self._checks, slot_length=3600)
+
+        # daily check is run once a day, in the first hour of the day (UTC)
+        assert scheduler.get_due_checks(now=self.NOW) == [self._fatals, self._hourly]
+        assert scheduler.get_due_checks(now=self.NOW - 12 * 3600) == self._checks
+
+        # windows cover the entire slot
+        assert scheduler.get_window(self._fatals, now=self.NOW) == 3600
+        assert scheduler.get_window(self._daily, now=self.NOW) == 86400
+
+        # thresholds are kept, fatals are still reported when there are five of them per hour
+        fatals = [check for check in CHECKS if check.get_name() == 'PHPErrorsSource(PHP Fatal Error)'][0]
+        scheduler = Scheduler(CHECKS, slot_length=3600)
+
+        assert scheduler.get_window(fatals, now=self.NOW) == 3600
+        assert scheduler.get_threshold(fatals, window=3600) == 5
+        assert scheduler.get_threshold(self._daily, window=86400) == 50
+
+    def test_state(self):
+        (handle, path) = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        os.unlink(path)
+
+        try:
+            scheduler = Scheduler(self._checks, state_path=path)
+            scheduler.mark_run(self._daily, now=self.NOW)
+
+            with open(path) as fp:
+                assert json.load(fp) == {'Source(daily)': self.NOW}
+
+            # the state is loaded by a new instance
+            scheduler = Scheduler(self._checks, state_path=path)
+            assert scheduler.get_last_run(self._daily) == self.NOW
+            assert scheduler.get_due_checks(now=self.NOW + 3600) == [self._fatals, self._hourly]
+        finally:
+            os.unlink(path)
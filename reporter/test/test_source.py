@@ -2,8 +2,10 @@
 Set of unit tests for Source class
 """
 import json
+import threading
 import unittest
 
+from ..concurrency import IOExecutor
 from ..sources import Source
 from ..reports import Report
 
@@ -107,3 +109,175 @@ class SourceTestClass(unittest.TestCase):
         assert report.get_summary() == '[Error] Foo-Bar - http://example.com'
         assert report.get_description() == '[456, "{query}"]'.format(query=self.QUERY)
         assert report.get_unique_id() == 'e5f9ec048d1dbe19c70f720e002f9cb1'
+
+    def test_source_metrics(self):
+        """ Test that Source class collects per-stage metrics """
+        source = DummySource()
+        metrics = source._metrics
+        metrics.reset()
+
+        source.query(query=self.QUERY, threshold=2)
+
+        labels = dict(source='DummySource', query=self.QUERY)
+
+        assert metrics.get_counter('hits_fetched_total', **labels) == 5
+        assert metrics.get_counter('hits_filtered_out_total', **labels) == 1
+        assert metrics.get_counter('hits_not_normalized_total', **labels) == 1
+        assert metrics.get_counter('groups_total', **labels) == 2
+        assert metrics.get_counter('reports_total', **labels) == 1
+
+        for stage in ['fetch', 'filter', 'normalize', 'report']:
+            assert metrics.get_timing('stage_seconds', stage=stage, **labels)[1] == 1
+
+    def test_query_async(self):
+        """ Test that entries fetched using I/O executor are processed the same way """
+        with IOExecutor(max_workers=2) as executor:
+            results = [DummySource().query_async(executor, query=self.QUERY, threshold=2) for _ in range(3)]
+
+            for result in results:
+                reports = result.get()
+
+                assert len(reports) == 1
+                assert reports[0].get_counter() == 2
+                assert reports[0].get_unique_id() == 'e5f9ec048d1dbe19c70f720e002f9cb1'
+
+                # the continuation is run only once
+                assert result.get() is reports
+
+    def test_count_precheck(self):
+        """ Test that entries are not fetched when fewer of them than the threshold match the query """
+        source = DummySource()
+        source.COUNT_PRECHECK = True
+        source._get_count = lambda query: len(source._get_entries(query))
+
+        metrics = source._metrics
+        metrics.reset()
+
+        labels = dict(source='DummySource', query=self.QUERY)
+
+        # five entries match the query
+        assert source.query(query=self.QUERY, threshold=6) == []
+        assert metrics.get_counter('queries_skipped_total', **labels) == 1
+        assert metrics.get_timing('stage_seconds', stage='fetch', **labels) == (0, 0)
+
+        assert len(source.query(query=self.QUERY, threshold=2)) == 1
+        assert metrics.get_counter('queries_skipped_total', **labels) == 1
+        assert metrics.get_timing('stage_seconds', stage='fetch', **labels)[1] == 1
+
+        with IOExecutor(max_workers=1) as executor:
+            assert source.query_async(executor, query=self.QUERY, threshold=6).get() == []
+            assert metrics.get_counter('queries_skipped_total', **labels) == 2
+
+        # entries are fetched when the count is not known
+        source._get_count = lambda query: None
+        assert source.query(query=self.QUERY, threshold=6) == []
+        assert metrics.get_timing('stage_seconds', stage='fetch', **labels)[1] == 2
+
+    def test_heavy_hitters(self):
+        """ Test that approximate grouping returns the same reports when there are no evictions """
+        source = DummySource()
+        source.HEAVY_HITTERS_CAPACITY = 2
+
+        reports = source.query(query=self.QUERY, threshold=2)
+
+        assert len(reports) == 1
+        assert reports[0].get_counter() == 2
+        assert reports[0].get_unique_id() == 'e5f9ec048d1dbe19c70f720e002f9cb1'
+
+    def test_heavy_hitters_error(self):
+        """ Test that keys with approximate counts that could reach the threshold are reported """
+        source = DummySource()
+        entry = source._get_entries(self.QUERY)[2]
+
+        reports = source._generate_reports({
+            # a rare key that replaced an evicted one and inherited its count
+            'rare': {'entry': entry, 'cnt': 600, 'error': 590},
+            # the true count is at the threshold
+            'frequent': {'entry': entry, 'cnt': 600, 'error': 100},
+            'exact': {'entry': entry, 'cnt': 450},
+        }, threshold=500)
+
+        reports = dict((report.get_unique_id(), report) for report in reports)
+
+        assert sorted(reports.keys()) == sorted([source._get_unique_id('rare'), source._get_unique_id('frequent')])
+
+        report = reports[source._get_unique_id('frequent')]
+        assert report.get_counter() == 600
+        assert 'there were between 500 and 600' in report.get_description()
+
+    def test_sampling(self):
+        """ Test that counts are scaled back when the source fetches a sample of entries """
+        source = DummySource()
+        source._sampling = 10
+
+        # 2 sampled entries -> ~20 occurrences (+/- 27), the threshold is compared with the lower bound
+        assert source.query(query=self.QUERY, threshold=3) == []
+
+        reports = source.query(query=self.QUERY, threshold=2)
+
+        assert len(reports) == 1
+        assert reports[0].get_counter() == 20
+        assert reports[0].get_sampling() == 10
+        assert reports[0].get_counter_margin() == 27  # 1.96 * sqrt(2 * 0.9) / 0.1
+
+        assert source._scale_count(1000) == (10000, 588)  # 1.96 * sqrt(1000 * 0.9) / 0.1
+
+        # the estimate is above the threshold, but the margin of error is not
+        entry = source._get_entries(self.QUERY)[2]
+        assert source._generate_reports({'foo': {'entry': entry, 'cnt': 1000}}, threshold=9500) == []
+        assert len(source._generate_reports({'foo': {'entry': entry, 'cnt': 1000}}, threshold=9400)) == 1
+
+        source._sampling = None
+        assert source._scale_count(1000) == (1000, 0)
+
+    def test_parallel_normalization(self):
+        """ Test that entries normalized using a pool of processes are grouped the same way """
+        source = DummySource()
+        source.NORMALIZE_PROCESSES = 2
+        source.NORMALIZE_CHUNK_SIZE = 1
+
+        entries = source._get_entries(self.QUERY)
+        assert source._use_parallel_normalization(entries) is (threading.active_count() == 1)
+
+        # processes are not forked when other threads are running
+        event = threading.Event()
+        thread = threading.Thread(target=event.wait)
+        thread.start()
+
+        try:
+            assert source._use_parallel_normalization(entries) is False
+        finally:
+            event.set()
+            thread.join()
+
+        (entries_count, normalized) = source._normalize_entries_parallel(entries)
+        assert entries_count == 4
+        assert normalized == source._normalize_entries(
+            [entry for entry in source._get_entries(self.QUERY) if source._filter(entry)])
+
+        reports = source.query(query=self.QUERY, threshold=2)
+
+        assert len(reports) == 1
+        assert reports[0].get_counter() == 2
+        assert reports[0].get_summary() == '[Error] Foo-Bar - http://example.com'
+        assert reports[0].get_unique_id() == 'e5f9ec048d1dbe19c70f720e002f9cb1'
+
+    def test_merge_normalized_entries(self):
+        """ The first entry with all required fields should be used when merging partial tables """
+        merged = Source._merge_normalized_entries([
+            {
+                'foo': {'cnt': 2, 'entry': 1, 'has_all_required_fields': False},
+            },
+            {
+                'foo': {'cnt': 1, 'entry': 2, 'has_all_required_fields': True},
+                'bar': {'cnt': 1, 'entry': 3, 'has_all_required_fields': False},
+            },
+            {
+                'foo': {'cnt': 3, 'entry': 4, 'has_all_required_fields': True},
+            },
+        ])
+
+        assert merged == {
+            'foo': {'cnt': 6, 'entry': 2, 'has_all_required_fields': True},
+            'bar': {'cnt': 1, 'entry': 3, 'has_all_required_fields': False},
+        }
@@ -0,0 +1,246 @@
+"""
+Set of unit tests for ReportSpool class
+"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from Queue import Queue
+
+from ..checks import Check
+from ..reports import Report
+from ..runner import Runner
+from ..scheduler import Scheduler
+from ..spool import ReportSpool
+from .test_runner import CountingSource, FakeReporter
+
+
+class ReportSpoolTestClass(unittest.TestCase):
+    """
+    Unit tests for ReportSpool class
+    """
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'reports.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    @staticmethod
+    def _get_reports(*summaries):
+        return [Report(summary=summary, description='') for summary in summaries]
+
+    @staticmethod
+    def _get_summaries(reports):
+        return [report.get_summary() for report in reports]
+
+    def test_report_serialization(self):
+        report = Report(summary='foo', description='bar', label='PHPErrors')
+        report.add_label('Helios')
+        report.set_counter(1230)
+        report.set_period(900)
+        report.set_sampling(10, 66)
+        report.set_unique_id('e5f9ec048d1dbe19c70f720e002f9cb1')
+        report.set_url('http://example.com')
+
+        restored = Report.from_dict(report.to_dict())
+
+        assert restored.to_dict() == report.to_dict()
+        assert restored.get_labels() == ['PHPErrors', 'Helios']
+        assert restored.get_unique_id() == 'e5f9ec048d1dbe19c70f720e002f9cb1'
+
+    def test_checkpoint(self):
+        spool = ReportSpool(self._path)
+        spool.append(self._get_reports('a', 'b', 'c'))
+
+        batch = spool.read()
+        assert len(batch) == 3
+        assert self._get_summaries(batch.get_reports()) == ['a', 'b', 'c']
+
+        (a, b, c) = batch.get_reports()
+
+        # reports handled out of order, "a" was not handled yet
+        batch.mark_handled(b)
+        assert spool.get_checkpoint() == 0
+
+        batch.mark_handled(a)
+        assert self._get_summaries(spool.read().get_reports()) == ['c']
+
+        # the checkpoint is kept between runs
+        spool = ReportSpool(self._path)
+        spool.append(self._get_reports('d'))
+        assert self._get_summaries(spool.read().get_reports()) == ['c', 'd']
+
+        # not compacted, "c" and "d" were not handled yet
+        spool.compact()
+        assert os.path.getsize(self._path) > 0
+
+        batch = spool.read()
+        for report in batch.get_reports():
+            batch.mark_handled(report)
+
+        spool.compact()
+        assert os.path.getsize(self._path) == 0
+        assert spool.get_checkpoint() == 0
+        assert len(ReportSpool(self._path).read()) == 0
+
+    def test_many_batches(self):
+        spool = ReportSpool(self._path)
+        spool.append(self._get_reports('a', 'b'))
+
+        left = spool.read()
+        appended = spool.append(self._get_reports('c', 'd'))
+
+        # reports of the later batch are handled first, "b" was not handled yet
+        left.mark_handled(left.get_reports()[0])
+
+        for report in appended.get_reports():
+            appended.mark_handled(report)
+
+        assert self._get_summaries(ReportSpool(self._path).read().get_reports()) == ['b', 'c', 'd']
+
+        left.mark_handled(left.get_reports()[1])
+        assert len(ReportSpool(self._path).read()) == 0
+
+    def test_incomplete_line(self):
+        spool = ReportSpool(self._path)
+        spool.append(self._get_reports('a'))
+
+        # the process was killed while appending
+        with open(self._path, 'ab') as fp:
+            fp.write('{"summary": "b", "desc')
+
+        assert self._get_summaries(spool.read().get_reports()) == ['a']
+
+        # the next run removes it and appends reports after the last complete line
+        spool = ReportSpool(self._path)
+        spool.append(self._get_reports('c'))
+
+        assert self._get_summaries(ReportSpool(self._path).read().get_reports()) == ['a', 'c']
+
+        # lines that can not be decoded are skipped and not read again
+        with open(self._path, 'ab') as fp:
+            fp.write('{"summary": "d"}\n')
+
+        spool = ReportSpool(self._path)
+        spool.append(self._get_reports('e'))
+
+        batch = spool.read()
+        assert self._get_summaries(batch.get_reports()) == ['a', 'c', 'e']
+
+        for report in batch.get_reports():
+            batch.mark_handled(report)
+
+        spool.compact()
+        assert os.path.getsize(self._path) == 0
+
+    def test_runner(self):
+        reporter = FakeReporter()
+        checks = [Check(CountingSource, 'a', threshold=1), Check(CountingSource, 'b', threshold=1)]
+
+        stop_event = threading.Event()
+        stop_event.set()
+
+        # filing was stopped, reports are kept in the spool
+        spool = ReportSpool(self._path)
+        spool.append(self._get_reports('foo-a', 'foo-b'))
+
+        runner = Runner(reporter_factory=lambda: reporter, scheduler=Scheduler(checks), stop_event=stop_event,
+                        spool=spool)
+        runner.REPORT_DELAY = 0
+
+        assert runner.file_spool() == 0
+        assert spool.get_checkpoint() == 0
+
+        # the next run files them together with the newly detected reports
+        runner = Runner(reporter_factory=lambda: reporter, scheduler=Scheduler(checks[:1]),
+                        spool=ReportSpool(self._path))
+        runner.REPORT_DELAY = 0
+
+        assert runner.run() == 3
+        assert self._get_summaries(reporter.reports) == ['foo-a', 'foo-b', 'foo-a']
+
+        # the same without the pipeline
+        reporter.reports = []
+        spool.append(self._get_reports('foo-c'))
+
+        runner = Runner(reporter_factory=lambda: reporter, scheduler=Scheduler(checks[1:]),
+                        spool=ReportSpool(self._path))
+        runner.REPORT_DELAY = 0
+        runner.PIPELINE = False
+
+        assert runner.run() == 2
+        assert self._get_summaries(reporter.reports) == ['foo-c', 'foo-b']
+
+        assert os.path.getsize(self._path) == 0
+
+    def test_stop_while_filing(self):
+        stop_event = threading.Event()
+
+        class StoppedReporter(FakeReporter):
+            """ Stop is requested while the first report is filed, the rest of them are dropped by planning """
+            @staticmethod
+            def plan(reports, filed=None):
+                return FakeReporter.plan(reports)[:1]
+
+            def file(self, filing):
+                stop_event.set()
+                return super(StoppedReporter, self).file(filing)
+
+        spool = ReportSpool(self._path)
+        spool.append(self._get_reports('a', 'b'))
+
+        runner = Runner(reporter_factory=StoppedReporter, stop_event=stop_event, spool=spool)
+        runner.REPORT_DELAY = 0
+
+        queue = Queue()
+
+        for batch in [spool.read(), spool.append(self._get_reports('c', 'd')), spool.append(self._get_reports('e'))]:
+            queue.put((batch.get_reports(), batch.mark_handled))
+
+        queue.put(None)
+
+        assert runner._file_queued(queue) == 1  # pylint:disable=protected-access
+
+        # "b" was dropped and "c" was not filed, the checkpoint is not moved past it
+        assert self._get_summaries(runner.get_reporter().reports) == ['a']
+        assert self._get_summaries(ReportSpool(self._path).read().get_reports()) == ['c', 'd', 'e']
+
+    def test_failed_filing(self):
+        class UnavailableReporter(FakeReporter):
+            """ Jira lookups fail, just like Jira.file reports are not filed then """
+            @staticmethod
+            def ticket_exists(unique_id):
+                raise IOError('Jira is not available')
+
+            def file(self, filing):
+                try:
+                    self.ticket_exists(filing.get_unique_id())
+                except IOError:
+                    return self.RESULT_FAILED
+
+                return super(UnavailableReporter, self).file(filing)
+
+        spool = ReportSpool(self._path)
+        spool.append(self._get_reports('a', 'b'))
+
+        runner = Runner(reporter_factory=UnavailableReporter, spool=spool)
+        runner.REPORT_DELAY = 0
+
+        filed = set()
+        batch = spool.read()
+
+        assert runner.file(batch.get_reports(), on_handled=batch.mark_handled, filed=filed) == 0
+        spool.compact()
+
+        # reports are kept in the spool and can be filed again in this run
+        assert filed == set()
+        assert self._get_summaries(ReportSpool(self._path).read().get_reports()) == ['a', 'b']
+
+        runner = Runner(reporter_factory=FakeReporter, spool=ReportSpool(self._path))
+        runner.REPORT_DELAY = 0
+
+        assert runner.file_spool() == 2
+        assert os.path.getsize(self._path) == 0
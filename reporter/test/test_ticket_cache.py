@@ -0,0 +1,83 @@
+"""
+Set of unit tests for TicketCache class
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..ticket_cache import TicketCache
+
+
+class TicketCacheTestClass(unittest.TestCase):
+    """
+    Unit tests for TicketCache class
+    """
+    NOW = 1542369900  # 2018-11-16 12:05 UTC
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'tickets.json')
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_ttl(self):
+        cache = TicketCache(ttl=3600)
+
+        assert cache.get('foo', now=self.NOW) is None
+
+        cache.set('foo', 'ERROR-123', 'Open', now=self.NOW)
+
+        assert cache.get('foo', now=self.NOW + 60)['key'] == 'ERROR-123'
+        assert cache.get('foo', now=self.NOW + 3600) is None
+
+        cache.invalidate('foo')
+        assert cache.get('foo', now=self.NOW + 60) is None
+
+    def test_day_changed(self):
+        cache = TicketCache(ttl=86400)
+        cache.set('foo', 'ERROR-123', 'Open', now=self.NOW)
+
+        # "ER Date" needs to be updated every day
+        assert cache.get('foo', now=self.NOW + 60) is not None
+        assert cache.get('foo', now=self.NOW + 86400 - 60) is None
+
+    def test_closed_tickets(self):
+        cache = TicketCache()
+
+        # can be reopened
+        cache.set('foo', 'ERROR-123', 'Closed', 'Fixed', now=self.NOW)
+        assert cache.get('foo', now=self.NOW) is None
+
+        # will not be reopened
+        cache.set('foo', 'ERROR-123', 'Closed', "Won't Fix", now=self.NOW)
+        assert cache.get('foo', now=self.NOW)['resolution'] == "Won't Fix"
+
+        cache.set('bar', 'ERROR-456', 'Closed', 'Duplicate', now=self.NOW)
+        assert cache.get('bar', now=self.NOW)['status'] == 'Closed'
+
+    def test_persistence(self):
+        cache = TicketCache(path=self._path)
+        cache.set('foo', 'ERROR-123', 'In Progress', now=self.NOW)
+
+        # written once per batch
+        assert not os.path.exists(self._path)
+        cache.save(now=self.NOW)
+
+        assert TicketCache(path=self._path).get('foo', now=self.NOW + 60) == {
+            'key': 'ERROR-123',
+            'status': 'In Progress',
+            'resolution': None,
+            'checked': self.NOW,
+        }
+
+    def test_prune(self):
+        cache = TicketCache(path=self._path, ttl=3600)
+        cache.set('foo', 'ERROR-123', 'Open', now=self.NOW)
+        cache.set('bar', 'ERROR-456', 'Open', now=self.NOW + 1800)
+        cache.save(now=self.NOW + 1800)
+
+        # expired entries are not kept in the file
+        cache.save(now=self.NOW + 3600)
+        assert TicketCache(path=self._path)._entries.keys() == ['bar']  # pylint:disable=protected-access
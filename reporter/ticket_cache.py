@@ -0,0 +1,143 @@
+"""
+Remembers tickets that were recently confirmed to exist in Jira
+
+The same recurring issues are reported every hour, the cache allows us to skip Jira lookups for them.
+"""
+import json
+import logging
+import os
+
+from datetime import datetime
+from time import time
+
+
+class TicketCache(object):
+    """
+    unique_id -> issue key, status, resolution and the last check time
+
+    An entry needs to be refreshed (i.e. Jira needs to be queried again) when:
+
+    - it was checked more than ttl seconds ago,
+    - it was checked before today (so that "ER Date" of the ticket is updated daily),
+    - the ticket is closed and can be reopened (see Jira.ticket_exists).
+
+    The cache can be persisted in a JSON file so that it survives process restarts. Changes are written by save()
+    (once per batch of filed reports), entries that need to be refreshed anyway are pruned then.
+    """
+    TTL = 6 * 3600
+
+    STATUS_CLOSED = "Closed"
+
+    # closed tickets with these resolutions are never reopened
+    FINAL_RESOLUTIONS = ("Won't Fix", "Duplicate")
+
+    def __init__(self, path=None, ttl=None):
+        """
+        :type path str
+        :type ttl int
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+        self._path = path
+        self._ttl = ttl or self.TTL
+
+        self._entries = self._load()
+        self._changed = False
+
+    def _load(self):
+        """
+        :rtype: dict
+        """
+        if self._path and os.path.exists(self._path):
+            try:
+                with open(self._path) as fp:
+                    return json.load(fp)
+            except ValueError:
+                self._logger.error('Failed to load the cache from {}'.format(self._path), exc_info=True)
+
+        return dict()
+
+    def save(self, now=None):
+        """
+        Prune entries that need to be refreshed and write the cache when it was changed
+
+        :type now int
+        """
+        expired = [unique_id for (unique_id, entry) in self._entries.items() if self.needs_refresh(entry, now)]
+
+        for unique_id in expired:
+            del self._entries[unique_id]
+
+        if not self._path or not (self._changed or expired):
+            return
+
+        tmp_path = '{}.{}.tmp'.format(self._path, os.getpid())
+
+        with open(tmp_path, 'w') as fp:
+            json.dump(self._entries, fp, indent=True)
+
+        os.rename(tmp_path, self._path)
+        self._changed = False
+
+    @staticmethod
+    def _get_day(timestamp):
+        """
+        :type timestamp int
+        :rtype: str
+        """
+        return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
+
+    def needs_refresh(self, entry, now=None):
+        """
+        :type entry dict
+        :type now int
+        :rtype: bool
+        """
+        now = now or time()
+
+        if now - entry['checked'] >= self._ttl:
+            return True
+
+        if self._get_day(entry['checked']) != self._get_day(now):
+            return True
+
+        return entry['status'] == self.STATUS_CLOSED and entry['resolution'] not in self.FINAL_RESOLUTIONS
+
+    def get(self, unique_id, now=None):
+        """
+        Return the cached entry for a given unique_id, None when not cached or needs to be refreshed
+
+        :type unique_id str
+        :type now int
+        :rtype: dict|None
+        """
+        entry = self._entries.get(unique_id)
+
+        if entry is None or self.needs_refresh(entry, now):
+            return None
+
+        return entry
+
+    def set(self, unique_id, key, status, resolution=None, now=None):
+        """
+        :type unique_id str
+        :type key str
+        :type status str
+        :type resolution str|None
+        :type now int
+        """
+        self._entries[unique_id] = {
+            'key': key,
+            'status': status,
+            'resolution': resolution,
+            'checked': int(now or time()),
+        }
+
+        self._changed = True
+
+    def invalidate(self, unique_id):
+        """
+        :type unique_id str
+        """
+        if self._entries.pop(unique_id, None) is not None:
+            self._changed = True
@@ -14,11 +14,13 @@ setup(
     author='macbre',
     author_email='macbre@wikia-inc.com',
     install_requires=[
+        'elasticsearch>=6.0.0,<7.0.0',
         'jira==2.0.0',
         'pytest==3.6.3',
         'requests-oauthlib==0.6.1',
         'wikia-common-kibana==2.2.6',
         'PyYAML==3.13',
+        'urllib3>=1.26,<1.27',
     ],
     include_package_data=True,
 )